@@ -0,0 +1,28 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Stochastic optoacoustic numerical breast phantoms (SOA-NBP)
+───────────────────────────────────────────────────────────────────────────
+This package generates functional, acoustic, and optical numerical breast
+phantoms (NBPs) from tissue label maps. The tissue properties are defined
+in `parameters`, and the `soa-nbp` command (see `cli`) generates an
+ensemble of phantoms.
+
+Reference:
+  [Park2023] Seonyeong Park, Umberto Villa, Fu Li, Refik Mert Cam,
+          Alexander A. Oraevsky, Mark A. Anastasio, "Stochastic three-
+          dimensional numerical phantoms to enable computational studies in
+          quantitative optoacoustic computed tomography of breast cancer,"
+          J. Biomed. Opt. 28(6) 066002 (20 June 2023)
+          https://doi.org/10.1117/1.JBO.28.6.066002
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+__version__ = '0.1.0'
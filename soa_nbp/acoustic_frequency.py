@@ -0,0 +1,142 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Frequency-resolved acoustic attenuation and dispersion
+───────────────────────────────────────────────────────────────────────────
+This generates acoustic attenuation `α(f)` (dB/mm) and sound speed `c(f)`
+(mm/μs) maps on a frequency grid `f` (MHz) from a tissue label map, for
+broadband solvers. The attenuation follows the power law
+
+  α(f) = α_0 f^y,
+
+with `α_0` of `Acou_prop.alpha_coeff` and the exponent `y` of the breast
+type (`Acou_prop.y`), and the sound speed follows the matching
+Kramers-Kronig dispersion relation [Szabo1994],
+
+  1/c(f) = 1/c(f_ref) + α_0' tan(πy/2) (f^(y-1) - f_ref^(y-1))/(2π),
+
+where `α_0'` is `α_0` in Np/MHz^ymm and `c(f_ref)` is the sound speed of
+`Acou_prop.sound_speed` at the reference frequency `f_ref`. For y = 1, the
+limit 1/c(f) = 1/c(f_ref) - α_0' ln(f/f_ref)/π^2 is used.
+
+Only lookup tables of shape (frequency, 256) are computed, and each slab
+of the label map is gathered once per frequency (see `lookup_table`) in a
+single pass. Solvers that apply the power law internally use the compact
+output instead, i.e., the `α_0` and `c(f_ref)` maps with `y`
+(see `acoustic_map.GenerateAcouMap`).
+
+Reference:
+  [Szabo1994] T. L. Szabo, "Time domain wave equations for lossy media
+          obeying a frequency power law," J. Acoust. Soc. Am. 96 491-500
+          https://doi.org/10.1121/1.410434 (1994)
+  [Li2022] F. Li et al., "3-D stochastic numerical breast phantoms for
+          enabling virtual imaging trials of ultrasound computed
+          tomography,” IEEE Trans. Ultrason. Ferroelectr. Freq. Control, 69
+          135-146 https://doi.org/10.1109/TUFFC.2021.3112544 ITUCER 0885-
+          3010 (2022)
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import math
+import os
+
+import numpy as np
+
+from .lookup_table import AssignPropLUT
+from .acoustic_map import AcouLUT, BreastTypeExponent, GenerateAcouMap
+from .volume_io import OpenVolume, CreateVolume, Slabs, SLAB
+
+# Unit dB to Np
+NP_DB = math.log(10.)/20.
+
+
+def AttenuationTable(alpha_coeff: np.ndarray, y: float, frequency
+                     ) -> np.ndarray:
+  '''Return the attenuation [dB/mm] table of shape (frequency, 256).
+
+  :param alpha_coeff: Lookup array of `α_0` [dB/MHz^ymm].
+  :param frequency: Frequencies [MHz].
+  '''
+  f = np.atleast_1d(np.asarray(frequency, dtype=np.float64))
+  return f[:, None]**y*np.asarray(alpha_coeff, dtype=np.float64)
+
+
+def SoundSpeedTable(sound_speed: np.ndarray, alpha_coeff: np.ndarray,
+                    y: float, frequency, f_ref: float = 1.) -> np.ndarray:
+  '''Return the dispersive sound speed [mm/μs] table of shape (frequency,
+  256).
+
+  :param sound_speed: Lookup array of `c` [mm/μs] at `f_ref`.
+  :param alpha_coeff: Lookup array of `α_0` [dB/MHz^ymm].
+  :param frequency: Frequencies [MHz].
+  :param f_ref: Reference frequency [MHz] of `sound_speed`.
+  '''
+  f     = np.atleast_1d(np.asarray(frequency, dtype=np.float64))[:, None]
+  alpha = NP_DB*np.asarray(alpha_coeff, dtype=np.float64)
+  if math.isclose(y, 1.):
+    slowness = -alpha*np.log(f/f_ref)/math.pi**2
+  else:
+    slowness = (alpha*math.tan(math.pi*y/2.)
+                *(f**(y - 1.) - f_ref**(y - 1.))/(2.*math.pi))
+  return 1./(1./np.asarray(sound_speed, dtype=np.float64) + slowness)
+
+
+def GenerateFreqAcouMap(labelmap, out_dir: str, breast_type: str,
+                        frequency, lut: dict = None, seed=None,
+                        f_ref: float = 1., compact: bool = False,
+                        shape: tuple = None, slab: int = SLAB,
+                        dtype=np.float32) -> dict:
+  '''Generate frequency-resolved attenuation and sound speed maps by
+  streaming over the label map.
+
+  :param labelmap: uint8 tissue label map, or path to it (see
+    `volume_io.OpenVolume`).
+  :param out_dir: Directory of the output maps, 'alpha.npy' and
+    'sound_speed.npy' of shape (frequency, *map shape).
+  :param breast_type: Breast type, 'A', 'B', 'C', or 'D'.
+  :param frequency: Frequencies [MHz].
+  :param lut: Lookup arrays from `acoustic_map.AcouLUT`; sampled with
+    `seed` if not given.
+  :param f_ref: Reference frequency [MHz] of the sound speed table.
+  :param compact: Whether to write the `α_0` and `c(f_ref)` maps with `y`
+    instead (see `acoustic_map.GenerateAcouMap`).
+  :return: Memory-mapped maps, the frequencies, and `y`.
+  '''
+  lut = AcouLUT(seed=seed) if lut is None else lut
+  if compact:
+    acou = GenerateAcouMap(labelmap, out_dir, breast_type, lut,
+                           shape=shape, slab=slab, dtype=dtype)
+    acou['f_ref'] = f_ref
+    return acou
+
+  labelmap  = OpenVolume(labelmap, shape)
+  y         = BreastTypeExponent(breast_type)
+  frequency = np.atleast_1d(np.asarray(frequency, dtype=np.float64))
+  table     = {'alpha':       AttenuationTable(lut['alpha_coeff'], y,
+                                               frequency),
+               'sound_speed': SoundSpeedTable(lut['sound_speed'],
+                                              lut['alpha_coeff'], y,
+                                              frequency, f_ref)}
+  table     = {name: t.astype(dtype) for name, t in table.items()}
+  acou      = {name: CreateVolume(os.path.join(out_dir, f'{name}.npy'),
+                                  (frequency.size,) + labelmap.shape, dtype)
+               for name in table}
+
+  for z in Slabs(labelmap.shape[0], slab):
+    label = np.ascontiguousarray(labelmap[z])
+    for name, t in table.items():
+      for k in range(frequency.size):
+        AssignPropLUT(label, t[k], out=acou[name][k, z])
+
+  for name in table:
+    acou[name].flush()
+  acou['frequency'] = frequency
+  acou['y']         = y
+  return acou
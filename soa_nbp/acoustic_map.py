@@ -0,0 +1,100 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Acoustic numerical breast phantom (NBP) generation
+───────────────────────────────────────────────────────────────────────────
+This generates the acoustic NBP, i.e., sound speed `c` (mm/μs), density
+`ρ` (g/mm^3), and acoustic attenuation coefficient `α_0` (dB/MHz^ymm) maps,
+from a tissue label map using `Acou_prop`. The power-law exponent `y` is
+determined by the breast type.
+
+The label map is read through a memory map in slabs along the z-axis, and
+the three property maps are written into memory-mapped output files in a
+single pass over the labels. The memory footprint is thus bounded by the
+slab size, not the volume size.
+
+Reference:
+  [Park2023] Seonyeong Park, Umberto Villa, Fu Li, Refik Mert Cam,
+          Alexander A. Oraevsky, Mark A. Anastasio, "Stochastic three-
+          dimensional numerical phantoms to enable computational studies in
+          quantitative optoacoustic computed tomography of breast cancer,"
+          J. Biomed. Opt. 28(6) 066002 (20 June 2023)
+          https://doi.org/10.1117/1.JBO.28.6.066002
+  [Li2022] F. Li et al., "3-D stochastic numerical breast phantoms for
+          enabling virtual imaging trials of ultrasound computed
+          tomography,” IEEE Trans. Ultrason. Ferroelectr. Freq. Control, 69
+          135-146 https://doi.org/10.1109/TUFFC.2021.3112544 ITUCER 0885-
+          3010 (2022)
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import os
+
+import numpy as np
+
+from .parameters import Acou_prop
+from .lookup_table import CompileProp, AssignPropLUT
+from .sampling import SampleTable
+from .volume_io import OpenVolume, CreateVolume, Slabs, SLAB
+
+ACOU_NAME = ('sound_speed', 'density', 'alpha_coeff')
+
+
+def AcouLUT(sample: dict = None, index: int = 0, seed=None,
+            fill: float = np.nan) -> dict:
+  '''Return lookup arrays of the acoustic properties for one realization.
+
+  :param sample: Realizations from `sampling.SampleTable`; drawn with
+    `seed` if not given.
+  :param index: Index of the realization in `sample`.
+  '''
+  table = CompileProp(Acou_prop)
+  if sample is None:
+    sample, index = SampleTable(table, 1, np.random.default_rng(seed)), 0
+  return {name: table[name].CompileBatch(sample[name][index:index+1],
+                                         fill)[0]
+          for name in ACOU_NAME}
+
+
+def BreastTypeExponent(breast_type: str) -> float:
+  '''Return the attenuation power-law exponent `y` of the breast type.'''
+  return Acou_prop.y[breast_type[0]]
+
+
+def GenerateAcouMap(labelmap, out_dir: str, breast_type: str,
+                    lut: dict = None, seed=None, shape: tuple = None,
+                    slab: int = SLAB, dtype=np.float32) -> dict:
+  '''Generate the acoustic NBP by streaming over the label map.
+
+  :param labelmap: uint8 tissue label map, or path to it (see
+    `volume_io.OpenVolume`).
+  :param out_dir: Directory of the output maps, '<name>.npy'.
+  :param breast_type: Breast type, 'A', 'B', 'C', or 'D'.
+  :param lut: Lookup arrays from `AcouLUT`; sampled with `seed` if not
+    given.
+  :param slab: Number of z-slices per slab.
+  :return: Memory-mapped maps keyed by property name, and the exponent `y`.
+  '''
+  labelmap = OpenVolume(labelmap, shape)
+  lut      = AcouLUT(seed=seed) if lut is None else lut
+  lut      = {name: np.asarray(lut[name], dtype=dtype) for name in ACOU_NAME}
+  acou     = {name: CreateVolume(os.path.join(out_dir, f'{name}.npy'),
+                                 labelmap.shape, dtype)
+              for name in ACOU_NAME}
+
+  for z in Slabs(labelmap.shape[0], slab):
+    label = np.ascontiguousarray(labelmap[z])
+    for name in ACOU_NAME:
+      AssignPropLUT(label, lut[name], out=acou[name][z])
+
+  for name in ACOU_NAME:
+    acou[name].flush()
+  acou['y'] = BreastTypeExponent(breast_type)
+  return acou
@@ -0,0 +1,210 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Stochastic optoacoustic numerical breast phantom (SOA-NBP) generator
+───────────────────────────────────────────────────────────────────────────
+This is the `soa-nbp` command, which generates the functional, acoustic,
+and optical NBPs of one phantom per tissue label map over a process pool
+(see `ensemble`), and reports machine-readable metrics to size batch jobs:
+
+  soa-nbp LABELMAP [LABELMAP ...] --out-dir DIR --breast-type B
+          [--wavelength 700 750 800] [--seed 0] [--vessel] [--workers N]
+          [--metrics metrics.jsonl]
+
+Label maps are `.npy` files of `Tissue_type` labels, VICTRE outputs with
+a MetaImage header (`.mhd`, see `victre_io`), or raw files (`.raw`,
+`.raw.gz`) with `--shape`; a directory stands for its `.npy` and `.mhd`
+files. VICTRE labels are remapped and written into the phantom directory
+as 'labelmap.npy'. The breast shape is that of the given label maps, so
+it is chosen when they are generated (see `victre_config`), not here.
+
+One JSON record is written per line: one per phantom,
+
+  {"event": "phantom", "index": 0, "labelmap": ..., "voxels": ...,
+   "stage": {"read": ..., "sample": ..., "func": ..., "acou": ...,
+             "mu_a": ..., "mu_s": ..., "meta": ...},
+   "elapsed": ..., "voxels_per_s": ..., "peak_rss_mb": ...},
+
+with the durations [s] of the stages and the peak resident set size of
+the worker process so far, and a summary at the end,
+
+  {"event": "summary", "generated": ..., "skipped": ..., "elapsed": ...,
+   "voxels_per_s": ..., "phantoms_per_hour": ..., "peak_rss_mb": ...},
+
+with the throughput over the wall time and the largest peak resident set
+size of this process and its workers.
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+from .ensemble import META, PhantomDir, GeneratePhantom
+from .param_set import Param_set
+from .victre_io import ReadVICTRE
+from .volume_io import OpenVolume
+from .parameters import __version__
+
+# Label map files taken from a directory
+LABELMAP_EXT = ('.npy', '.mhd')
+
+
+def PeakRSS(who: str = 'self') -> float:
+  '''Return the peak resident set size [MB] of this process ('self') or of
+  its terminated children ('children'), or None if unavailable.'''
+  if resource is None:
+    return None
+  usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self'
+                             else resource.RUSAGE_CHILDREN)
+  # Kilobytes on Linux, bytes on macOS
+  scale = 1./2**20 if sys.platform == 'darwin' else 1./2**10
+  return usage.ru_maxrss*scale
+
+
+def ListLabelmaps(path: list) -> list:
+  '''Expand directories into their label map files, sorted by name.'''
+  out = []
+  for p in path:
+    if os.path.isdir(p):
+      out.extend(sorted(os.path.join(p, f) for f in os.listdir(p)
+                        if f.endswith(LABELMAP_EXT)))
+    else:
+      out.append(p)
+  return out
+
+
+def RunPhantom(index: int, labelmap: str, breast_type: str, out_dir: str,
+               root_seed: int, wavelength=None, shape: tuple = None,
+               pde: bool = True, vessel: bool = False,
+               param: Param_set = None) -> dict:
+  '''Generate one phantom in a worker and return its metrics record.
+
+  :param param: Compiled parameter tables shared by the phantoms.
+  '''
+  start = time.perf_counter()
+  stage = {}
+  if not labelmap.endswith('.npy'):
+    path     = os.path.join(PhantomDir(out_dir, index), 'labelmap.npy')
+    labelmap = ReadVICTRE(labelmap, path, shape=shape)
+    stage['read'] = time.perf_counter() - start
+  labelmap = OpenVolume(labelmap, shape)
+  GeneratePhantom(index, labelmap, breast_type, out_dir, root_seed,
+                  wavelength, shape, pde, vessel=vessel, timing=stage,
+                  param=param)
+  elapsed  = time.perf_counter() - start
+  return {'event':        'phantom',
+          'index':        index,
+          'voxels':       int(labelmap.size),
+          'stage':        stage,
+          'elapsed':      elapsed,
+          'voxels_per_s': labelmap.size/elapsed,
+          'peak_rss_mb':  PeakRSS()}
+
+
+def Emit(out, record: dict) -> None:
+  '''Write a metrics record as one line of JSON.'''
+  out.write(json.dumps(record) + '\n')
+  out.flush()
+
+
+def ParseArgs(argv: list = None) -> argparse.Namespace:
+  '''Parse the command-line arguments.'''
+  parser = argparse.ArgumentParser(
+    prog='soa-nbp',
+    description='Generate functional, acoustic, and optical numerical '
+                'breast phantoms from tissue label maps.')
+  parser.add_argument('labelmap', nargs='+',
+                      help='label map files (.npy, .mhd, .raw, .raw.gz) '
+                           'or directories')
+  parser.add_argument('--out-dir', required=True,
+                      help="output directory of 'phantom_<index>/'")
+  parser.add_argument('--breast-type', required=True,
+                      choices=('A', 'B', 'C', 'D'), help='breast type')
+  parser.add_argument('--wavelength', type=float, nargs='+',
+                      help='wavelengths [nm] of the optical NBP '
+                           '(not generated if not given)')
+  parser.add_argument('--seed', type=int, default=0,
+                      help='root seed of the ensemble')
+  parser.add_argument('--shape', type=int, nargs=3,
+                      metavar=('Z', 'Y', 'X'), help='shape of raw files')
+  parser.add_argument('--workers', type=int,
+                      help='number of worker processes (default: CPU '
+                           'count)')
+  parser.add_argument('--no-pde', dest='pde', action='store_false',
+                      help='skip the PDE-marked properties')
+  parser.add_argument('--vessel', action='store_true',
+                      help='draw the oxygen saturation per artery and vein '
+                           'component')
+  parser.add_argument('--overwrite', action='store_true',
+                      help='regenerate phantoms with existing metadata')
+  parser.add_argument('--metrics',
+                      help='file of the JSON records (default: stdout)')
+  parser.add_argument('--version', action='version',
+                      version=f'%(prog)s {__version__}')
+  return parser.parse_args(argv)
+
+
+def Main(argv: list = None) -> int:
+  '''Run the `soa-nbp` command.'''
+  args     = ParseArgs(argv)
+  labelmap = ListLabelmaps(args.labelmap)
+  if not labelmap:
+    raise SystemExit('soa-nbp: no label maps found')
+  shape    = tuple(args.shape) if args.shape else None
+
+  out   = open(args.metrics, 'a') if args.metrics else sys.stdout
+  todo  = [i for i in range(len(labelmap)) if args.overwrite
+           or not os.path.exists(os.path.join(PhantomDir(args.out_dir, i),
+                                              META))]
+  start = time.perf_counter()
+  voxel = 0
+  param = Param_set.Compile()
+  try:
+    with concurrent.futures.ProcessPoolExecutor(args.workers) as pool:
+      future = {pool.submit(RunPhantom, i, labelmap[i], args.breast_type,
+                            args.out_dir, args.seed, args.wavelength, shape,
+                            args.pde, args.vessel, param): i
+                for i in todo}
+      for f in concurrent.futures.as_completed(future):
+        record = f.result()
+        record['labelmap'] = labelmap[future[f]]
+        voxel += record['voxels']
+        Emit(out, record)
+
+    elapsed = time.perf_counter() - start
+    peak    = [m for m in (PeakRSS(), PeakRSS('children')) if m is not None]
+    Emit(out, {'event':             'summary',
+               'generated':         len(todo),
+               'skipped':           len(labelmap) - len(todo),
+               'breast_type':       args.breast_type,
+               'wavelength':        args.wavelength,
+               'seed':              args.seed,
+               'vessel':            args.vessel,
+               'elapsed':           elapsed,
+               'voxels_per_s':      voxel/elapsed if todo else 0.,
+               'phantoms_per_hour': 3600.*len(todo)/elapsed if todo else 0.,
+               'peak_rss_mb':       max(peak) if peak else None})
+  finally:
+    if out is not sys.stdout:
+      out.close()
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(Main())
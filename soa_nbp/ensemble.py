@@ -0,0 +1,223 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Stochastic ensemble generation of numerical breast phantoms (NBPs)
+───────────────────────────────────────────────────────────────────────────
+This generates an ensemble of functional, acoustic, and (optionally)
+optical NBPs from tissue label maps over a process pool. Each phantom has
+a breast type ('A'-'D'), which determines the attenuation power-law
+exponent `y`, and tissue properties sampled from `Func_prop`, `Opt_prop`,
+and `Acou_prop`. The tables are validated and compiled once into a
+`param_set.Param_set`, which the workers draw the realizations and lookup
+arrays from.
+
+Phantom `i` draws all of its random numbers from the `i`-th child of one
+`numpy.random.SeedSequence` of the root seed, so any phantom of an
+ensemble is regenerated exactly from (root seed, index), regardless of
+the number of workers or the order of completion. The outputs of phantom
+`i` are written into '<out_dir>/phantom_<i>/', and its metadata file
+'meta.json', including the sampled properties, is written last; phantoms
+with metadata are skipped when an interrupted ensemble is resumed.
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import concurrent.futures
+import json
+import os
+import time
+
+import numpy as np
+
+from .param_set import Param_set
+from .functional_map import GenerateFuncMap
+from .acoustic_map import GenerateAcouMap
+from .optical_scattering import GenerateMuSMap
+from .optical_absorption import GenerateMuAMap
+from .volume_io import OpenVolume
+from .ensemble_design import Phantom
+
+META = 'meta.json'
+
+
+def PhantomSeed(root_seed: int, index: int) -> np.random.SeedSequence:
+  '''Return the seed sequence of phantom `index`, i.e., the `index`-th
+  child of the root seed sequence.'''
+  return np.random.SeedSequence(root_seed, spawn_key=(index,))
+
+
+def PhantomDir(out_dir: str, index: int) -> str:
+  '''Return the output directory of phantom `index`.'''
+  return os.path.join(out_dir, f'phantom_{index:05d}')
+
+
+def JSONFloat(value: float) -> float:
+  '''Return the value as a JSON number, or None for NaN (e.g., PDE).'''
+  return None if np.isnan(value) else float(value)
+
+
+def MetaSample(meta: dict) -> dict:
+  '''Return the realization of the tissue properties recorded in the
+  metadata of a phantom, in the format of `SamplePhantom`.'''
+  sample = {prop: {name: np.array([tuple(np.nan if v is None else v
+                                         for v in value.values())],
+                                  dtype=[(t, np.float64) for t in value])
+                   for name, value in table.items()}
+            for prop, table in meta['prop'].items()}
+  sample['c_thbb'] = meta['c_thbb']
+  return sample
+
+
+def SamplePhantom(param: Param_set, rng: np.random.Generator) -> dict:
+  '''Draw one realization of all tissue properties of a phantom.'''
+  sample = {prop: param.SampleRoot(prop, 1, rng)
+            for prop in ('Func_prop', 'Opt_prop', 'Acou_prop')}
+  sample['c_thbb'] = param.SampleCThbb(1, rng)[0]
+  return sample
+
+
+def PhantomLUT(param: Param_set, sample: dict, prop: str) -> dict:
+  '''Return the lookup arrays of a property class for the realization of
+  a phantom (see `SamplePhantom`).'''
+  return {name: lut[0] for name, lut in param.Lookup(prop,
+                                                     sample[prop]).items()}
+
+
+def Lap(timing: dict, stage: str, tick: float) -> float:
+  '''Record the time since `tick` as the duration of a stage (if
+  `timing` is given) and return the current time.'''
+  now = time.perf_counter()
+  if timing is not None:
+    timing[stage] = now - tick
+  return now
+
+
+def GeneratePhantom(index: int, labelmap, breast_type: str, out_dir: str,
+                    root_seed: int, wavelength=None, shape: tuple = None,
+                    pde: bool = True, sample: dict = None,
+                    vessel: bool = False, timing: dict = None,
+                    param: Param_set = None) -> dict:
+  '''Generate phantom `index` of an ensemble and return its metadata.
+
+  :param labelmap: uint8 tissue label map, or path to it (see
+    `volume_io.OpenVolume`).
+  :param wavelength: Wavelengths [nm] of the optical NBP; not generated if
+    not given.
+  :param sample: Realization of the tissue properties (see
+    `SamplePhantom`), e.g., of an ensemble design; drawn if not given.
+  :param vessel: Whether to draw `s` per artery and vein component (see
+    `vessel_component`).
+  :param timing: Dictionary receiving the duration [s] of each stage,
+    'sample', 'func', 'acou', 'mu_a', 'mu_s', and 'meta'.
+  :param param: Compiled parameter tables (default:
+    `Param_set.Compile()`).
+  '''
+  tick      = time.perf_counter()
+  param     = Param_set.Compile() if param is None else param
+  rng       = np.random.default_rng(PhantomSeed(root_seed, index))
+  drawn     = SamplePhantom(param, rng)
+  sample    = {**drawn, **{k: v for k, v in (sample or {}).items()
+                           if k in drawn}}
+  labelmap  = OpenVolume(labelmap, shape)
+  path      = PhantomDir(out_dir, index)
+  tick      = Lap(timing, 'sample', tick)
+  func      = GenerateFuncMap(labelmap, os.path.join(path, 'func'),
+                              PhantomLUT(param, sample, 'Func_prop'),
+                              seed=rng,
+                              pde=pde, vessel=vessel)
+  tick      = Lap(timing, 'func', tick)
+  acou      = GenerateAcouMap(labelmap, os.path.join(path, 'acou'),
+                              breast_type,
+                              PhantomLUT(param, sample, 'Acou_prop'))
+  tick      = Lap(timing, 'acou', tick)
+  if wavelength is not None:
+    GenerateMuAMap(func, wavelength, sample['c_thbb'],
+                   os.path.join(path, 'opt', 'mu_a.npy'))
+    tick = Lap(timing, 'mu_a', tick)
+    GenerateMuSMap(labelmap, wavelength, os.path.join(path, 'opt'),
+                   PhantomLUT(param, sample, 'Opt_prop'))
+    tick = Lap(timing, 'mu_s', tick)
+
+  meta = {'index':       index,
+          'root_seed':   root_seed,
+          'breast_type': breast_type,
+          'y':           acou['y'],
+          'c_thbb':      float(sample['c_thbb']),
+          'vessel':      vessel,
+          'wavelength':  None if wavelength is None
+                         else np.atleast_1d(wavelength).tolist(),
+          'prop':        {prop: {name: {t: JSONFloat(s[name][t][0])
+                                        for t in s[name].dtype.names}
+                                 for name in s}
+                          for prop, s in sample.items() if prop != 'c_thbb'}}
+  # Written last and atomically; its presence marks a finished phantom
+  tmp = os.path.join(path, META + '.tmp')
+  with open(tmp, 'w') as f:
+    json.dump(meta, f, indent=2)
+  os.replace(tmp, os.path.join(path, META))
+  Lap(timing, 'meta', tick)
+  return meta
+
+
+def GenerateEnsemble(labelmap, breast_type, out_dir: str, n: int = None,
+                     root_seed: int = 0, wavelength=None,
+                     shape: tuple = None, workers: int = None,
+                     resume: bool = True, pde: bool = True,
+                     design: dict = None, vessel: bool = False,
+                     param=None, log=print) -> dict:
+  '''Generate an ensemble of phantoms over a process pool.
+
+  :param labelmap: Label map (or path) per phantom, or one for all.
+  :param breast_type: Breast type per phantom, or one for all.
+  :param n: Number of phantoms (default: number of label maps).
+  :param root_seed: Root seed of the ensemble.
+  :param workers: Number of worker processes (default: CPU count).
+  :param resume: Whether to skip phantoms with existing metadata.
+  :param design: Realizations of the phantoms from
+    `ensemble_design.Design_space.Sample`; drawn per phantom if not given.
+  :param vessel: Whether to draw `s` per artery and vein component.
+  :param param: Compiled parameter tables (`Param_set`), or path to a saved
+    one; compiled once from the `parameters` package if not given.
+  :param log: Function printing the progress, or None.
+  :return: Numbers of generated and skipped phantoms, elapsed time [s], and
+    throughput [phantoms/hour].
+  '''
+  labelmap    = labelmap if isinstance(labelmap, (list, tuple)) \
+                else [labelmap]*(n or 1)
+  n           = len(labelmap) if n is None else n
+  breast_type = breast_type if isinstance(breast_type, (list, tuple)) \
+                else [breast_type]*n
+  if len(labelmap) != n or len(breast_type) != n:
+    raise ValueError('Numbers of label maps and breast types must be n')
+
+  if isinstance(param, str):
+    param = Param_set.Load(param)
+  param = Param_set.Compile() if param is None else param
+
+  todo = [i for i in range(n) if not (resume and os.path.exists(
+          os.path.join(PhantomDir(out_dir, i), META)))]
+  start = time.perf_counter()
+  with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+    future = [pool.submit(GeneratePhantom, i, labelmap[i], breast_type[i],
+                          out_dir, root_seed, wavelength, shape, pde,
+                          None if design is None else Phantom(design, i),
+                          vessel, None, param)
+              for i in todo]
+    for done, f in enumerate(concurrent.futures.as_completed(future), 1):
+      f.result()
+      if log is not None:
+        elapsed = time.perf_counter() - start
+        log(f'{done}/{len(todo)} phantoms, '
+            f'{3600.*done/elapsed:.1f} phantoms/hour')
+
+  elapsed = time.perf_counter() - start
+  return {'generated':        len(todo),
+          'skipped':          n - len(todo),
+          'elapsed':          elapsed,
+          'phantoms_per_hour': 3600.*len(todo)/elapsed if todo else 0.}
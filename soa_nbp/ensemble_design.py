@@ -0,0 +1,192 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Quasi-random ensemble designs over the parameter distributions
+───────────────────────────────────────────────────────────────────────────
+This includes a class `Design_space` to map points of the unit hypercube
+to realizations of the random tissue properties of `Func_prop`,
+`Opt_prop`, and `Acou_prop` and of the shape and size parameters of
+`VICTRE_param`, by the inverse CDFs of their distributions (truncated
+Gaussians included, see `sampling`). Each random root entry is one
+dimension; jointly sampled entries (the ranges of `Opt_prop.mu_sp`) share
+one. Volume fractions are constrained as in `sampling.SampleComposition`.
+
+Designs (points of the hypercube) are drawn by `scipy.stats.qmc`:
+
+  ┌─────────┬──────────────────────────────────────────────────────────────┐
+  │ Method  │ Design                                                       │
+  ├─────────┼──────────────────────────────────────────────────────────────┤
+  │ sobol   │ Scrambled Sobol sequence (balanced for powers of 2)          │
+  │ lhs     │ Latin hypercube                                              │
+  │ random  │ Plain Monte Carlo                                            │
+  │ saltelli│ Matrices A, B, and A_B^(i) (A with column i of B) of a       │
+  │         │ Sobol sequence, N(D + 2) points for the first-order and      │
+  │         │ total Sobol sensitivity indices of D dimensions [Saltelli]   │
+  └─────────┴──────────────────────────────────────────────────────────────┘
+
+Reference:
+  [Saltelli] A. Saltelli, P. Annoni, I. Azzini, F. Campolongo, M. Ratto,
+          S. Tarantola, "Variance based sensitivity analysis of model
+          output. Design and estimator for the total sensitivity index,"
+          Comput. Phys. Commun. 181 259-270
+          https://doi.org/10.1016/j.cpc.2009.09.018 (2010)
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import numpy as np
+from scipy.stats import qmc
+
+from .parameters import Func_prop, Opt_prop, Acou_prop, VICTRE_param
+from .lookup_table import CompileProp
+from .sampling import (SpecKind, SpecParam, TransformParam, TableSpec,
+                       TableSample, TransformUniform, ComposeUniform)
+
+METHOD = ('sobol', 'lhs', 'random', 'saltelli')
+
+
+class Design_space:
+  '''Dimensions of the random parameters of an ensemble.
+
+  :param prop: Property classes to vary.
+  :param breast_type: Breast type of `VICTRE_param`; its shape and size
+    parameters are not varied if not given.
+  :param breast_shape: Breast shape of `VICTRE_param`.
+  :param c_thbb: Whether to vary `Func_prop.c_thbb`.
+  '''
+  def __init__(self, prop: tuple = (Func_prop, Opt_prop, Acou_prop),
+               breast_type: str = None, breast_shape: str = 'natural',
+               c_thbb: bool = True) -> None:
+    self.name  = []   # Name of each dimension
+    self.table = {}
+    self.part  = {}   # Property class: (spec, where, dimension per column)
+    for p in prop:
+      table = CompileProp(p)
+      spec, group, where = TableSpec(table)
+      dim = np.full(len(spec), -1)
+      key = {}
+      for i, (s, g) in enumerate(zip(spec, group)):
+        if SpecKind(s) == 'const':
+          continue
+        if g not in key:
+          key[g] = len(self.name)
+          self.name.append(f'{p.__name__}/{g}')
+        dim[i] = key[g]
+      self.table[p.__name__] = table
+      self.part[p.__name__]  = (spec, where, dim)
+
+    self.c_thbb = None
+    if c_thbb:
+      self.c_thbb = len(self.name)
+      self.name.append('Func_prop/c_thbb')
+
+    self.victre = None
+    if breast_type is not None:
+      param = VICTRE_param(breast_type, breast_shape).Spec()
+      dist, p = SpecParam(list(param.values()))
+      dim = np.full(len(param), -1)
+      for i, (k, s) in enumerate(param.items()):
+        if SpecKind(s) != 'const':
+          dim[i] = len(self.name)
+          self.name.append(f'VICTRE_param/{k}')
+      self.victre = (tuple(param), dist, p, dim)
+
+  @property
+  def dimension(self) -> int:
+    '''Number of dimensions.'''
+    return len(self.name)
+
+  def Design(self, n: int, method: str = 'sobol', seed=None) -> np.ndarray:
+    '''Return `n` points of shape (n, dimension) of the unit hypercube, or
+    n*(dimension + 2) points for 'saltelli' (see `SaltelliDesign`).'''
+    d = self.dimension
+    if method == 'sobol':
+      return qmc.Sobol(d, scramble=True, seed=seed).random(n)
+    if method == 'lhs':
+      return qmc.LatinHypercube(d, seed=seed).random(n)
+    if method == 'random':
+      return np.random.default_rng(seed).random((n, d))
+    if method == 'saltelli':
+      return SaltelliDesign(d, n, seed)
+    raise ValueError(f"Unknown method '{method}'")
+
+  def Sample(self, u: np.ndarray) -> dict:
+    '''Map points of shape (N, dimension) to realizations.
+
+    :return: Realizations per property class as from
+      `sampling.SampleTable` (`Func_prop` with constrained volume
+      fractions), and 'c_thbb' and 'VICTRE_param' (structured array) if
+      varied.
+    '''
+    u = np.atleast_2d(np.asarray(u, dtype=np.float64))
+    if u.shape[1] != self.dimension:
+      raise ValueError(f'Points must have {self.dimension} dimensions')
+    out = {}
+    for prop, (spec, where, dim) in self.part.items():
+      # Constants ignore their variates
+      v = np.where(dim >= 0, u[:, np.maximum(dim, 0)], 0.5)
+      if prop == 'Func_prop':
+        out[prop] = ComposeUniform(self.table[prop], v)[0]
+      else:
+        out[prop] = TableSample(self.table[prop], where,
+                                TransformUniform(spec, v))
+    if self.c_thbb is not None:
+      out['c_thbb'] = TransformUniform([dict(Func_prop.c_thbb)],
+                                       u[:, [self.c_thbb]])[:, 0]
+    if self.victre is not None:
+      name, dist, p, dim = self.victre
+      x = TransformParam(dist, p, np.where(dim >= 0,
+                                           u[:, np.maximum(dim, 0)], 0.5))
+      out['VICTRE_param'] = np.empty(len(u), dtype=[(k, np.float64)
+                                                    for k in name])
+      for i, k in enumerate(name):
+        out['VICTRE_param'][k] = x[:, i]
+    return out
+
+
+def Phantom(sample: dict, index: int) -> dict:
+  '''Return realization `index` of `Design_space.Sample` in the format of
+  `ensemble.SamplePhantom`.'''
+  out = {}
+  for key, value in sample.items():
+    if isinstance(value, dict):
+      out[key] = {name: s[index:index+1] for name, s in value.items()}
+    elif key == 'c_thbb':
+      out[key] = float(value[index])
+    else:
+      out[key] = value[index:index+1]
+  return out
+
+
+def SaltelliDesign(d: int, n: int, seed=None) -> np.ndarray:
+  '''Return the Saltelli design of shape (n*(d + 2), d): A, B, and then
+  A_B^(i) for i = 0, ..., d - 1, each of n points.'''
+  base = qmc.Sobol(2*d, scramble=True, seed=seed).random(n)
+  A, B = base[:, :d], base[:, d:]
+  AB   = np.repeat(A[None], d, axis=0)
+  AB[np.arange(d), :, np.arange(d)] = B.T
+  return np.concatenate([A, B, AB.reshape(-1, d)])
+
+
+def SobolIndices(y: np.ndarray, d: int) -> tuple:
+  '''Return the first-order and total Sobol sensitivity indices of shape
+  (d, ...) from model outputs of the Saltelli design [Saltelli].
+
+  :param y: Outputs of shape (n*(d + 2), ...) in the order of
+    `SaltelliDesign`.
+  '''
+  y     = np.asarray(y, dtype=np.float64)
+  n     = len(y)//(d + 2)
+  yA    = y[:n]
+  yB    = y[n:2*n]
+  yAB   = y[2*n:].reshape((d, n) + y.shape[1:])
+  var   = np.var(np.concatenate([yA, yB]), axis=0)
+  first = np.mean(yB*(yAB - yA), axis=1)/var
+  total = 0.5*np.mean((yA - yAB)**2, axis=1)/var
+  return first, total
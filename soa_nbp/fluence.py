@@ -0,0 +1,270 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Diffusion-approximation light fluence
+───────────────────────────────────────────────────────────────────────────
+This includes a class `Diffusion_system` to compute the light fluence `Φ`
+in the optical NBP under the diffusion approximation,
+
+  -∇·(D(r, λ)∇Φ(r, λ)) + μ_a(r, λ)Φ(r, λ) = q(r, λ),
+  D = 1/(3(μ_a + μ_s')),
+
+as a fast alternative to Monte Carlo simulation, e.g., for screening and
+training data. The equation is discretized by cell-centered finite
+volumes over the tissue voxels, with harmonic means of `D` on the faces
+between voxels. On faces to the surrounding medium (coupling water or
+air), the partial-current (Robin) boundary condition with index mismatch
+[Haskell1994] holds,
+
+  Φ + 2AD ∂Φ/∂n = 4E,   A = (1 + R_eff)/(1 - R_eff),
+
+where `E` is the incident irradiance and `R_eff` is the effective
+reflection coefficient of the relative refractive index n_tissue/n_outside
+[Groenhuis1983], with the indices of `Opt_prop.n`.
+
+All wavelengths share the face structure of the grid, so the operators of
+all wavelengths are applied at once as G^T W G + diag(μ_a), with the face
+incidence matrix G and the face coefficients W per wavelength, and the
+wavelengths are solved together by a batched preconditioned conjugate
+gradient (CG) method. The preconditioner is either Jacobi, or one
+smoothed aggregation multigrid hierarchy (`pyamg`), built once on the
+wavelength-averaged operator and reused for all wavelengths.
+
+Reference:
+  [Haskell1994] R. C. Haskell et al., "Boundary conditions for the
+          diffusion equation in radiative transfer," J. Opt. Soc. Am. A 11
+          2727-2741 https://doi.org/10.1364/JOSAA.11.002727 (1994)
+  [Groenhuis1983] R. A. J. Groenhuis, H. A. Ferwerda, J. J. Ten Bosch,
+          "Scattering and absorption of turbid materials determined from
+          reflection measurements. 1: Theory," Appl. Opt. 22 2456-2462
+          https://doi.org/10.1364/AO.22.002456 (1983)
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import numpy as np
+import scipy.sparse as sp
+
+try:
+  import pyamg
+except ImportError:
+  pyamg = None
+
+from .parameters import Tissue_type
+
+# Refractive index of the coupling water, absent from `Opt_prop.n`
+N_WATER = 1.33
+
+
+def EffectiveReflection(n_rel: np.ndarray) -> np.ndarray:
+  '''Return the effective reflection coefficient of relative refractive
+  indices [Groenhuis1983].'''
+  n_rel = np.asarray(n_rel, dtype=np.float64)
+  r = -1.440/n_rel**2 + 0.710/n_rel + 0.668 + 0.0636*n_rel
+  return np.clip(r, 0., 1.)
+
+
+class Diffusion_system:
+  '''Finite-volume diffusion operator over the tissue voxels of a label map.
+
+  :param labelmap: uint8 tissue label map.
+  :param n_lut: Lookup array of the refractive index (see
+    `optical_scattering.OptLUT`).
+  :param voxel_size: Voxel size [mm].
+  :param domain: Boolean mask of the tissue voxels (default: labels with a
+    refractive index, except air).
+  :param n_outside: Refractive index of labels without one, e.g., water.
+  '''
+  def __init__(self, labelmap: np.ndarray, n_lut: np.ndarray,
+               voxel_size: float, domain: np.ndarray = None,
+               n_outside: float = N_WATER) -> None:
+    labelmap = np.asarray(labelmap)
+    n_lut    = np.asarray(n_lut, dtype=np.float64)
+    if domain is None:
+      domain = np.isfinite(n_lut)[labelmap] & (labelmap != Tissue_type.air)
+    self.shape = labelmap.shape
+    self.h     = float(voxel_size)
+    self.index = np.flatnonzero(domain)
+    n          = self.index.size
+
+    # Position of each voxel in the system (-1 outside the domain)
+    self.pos = np.full(labelmap.size, -1, dtype=np.int64)
+    self.pos[self.index] = np.arange(n)
+
+    coord  = np.unravel_index(self.index, self.shape)
+    stride = np.array([int(np.prod(self.shape[d+1:]))
+                       for d in range(len(self.shape))])
+    face, bnd_row, bnd_voxel = [], [], []
+    for d in range(len(self.shape)):
+      for step in (-1, 1):
+        r     = np.arange(n)
+        valid = (coord[d] + step >= 0) & (coord[d] + step < self.shape[d])
+        nb    = np.where(valid, self.index + step*stride[d], -1)
+        p     = np.where(valid, self.pos[np.maximum(nb, 0)], -1)
+        # Interior faces once, from the lower voxel
+        inner = (p >= 0) & (step == 1)
+        face.append(np.stack([r[inner], p[inner]]))
+        # Faces to the outside, including the grid edges
+        b = p < 0
+        bnd_row.append(r[b])
+        bnd_voxel.append(nb[b])
+    face           = np.concatenate(face, axis=1)
+    self.bnd_row   = np.concatenate(bnd_row)
+    self.bnd_voxel = np.concatenate(bnd_voxel)
+
+    # Endpoints of each interior face
+    self.lo, self.hi = face
+    m       = face.shape[1]
+    self.G  = sp.csr_matrix((np.concatenate([np.ones(m), -np.ones(m)]),
+                             (np.tile(np.arange(m), 2), face.ravel())),
+                            shape=(m, n))
+    self.GT = self.G.T.tocsr()
+
+    # Index mismatch on the outside faces (grid edges: outside medium)
+    flat    = labelmap.ravel()
+    n_in    = n_lut[flat[self.index[self.bnd_row]]]
+    n_out   = np.where(self.bnd_voxel >= 0,
+                       n_lut[flat[np.maximum(self.bnd_voxel, 0)]], np.nan)
+    n_out   = np.where(np.isfinite(n_out), n_out, n_outside)
+    r_eff   = EffectiveReflection(n_in/n_out)
+    self.A  = (1. + r_eff)/(1. - r_eff)
+    self.ml = None
+
+  def Coefficient(self, mu_a: np.ndarray, mu_sp: np.ndarray) -> tuple:
+    '''Return the face coefficients (face, L), the diagonal (voxel, L), and
+    the boundary weights (outside face, L) of L wavelengths.
+
+    :param mu_a: `μ_a` [1/mm] at the domain voxels, of shape (voxel, L).
+    :param mu_sp: `μ_s'` [1/mm] at the domain voxels, of shape (voxel, L).
+    '''
+    h    = self.h
+    D    = 1./(3.*(mu_a + mu_sp))
+    w    = 2.*D[self.lo]*D[self.hi]/(D[self.lo] + D[self.hi])/(h*h)
+    # Robin condition with the ghost value half a voxel outside
+    Db   = D[self.bnd_row]
+    beta = 2.*Db/(h*h + 4.*self.A[:, None]*Db*h)
+    diag = mu_a + self.Scatter(beta)
+    return w, diag, beta
+
+  def Scatter(self, value: np.ndarray) -> np.ndarray:
+    '''Sum values of shape (outside face, L) into the voxels.'''
+    return np.stack([np.bincount(self.bnd_row, weights=value[:, k],
+                                 minlength=self.index.size)
+                     for k in range(value.shape[1])], axis=1)
+
+  def Restrict(self, value, n_wavelength: int) -> np.ndarray:
+    '''Return values of shape (voxel, L) at the domain voxels from a map
+    (or a stack of maps per wavelength) or a scalar.'''
+    value = np.asarray(value, dtype=np.float64)
+    if value.ndim == 0:
+      return np.full((self.index.size, n_wavelength), float(value))
+    value = value.reshape(-1, int(np.prod(self.shape)))
+    return np.broadcast_to(value[:, self.index].T,
+                           (self.index.size, n_wavelength))
+
+  def Preconditioner(self, w: np.ndarray, diag: np.ndarray,
+                     backend: str):
+    '''Return the preconditioner, applied to arrays of shape (voxel, L).'''
+    if backend == 'amg':
+      if pyamg is None:
+        raise ImportError("Backend 'amg' requires pyamg")
+      # One hierarchy of the wavelength-averaged operator for all
+      # wavelengths, reused for further solves on this grid
+      if self.ml is None:
+        A = (self.GT @ sp.diags(w.mean(axis=1)) @ self.G
+             + sp.diags(diag.mean(axis=1))).tocsr()
+        self.ml = pyamg.smoothed_aggregation_solver(A,
+                                                    symmetry='symmetric')
+      M = self.ml.aspreconditioner(cycle='V')
+      return lambda r: np.stack([M.matvec(r[:, k])
+                                 for k in range(r.shape[1])], axis=1)
+    if backend == 'cg':
+      inv = 1./(abs(self.GT) @ w + diag)
+      return lambda r: inv*r
+    raise ValueError(f"Unknown backend '{backend}'")
+
+  def Solve(self, mu_a: np.ndarray, mu_sp: np.ndarray, incident=1.,
+            source=None, rtol: float = 1e-6, maxiter: int = 1000,
+            backend: str = None, fill: float = 0.) -> np.ndarray:
+    '''Solve for the fluence of all wavelengths together.
+
+    :param mu_a: `μ_a` [1/mm] of shape (wavelength, *map shape) (see
+      `optical_absorption.CalculateMuA`).
+    :param mu_sp: `μ_s'` [1/mm] of the same shape (see
+      `optical_scattering.CalculateMuS`).
+    :param incident: Incident irradiance, as a scalar on the whole surface
+      or as a map (per wavelength) given at the outside voxels.
+    :param source: Optional volumetric source `q` as a map (per
+      wavelength).
+    :param backend: 'amg' or 'cg' (default: 'amg' if `pyamg` is
+      installed).
+    :param fill: Fluence outside the domain.
+    :return: Fluence of shape (wavelength, *map shape).
+    '''
+    shape   = self.shape
+    mu_a    = np.asarray(mu_a).reshape((-1,) + shape)
+    L       = mu_a.shape[0]
+    a       = self.Restrict(mu_a, L)
+    w, diag, beta = self.Coefficient(a, self.Restrict(mu_sp, L))
+
+    # Incident irradiance per outside face
+    incident = np.asarray(incident, dtype=np.float64)
+    if incident.ndim == 0:
+      E = np.full(beta.shape, float(incident))
+    else:
+      incident = incident.reshape(-1, int(np.prod(shape)))
+      E = np.where(self.bnd_voxel[:, None] >= 0,
+                   incident[:, np.maximum(self.bnd_voxel, 0)].T, 0.)
+    b = self.Scatter(4.*beta*E)
+    if source is not None:
+      b = b + self.Restrict(source, L)
+
+    def Apply(x):
+      return self.GT @ (w*(self.G @ x)) + diag*x
+
+    backend = backend or ('amg' if pyamg is not None else 'cg')
+    M       = self.Preconditioner(w, diag, backend)
+    # Batched preconditioned CG, one column per wavelength
+    x     = np.zeros_like(b)
+    r     = b.copy()
+    z     = M(r)
+    p     = z.copy()
+    rz    = np.sum(r*z, axis=0)
+    bnorm = np.linalg.norm(b, axis=0)
+    bnorm[bnorm == 0.] = 1.
+    active = np.linalg.norm(r, axis=0) > rtol*bnorm
+    for it in range(maxiter):
+      if not active.any():
+        break
+      Ap    = Apply(p)
+      alpha = np.where(active, rz/np.sum(p*Ap, axis=0), 0.)
+      x    += alpha*p
+      r    -= alpha*Ap
+      z     = M(r)
+      rz_new = np.sum(r*z, axis=0)
+      p     = z + np.where(active, rz_new/rz, 0.)*p
+      rz    = rz_new
+      # Residual after the update, so the last iteration may converge
+      active = np.linalg.norm(r, axis=0) > rtol*bnorm
+    if active.any():
+      raise RuntimeError(f'CG did not converge in {maxiter} iterations')
+
+    phi = np.full((L, int(np.prod(shape))), fill, dtype=np.float64)
+    phi[:, self.index] = x.T
+    return phi.reshape((L,) + shape)
+
+
+def CalculateFluence(labelmap: np.ndarray, mu_a: np.ndarray,
+                     mu_sp: np.ndarray, n_lut: np.ndarray,
+                     voxel_size: float, incident=1., **kwargs
+                     ) -> np.ndarray:
+  '''Compute the fluence of shape (wavelength, *map shape) on a label map
+  (see `Diffusion_system.Solve`).'''
+  system = Diffusion_system(labelmap, n_lut, voxel_size)
+  return system.Solve(mu_a, mu_sp, incident, **kwargs)
@@ -0,0 +1,155 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Functional numerical breast phantom (NBP) generation
+───────────────────────────────────────────────────────────────────────────
+This generates the functional NBP, i.e., oxygen saturation `s` and volume
+fractions of blood `f_b`, water `f_w`, fat `f_f`, and melanosome `f_m`
+maps, from a tissue label map using `Func_prop`.
+
+Properties of the 'remainder' kind are computed per root tissue as
+1 - (f_b + f_w + f_m) of that tissue, and are shared by the tissues aliased
+to it (e.g., PA and necrotic core take f_{f,VTC}). Properties marked as PDE
+are computed by `pde_computation.SolvePDE`, with Dirichlet values from
+artery, vein, and VTC. Optionally, `s` is drawn per vessel (connected
+component of artery or vein) by `vessel_component.SampleVesselS`, before
+the PDE. The coupling water outside the breast, which `Func_prop` leaves
+undefined, takes the properties of `WATER`. The maps are written slab by
+slab through memory maps, and the PDE step updates them in place.
+
+Reference:
+  [Park2023] Seonyeong Park, Umberto Villa, Fu Li, Refik Mert Cam,
+          Alexander A. Oraevsky, Mark A. Anastasio, "Stochastic three-
+          dimensional numerical phantoms to enable computational studies in
+          quantitative optoacoustic computed tomography of breast cancer,"
+          J. Biomed. Opt. 28(6) 066002 (20 June 2023)
+          https://doi.org/10.1117/1.JBO.28.6.066002
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import os
+
+import numpy as np
+
+from .parameters import Func_prop, Tissue_type
+from .lookup_table import CompileProp, TissueLabel, AssignPropLUT
+from .sampling import SampleComposition
+from .pde_computation import PDELabels, DirichletLabels, SolvePDE
+from .vessel_component import SampleVesselS
+from .volume_io import OpenVolume, CreateVolume, Slabs, SLAB
+
+FUNC_NAME = ('s', 'f_b', 'f_w', 'f_f', 'f_m')
+
+# Functional properties of the coupling water outside the breast
+WATER = {'s': 0., 'f_b': 0., 'f_w': 1., 'f_f': 0., 'f_m': 0.}
+
+
+def WaterLUT(lut: dict) -> dict:
+  '''Return a copy of the functional lookup arrays with the entries of
+  water that the tables leave undefined (NaN) set to `WATER`.'''
+  out = dict(lut)
+  for name in FUNC_NAME:
+    out[name] = np.array(lut[name], dtype=np.float64)
+    if np.isnan(out[name][Tissue_type.water]):
+      out[name][Tissue_type.water] = WATER[name]
+  return out
+
+
+def FuncLUT(sample: dict = None, index: int = 0, seed=None) -> dict:
+  '''Return lookup arrays of the functional properties for one
+  realization, with 'remainder' entries resolved and water set (see
+  `WaterLUT`). PDE entries are NaN.
+
+  :param sample: Realizations from `sampling.SampleComposition` (or
+    `sampling.SampleTable`); drawn with `seed` if not given.
+  :param index: Index of the realization in `sample`.
+  '''
+  table = CompileProp(Func_prop)
+  if sample is None:
+    sample = SampleComposition(table, 1, np.random.default_rng(seed))[0]
+    index  = 0
+  lut = {name: table[name].CompileBatch(sample[name][index:index+1])[0]
+         for name in FUNC_NAME}
+
+  remainder = {}
+  for tissue in table['f_f'].Roots('remainder'):
+    label = TissueLabel(tissue)
+    remainder[tissue] = 1. - (lut['f_b'][label] + lut['f_w'][label]
+                              + lut['f_m'][label])
+  value = {t: sample['f_f'][index][t] for t in table['f_f'].Roots('random')}
+  lut['f_f'] = table['f_f'].Compile({**value, **remainder})
+  return WaterLUT(lut)
+
+
+def ApplyPDE(labelmap: np.ndarray, func: dict, x0: dict = None,
+             **kwargs) -> dict:
+  '''Compute the PDE-marked properties of the functional maps in place.
+
+  :param func: Functional maps from the lookup arrays.
+  :param x0: Initial guesses keyed by property name (warm start).
+  :param kwargs: Options of `pde_computation.SolvePDE`.
+  '''
+  for name in FUNC_NAME:
+    table  = getattr(Func_prop, name)
+    active = PDELabels(table)
+    if active.size == 0:
+      continue
+    bnd = np.isin(labelmap, DirichletLabels(table))
+    u   = SolvePDE(labelmap, active, np.where(bnd, func[name], np.nan),
+                   x0=(x0 or {}).get(name), **kwargs)
+    is_active = np.isin(labelmap, active)
+    func[name][is_active] = u[is_active]
+  return func
+
+
+def GenerateFuncMap(labelmap, out_dir: str = None, lut: dict = None,
+                    seed=None, shape: tuple = None, pde: bool = True,
+                    x0: dict = None, vessel: bool = False,
+                    slab: int = SLAB, dtype=np.float32) -> dict:
+  '''Generate the functional NBP by streaming over the label map.
+
+  :param labelmap: uint8 tissue label map, or path to it (see
+    `volume_io.OpenVolume`).
+  :param out_dir: Directory of the output maps, '<name>.npy'; the maps are
+    returned in memory if not given.
+  :param lut: Lookup arrays from `FuncLUT`; sampled with `seed` if not
+    given. Undefined entries of water are set (see `WaterLUT`).
+  :param pde: Whether to compute the PDE-marked properties.
+  :param x0: Initial guesses of the PDE-marked properties (warm start).
+  :param vessel: Whether to draw `s` per artery and vein component, with
+    a generator spawned from `seed`.
+  :param slab: Number of z-slices per slab.
+  :return: Functional maps (memory-mapped if `out_dir` is given) keyed by
+    property name.
+  '''
+  labelmap = OpenVolume(labelmap, shape)
+  lut      = WaterLUT(FuncLUT(seed=seed) if lut is None else lut)
+  lut      = {name: np.asarray(lut[name], dtype=dtype) for name in FUNC_NAME}
+  if out_dir is None:
+    func = {name: np.empty(labelmap.shape, dtype) for name in FUNC_NAME}
+  else:
+    func = {name: CreateVolume(os.path.join(out_dir, f'{name}.npy'),
+                               labelmap.shape, dtype)
+            for name in FUNC_NAME}
+
+  for z in Slabs(labelmap.shape[0], slab):
+    label = np.ascontiguousarray(labelmap[z])
+    for name in FUNC_NAME:
+      AssignPropLUT(label, lut[name], out=func[name][z])
+  if vessel:
+    rng = np.random.default_rng(seed).spawn(1)[0]
+    SampleVesselS(func['s'], labelmap, rng, slab=slab)
+  if pde:
+    ApplyPDE(labelmap, func, x0)
+
+  for name in FUNC_NAME:
+    if isinstance(func[name], np.memmap):
+      func[name].flush()
+  return func
@@ -0,0 +1,114 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Initial pressure generation
+───────────────────────────────────────────────────────────────────────────
+This generates the initial pressure distribution
+
+  p_0(r, λ) = Γ(r)μ_a(r, λ)Φ(r, λ),
+
+at multiple wavelengths from a tissue label map, the functional NBP
+(chromophore volume fractions of `Func_prop`), a light fluence `Φ` (e.g.,
+from `fluence.Diffusion_system` or a Monte Carlo simulation), and a table
+of the Grüneisen parameter `Γ` per tissue, in the format of the tables of
+`parameters` (see `lookup_table`).
+
+All inputs are read through memory maps in slabs along the z-axis, and
+`μ_a` (Eq. (1) [Park2023]), `Γ`, and their product with `Φ` are computed
+per slab in place, so no temporary array of the full volume is built. The
+p_0 maps of all wavelengths are written into one memory-mapped file of
+shape (wavelength, z, y, x), slab by slab.
+
+Reference:
+  [Park2023] Seonyeong Park, Umberto Villa, Fu Li, Refik Mert Cam,
+          Alexander A. Oraevsky, Mark A. Anastasio, "Stochastic three-
+          dimensional numerical phantoms to enable computational studies in
+          quantitative optoacoustic computed tomography of breast cancer,"
+          J. Biomed. Opt. 28(6) 066002 (20 June 2023)
+          https://doi.org/10.1117/1.JBO.28.6.066002
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import numpy as np
+
+from .lookup_table import Lookup_table, AssignPropLUT
+from .optical_absorption import ChromophoreSpectra, ChromophoreFraction
+from .functional_map import FUNC_NAME
+from .volume_io import OpenVolume, CreateVolume, Slabs, SLAB
+
+# Grüneisen parameter Γ (relative; uniform, i.e., p_0 proportional to the
+# absorbed optical energy density)
+GRUENEISEN = {
+  'water':      1.,
+  'fat':        1.,
+  'dermis':     'fat',
+  'epidermis':  'fat',
+  'glandular':  'fat',
+  'nipple':     'fat',
+  'ligament':   'fat',
+  'tdlu':       'fat',
+  'duct':       'fat',
+  'artery':     'fat',
+  'vein':       'fat',
+  'pa':         'fat',
+  'vtc':        'fat',
+  'nc':         'fat',
+  'air':        0.
+}
+
+
+def GrueneisenLUT(table: dict = GRUENEISEN) -> np.ndarray:
+  '''Return the lookup array of the Grüneisen parameter of a table of
+  constants per tissue.'''
+  lut = Lookup_table(table, 'grueneisen')
+  if lut.Roots('random') or lut.Roots('pde') or lut.Roots('remainder'):
+    raise ValueError('Grüneisen parameters must be constants')
+  return lut.Compile()
+
+
+def GenerateP0Map(labelmap, func: dict, wavelength, c_thbb: float, fluence,
+                  out_path: str, grueneisen=GRUENEISEN, shape: tuple = None,
+                  slab: int = SLAB, dtype=np.float32) -> np.ndarray:
+  '''Calculate p_0 maps slab by slab and write them into a memory-mapped
+  file of shape (wavelength, z, y, x).
+
+  :param labelmap: uint8 tissue label map, or path to it (see
+    `volume_io.OpenVolume`).
+  :param func: Functional NBPs (arrays or memory maps) keyed by 's', 'f_b',
+    'f_w', 'f_f', and 'f_m'.
+  :param wavelength: Wavelengths [nm].
+  :param c_thbb: Molar concentration of hemoglobin in blood [μM].
+  :param fluence: Fluence of shape (wavelength, z, y, x), as an array or
+    memory map, or path to a `.npy` file.
+  :param out_path: Path of the output, `.npy` or raw binary file.
+  :param grueneisen: Table of the Grüneisen parameter per tissue, or its
+    lookup array of shape (256,).
+  '''
+  labelmap = OpenVolume(labelmap, shape)
+  fluence  = OpenVolume(fluence)
+  E        = ChromophoreSpectra(wavelength, c_thbb)
+  gamma    = GrueneisenLUT(grueneisen) if isinstance(grueneisen, dict) \
+             else np.asarray(grueneisen)
+  gamma    = gamma.astype(np.float64)
+  if fluence.shape != (len(E),) + labelmap.shape:
+    raise ValueError(f'Fluence of shape {fluence.shape} does not match '
+                     f'{(len(E),) + labelmap.shape}')
+  p0 = CreateVolume(out_path, (len(E),) + labelmap.shape, dtype)
+
+  for z in Slabs(labelmap.shape[0], slab):
+    shape_z = (len(E), z.stop - z.start) + labelmap.shape[1:]
+    # Slab of μ_a of all wavelengths, then Γ and Φ multiplied in place
+    mu_a    = E @ ChromophoreFraction(*(func[k][z] for k in FUNC_NAME))
+    mu_a    = mu_a.reshape(shape_z)
+    mu_a   *= AssignPropLUT(np.ascontiguousarray(labelmap[z]), gamma)
+    mu_a   *= fluence[:, z]
+    p0[:, z] = mu_a
+  p0.flush()
+  return p0
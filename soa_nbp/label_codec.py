@@ -0,0 +1,158 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Run-length encoding of tissue label maps
+───────────────────────────────────────────────────────────────────────────
+This includes a class `Label_rle` to store tissue label maps compactly by
+run-length encoding along the x-axis (the last axis). Label maps are mostly
+background, water, and fat, with thin skin layers and sparse vessels, so
+most rows consist of a few long runs.
+
+The runs of each row (z, y) are stored consecutively as a label (uint8)
+and a length (uint16, or uint32 for rows longer than 65535 voxels), along
+with the number of runs per row and the offset of the first run of each
+z-slice, so that any z-range is decoded without reading the other runs.
+A region is decoded either to labels or directly to a property map by
+gathering a lookup array (see `lookup_table`) per run before expanding the
+runs, without materializing the dense label map.
+
+File format (little endian): the magic string b'NBPRLE1\\n', the length of
+a JSON header (uint32), the header with the shape and the data types, and
+the arrays of slice offsets, run counts per row, run labels, and run
+lengths. Saved files are opened as memory maps.
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import json
+
+import numpy as np
+
+from .volume_io import OpenVolume, Slabs, SLAB
+
+MAGIC = b'NBPRLE1\n'
+
+
+class Label_rle:
+  '''Run-length encoded label map.
+
+  :param shape: Shape (z, y, x) of the label map.
+  :param slice_offset: Offset of the first run of each z-slice, of shape
+    (z + 1,).
+  :param row_count: Number of runs of each row (z, y), of shape (z*y,).
+  :param value: Label of each run.
+  :param length: Length of each run.
+  '''
+  ARRAY = ('slice_offset', 'row_count', 'value', 'length')
+
+  def __init__(self, shape: tuple, slice_offset: np.ndarray,
+               row_count: np.ndarray, value: np.ndarray,
+               length: np.ndarray) -> None:
+    self.shape        = tuple(int(n) for n in shape)
+    self.slice_offset = slice_offset
+    self.row_count    = row_count
+    self.value        = value
+    self.length       = length
+
+  @classmethod
+  def Encode(cls, labelmap, shape: tuple = None,
+             slab: int = SLAB) -> 'Label_rle':
+    '''Encode a uint8 label map (or path to it) slab by slab.'''
+    labelmap   = OpenVolume(labelmap, shape)
+    nz, ny, nx = labelmap.shape
+    len_dtype  = np.uint16 if nx <= np.iinfo(np.uint16).max else np.uint32
+    slice_offset, row_count, value, length = [[0]], [], [], []
+    n_run = 0
+    for z in Slabs(nz, slab):
+      row   = np.ascontiguousarray(labelmap[z]).reshape(-1, nx)
+      start = np.ones(row.shape, dtype=bool)
+      start[:, 1:] = row[:, 1:] != row[:, :-1]
+      pos   = np.flatnonzero(start)
+      value.append(row.ravel()[pos])
+      length.append(np.diff(pos, append=row.size).astype(len_dtype))
+      count = np.bincount(pos//nx, minlength=row.shape[0])
+      row_count.append(count.astype(len_dtype))
+      slice_offset.append(n_run + np.cumsum(count.reshape(-1, ny).sum(1)))
+      n_run += pos.size
+    return cls(labelmap.shape, np.concatenate(slice_offset).astype(np.int64),
+               np.concatenate(row_count),
+               np.concatenate(value).astype(np.uint8),
+               np.concatenate(length))
+
+  @classmethod
+  def Load(cls, path: str) -> 'Label_rle':
+    '''Open a run-length encoded label map as memory maps.'''
+    with open(path, 'rb') as f:
+      if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"'{path}' is not a run-length encoded label map")
+      size   = int(np.frombuffer(f.read(4), dtype='<u4')[0])
+      header = json.loads(f.read(size))
+    offset = len(MAGIC) + 4 + size
+    array  = {}
+    for name in cls.ARRAY:
+      dtype, n = np.dtype(header[name][0]), header[name][1]
+      array[name] = np.memmap(path, dtype=dtype, mode='r', offset=offset,
+                              shape=(n,))
+      offset += dtype.itemsize*n
+    return cls(header['shape'], **array)
+
+  def Save(self, path: str) -> None:
+    '''Save the encoded label map.'''
+    array  = {name: np.asarray(getattr(self, name)) for name in self.ARRAY}
+    array  = {name: a.astype(a.dtype.newbyteorder('<'))
+              for name, a in array.items()}
+    header = {'shape': self.shape}
+    header.update({name: [a.dtype.str, a.size] for name, a in array.items()})
+    header = json.dumps(header).encode()
+    with open(path, 'wb') as f:
+      f.write(MAGIC)
+      f.write(np.array(len(header), dtype='<u4').tobytes())
+      f.write(header)
+      for a in array.values():
+        f.write(a.tobytes())
+
+  @property
+  def nbytes(self) -> int:
+    '''Size of the encoded arrays in bytes.'''
+    return sum(getattr(self, name).nbytes for name in self.ARRAY)
+
+  @property
+  def ratio(self) -> float:
+    '''Compression ratio relative to the dense uint8 label map.'''
+    return float(np.prod(self.shape))/self.nbytes
+
+  def Decode(self, lut: np.ndarray = None, z_range: tuple = None,
+             y_range: tuple = None, x_range: tuple = None,
+             dtype=None) -> np.ndarray:
+    '''Decode a region to labels, or to a property map if a lookup array
+    is given.
+
+    :param lut: Lookup array of shape (256,) of a property.
+    :param z_range: Range (start, stop) of z (default: all); likewise for
+      `y_range` and `x_range`.
+    '''
+    nz, ny, nx = self.shape
+    z0, z1 = z_range or (0, nz)
+    y0, y1 = y_range or (0, ny)
+    x0, x1 = x_range or (0, nx)
+    if lut is None:
+      dtype = np.uint8
+    else:
+      dtype = dtype or np.asarray(lut).dtype
+    out = np.empty((z1 - z0, y1 - y0, x1 - x0), dtype=dtype)
+    for z in range(z0, z1):
+      count = np.asarray(self.row_count[z*ny:(z + 1)*ny], dtype=np.int64)
+      r0 = self.slice_offset[z] + count[:y0].sum()
+      r1 = r0 + count[y0:y1].sum()
+      v  = np.asarray(self.value[r0:r1])
+      if lut is not None:
+        v = np.asarray(lut, dtype=dtype)[v]
+      row = np.repeat(v, np.asarray(self.length[r0:r1], dtype=np.int64))
+      out[z - z0] = row.reshape(y1 - y0, nx)[:, x0:x1]
+    return out
@@ -0,0 +1,156 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Per-label voxel index of tissue label maps
+───────────────────────────────────────────────────────────────────────────
+This includes a class `Label_index` to group the voxels of a tissue label
+map by `Tissue_type` label, built in one pass by a counting sort of the
+flat voxel indices. The index is stored as offsets (257,) and indices
+(voxel,), where the voxels of label `l` are
+
+  index[offset[l]:offset[l+1]].
+
+Per-tissue assignment, statistics, and random sampling then touch only the
+voxels of that tissue, instead of scanning the whole volume with one
+`labelmap == label` mask per tissue and per property. The index is saved
+next to the label map so that later runs skip the build.
+
+The index is a standalone tool, not used by the map generators: their
+per-label lookups are one gather of a lookup array over the whole volume
+(see `lookup_table.AssignPropLUT`), which the index would not speed up.
+It pays off for repeated per-tissue work on one label map, e.g.,
+statistics of a map per tissue or values drawn per voxel of a tissue.
+Writes into `out` go through `numpy.put`, so `out` may be any writable
+array, including non-contiguous views and memory maps.
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import numpy as np
+
+from .lookup_table import N_LABEL
+from .sampling import SampleSpec
+
+
+class Label_index:
+  '''Voxel index of a label map grouped by label.
+
+  :param offset: Offsets of the labels in `index`, of shape (257,).
+  :param index: Flat voxel indices sorted by label.
+  :param shape: Shape of the label map.
+  '''
+  def __init__(self, offset: np.ndarray, index: np.ndarray,
+               shape: tuple) -> None:
+    self.offset = np.asarray(offset, dtype=np.int64)
+    self.index  = index
+    self.shape  = tuple(int(n) for n in shape)
+
+  @classmethod
+  def Build(cls, labelmap: np.ndarray) -> 'Label_index':
+    '''Build the index of a uint8 label map in one pass.'''
+    labelmap = np.asarray(labelmap)
+    if labelmap.dtype != np.uint8:
+      raise TypeError(f'Label map must be uint8, not {labelmap.dtype}')
+    flat   = labelmap.ravel()
+    count  = np.bincount(flat, minlength=N_LABEL)
+    offset = np.concatenate([[0], np.cumsum(count)])
+    # Stable sort of 8-bit keys is a radix (counting) sort
+    index  = np.argsort(flat, kind='stable')
+    if flat.size <= np.iinfo(np.uint32).max:
+      index = index.astype(np.uint32)
+    return cls(offset, index, labelmap.shape)
+
+  @classmethod
+  def Load(cls, path: str, shape: tuple = None) -> 'Label_index':
+    '''Load an index saved by `Save`, checking the label map shape.'''
+    with np.load(path) as data:
+      index = cls(data['offset'], data['index'], data['shape'])
+    if shape is not None and tuple(shape) != index.shape:
+      raise ValueError(f'Index of shape {index.shape} does not match the '
+                       f'label map of shape {tuple(shape)}')
+    return index
+
+  def Save(self, path: str) -> None:
+    '''Save the index as an uncompressed `.npz` file.'''
+    np.savez(path, offset=self.offset, index=self.index,
+             shape=np.array(self.shape))
+
+  @property
+  def count(self) -> np.ndarray:
+    '''Number of voxels per label.'''
+    return np.diff(self.offset)
+
+  def Labels(self) -> np.ndarray:
+    '''Return the labels present in the label map.'''
+    return np.flatnonzero(self.count).astype(np.uint8)
+
+  def Voxels(self, label) -> np.ndarray:
+    '''Return the flat indices of the voxels of the given label(s).'''
+    label = np.atleast_1d(label)
+    if label.size == 1:
+      return self.index[self.offset[label[0]]:self.offset[label[0] + 1]]
+    return np.concatenate([self.index[self.offset[l]:self.offset[l + 1]]
+                           for l in label])
+
+  def Mask(self, label) -> np.ndarray:
+    '''Return the mask of the voxels of the given label(s).'''
+    mask = np.zeros(self.shape, dtype=bool)
+    mask.ravel()[self.Voxels(label)] = True
+    return mask
+
+  def Assign(self, out: np.ndarray, label, value) -> np.ndarray:
+    '''Assign a value (scalar, or one per voxel) to the voxels of the given
+    label(s) of `out` in place.'''
+    np.put(out, self.Voxels(label), value)
+    return out
+
+  def AssignLUT(self, lut: np.ndarray, out: np.ndarray = None,
+                label=None) -> np.ndarray:
+    '''Assign lookup array values to the voxels of the given labels
+    (default: all labels with a finite value).'''
+    if out is None:
+      out = np.full(self.shape, np.nan, dtype=lut.dtype)
+    label = np.flatnonzero(np.isfinite(lut) & (self.count > 0)) \
+            if label is None else np.atleast_1d(label)
+    for l in label:
+      self.Assign(out, l, lut[l])
+    return out
+
+  def Stats(self, value: np.ndarray) -> np.ndarray:
+    '''Return per-label statistics of a map, as a structured array of shape
+    (256,) with fields 'count', 'mean', 'std', 'min', and 'max'.'''
+    flat  = np.asarray(value).reshape(-1)
+    stats = np.zeros(N_LABEL, dtype=[('count', np.int64),
+                                     ('mean', np.float64),
+                                     ('std', np.float64),
+                                     ('min', np.float64),
+                                     ('max', np.float64)])
+    stats['count'] = self.count
+    stats[['mean', 'std', 'min', 'max']] = np.nan
+    label = self.Labels()
+    if label.size == 0:
+      return stats
+    v     = flat[self.index].astype(np.float64)
+    start = self.offset[label]
+    n     = self.count[label]
+    mean  = np.add.reduceat(v, start)/n
+    dev   = v - np.repeat(mean, n)
+    stats['mean'][label] = mean
+    stats['std'][label]  = np.sqrt(np.add.reduceat(dev*dev, start)/n)
+    stats['min'][label]  = np.minimum.reduceat(v, start)
+    stats['max'][label]  = np.maximum.reduceat(v, start)
+    return stats
+
+  def Sample(self, out: np.ndarray, label, spec,
+             rng: np.random.Generator) -> np.ndarray:
+    '''Draw an independent value per voxel of the given label(s) from a
+    distribution (see `sampling.SpecKind`) into `out` in place.'''
+    voxel = self.Voxels(label)
+    np.put(out, voxel, SampleSpec([spec], voxel.size, rng)[:, 0])
+    return out
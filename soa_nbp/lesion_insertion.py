@@ -0,0 +1,294 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Incremental lesion insertion
+───────────────────────────────────────────────────────────────────────────
+This includes a class `Lesion_inserter` to insert (or replace, or remove)
+a lesion, i.e., a label sub-volume of VTC, necrotic core, and PA, in an
+existing phantom of `ensemble.GeneratePhantom` without regenerating its
+maps. Only the region of the lesion's bounding box plus a halo is read and
+patched in place through memory maps:
+
+  ┌─────────────┬────────────────────────────────────────────────────────┐
+  │ Maps        │ Update in the region                                   │
+  ├─────────────┼────────────────────────────────────────────────────────┤
+  │ Label map   │ Lesion pasted                                          │
+  │ func        │ Lookup values of the voxels whose label changed; PDE-  │
+  │             │ marked voxels re-solved (see below)                    │
+  │ acou        │ Lookup values                                          │
+  │ opt         │ `μ_a` from the functional NBP, `μ_s` and `μ_s'` lookup │
+  │             │ values                                                 │
+  └─────────────┴────────────────────────────────────────────────────────┘
+
+The values of the region are saved before patching and written back when
+the lesion is replaced or removed, so the maps return exactly to the
+healthy phantom between variants and the patched region never grows. They
+are saved into 'lesion.npz' in the phantom directory until then, so a
+lesion inserted by an earlier process is still removed; without that file,
+the label map must equal the healthy one.
+
+The PDE of `pde_computation` is solved on the region only, with its outer
+layer of PDE-marked voxels held at their healthy values as Dirichlet
+values (except at the volume edges), so the halo should cover the range
+over which the lesion perturbs the smooth fields. The lookup arrays are
+rebuilt from the realization recorded in the phantom's metadata, so all
+variants share the properties of the healthy phantom, and voxels keeping
+their label keep their values (e.g., `s` drawn per vessel, see
+`vessel_component`).
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import json
+import os
+
+import numpy as np
+
+from .parameters import Func_prop, Tissue_type
+from .lookup_table import AssignPropLUT
+from .functional_map import FUNC_NAME, FuncLUT
+from .acoustic_map import ACOU_NAME, AcouLUT
+from .optical_absorption import ChromophoreSpectra, ChromophoreFraction
+from .optical_scattering import OptLUT, ScatteringTable
+from .pde_computation import PDELabels, DirichletLabels, SolvePDE
+from .ensemble import META, MetaSample
+from .volume_io import OpenVolume, Slabs
+
+# Default halo around the lesion's bounding box [voxels]
+HALO = 8
+
+# Healthy values of the patched region, in the phantom directory
+SAVED = 'lesion.npz'
+
+
+def OpenMap(path: str) -> np.ndarray:
+  '''Open a `.npy` map as a writable memory map.'''
+  return np.load(path, mmap_mode='r+')
+
+
+class Lesion_inserter:
+  '''Lesion insertion into a phantom, patching its maps in place.
+
+  :param phantom_dir: Directory of a phantom of `ensemble.GeneratePhantom`
+    generated on `healthy`.
+  :param healthy: uint8 tissue label map without lesion, or path to it (see
+    `volume_io.OpenVolume`).
+  :param labelmap: Label map patched with the lesion, as a writable array
+    or memory map, or path to a `.npy` file (default:
+    '<phantom_dir>/labelmap.npy', copied from `healthy` if missing).
+  :param halo: Halo around the lesion's bounding box [voxels].
+  :param shape: Shape (z, y, x) of `healthy` given as a raw file.
+  '''
+  def __init__(self, phantom_dir: str, healthy, labelmap=None,
+               halo: int = HALO, shape: tuple = None) -> None:
+    if halo < 1:
+      raise ValueError('Halo must be at least one voxel')
+    self.healthy = OpenVolume(healthy, shape)
+    self.shape   = self.healthy.shape
+    self.halo    = int(halo)
+    self.path    = os.path.join(phantom_dir, SAVED)
+
+    if labelmap is None:
+      labelmap = os.path.join(phantom_dir, 'labelmap.npy')
+      if not os.path.exists(labelmap):
+        np.save(labelmap, self.healthy)
+    self.labelmap = OpenMap(labelmap) if isinstance(labelmap, str) \
+                    else labelmap
+    if self.labelmap.shape != self.shape:
+      raise ValueError(f'Label map of shape {self.labelmap.shape} does not '
+                       f'match {self.shape}')
+
+    with open(os.path.join(phantom_dir, META)) as f:
+      meta = json.load(f)
+    sample        = MetaSample(meta)
+    self.func_lut = FuncLUT(sample['Func_prop'])
+    self.acou_lut = AcouLUT(sample['Acou_prop'])
+    self.func = {name: OpenMap(os.path.join(phantom_dir, 'func',
+                                            f'{name}.npy'))
+                 for name in FUNC_NAME}
+    self.acou = {name: OpenMap(os.path.join(phantom_dir, 'acou',
+                                            f'{name}.npy'))
+                 for name in ACOU_NAME}
+
+    # Optical NBP, if generated
+    self.opt = {}
+    if meta['wavelength'] is not None:
+      self.E = ChromophoreSpectra(meta['wavelength'], sample['c_thbb'])
+      self.opt_table = dict(zip(('mu_s', 'mu_sp'),
+                                ScatteringTable(meta['wavelength'],
+                                                OptLUT(sample['Opt_prop']))))
+      self.opt = {name: OpenMap(os.path.join(phantom_dir, 'opt',
+                                             f'{name}.npy'))
+                  for name in ('mu_a', 'mu_s', 'mu_sp')}
+
+    # Region and its healthy values, of a lesion inserted before
+    self.saved = self.Load()
+    if self.saved is None and any(
+        not np.array_equal(self.labelmap[z], self.healthy[z])
+        for z in Slabs(self.shape[0])):
+      raise ValueError('Label map differs from the healthy one without '
+                       f"the saved values '{self.path}'")
+
+  def Region(self, box: tuple) -> tuple:
+    '''Return the slices of a bounding box expanded by the halo.'''
+    return tuple(slice(max(s.start - self.halo, 0),
+                       min(s.stop + self.halo, n))
+                 for s, n in zip(box, self.shape))
+
+  def Insert(self, lesion: np.ndarray, origin: tuple,
+             transparent: int = Tissue_type.water) -> tuple:
+    '''Insert a lesion into the healthy phantom, replacing the current
+    one.
+
+    :param lesion: uint8 label sub-volume of the lesion.
+    :param origin: Voxel (z, y, x) of the map at lesion[0, 0, 0].
+    :param transparent: Label of lesion voxels keeping the healthy labels.
+    :return: Slices of the patched region.
+    '''
+    lesion = np.asarray(lesion, dtype=np.uint8)
+    mask   = lesion != transparent
+    if not mask.any():
+      raise ValueError('Lesion has no voxels')
+    index  = [np.flatnonzero(mask.any(axis=tuple(a for a in range(3)
+                                                 if a != d)))
+              for d in range(3)]
+    box    = tuple(slice(int(o + i[0]), int(o + i[-1] + 1))
+                   for o, i in zip(origin, index))
+    if any(s.start < 0 or s.stop > n for s, n in zip(box, self.shape)):
+      raise ValueError(f'Lesion at {tuple(origin)} is out of the map of '
+                       f'shape {self.shape}')
+
+    self.Restore()
+    region = self.Region(box)
+    self.Save(region)
+    label  = np.array(self.labelmap[region])
+    local  = tuple(slice(s.start - r.start, s.stop - r.start)
+                   for s, r in zip(box, region))
+    inner  = tuple(slice(i[0], i[-1] + 1) for i in index)
+    label[local] = np.where(mask[inner], lesion[inner], label[local])
+    self.Patch(region, label)
+    return region
+
+  def Maps(self) -> dict:
+    '''Return all patched maps keyed by name, with the stack axis of the
+    optical maps.'''
+    maps = {'labelmap': (self.labelmap, ())}
+    maps.update({f'func/{k}': (m, ()) for k, m in self.func.items()})
+    maps.update({f'acou/{k}': (m, ()) for k, m in self.acou.items()})
+    maps.update({f'opt/{k}': (m, (slice(None),))
+                 for k, m in self.opt.items()})
+    return maps
+
+  def Save(self, region: tuple) -> None:
+    '''Save the healthy values of a region before patching it, in memory
+    and (atomically) on disk.'''
+    self.saved = (region, {k: np.array(m[stack + region])
+                           for k, (m, stack) in self.Maps().items()})
+    tmp = self.path + '.tmp'
+    with open(tmp, 'wb') as f:
+      np.savez(f, region=[(s.start, s.stop) for s in region],
+               **self.saved[1])
+    os.replace(tmp, self.path)
+
+  def Load(self) -> tuple:
+    '''Load the region and healthy values saved on disk, or None.'''
+    if not os.path.exists(self.path):
+      return None
+    with np.load(self.path) as data:
+      region = tuple(slice(int(a), int(b)) for a, b in data['region'])
+      value  = {k: data[k] for k in data.files if k != 'region'}
+    if set(value) != set(self.Maps()):
+      raise ValueError(f"Saved values '{self.path}' do not match the maps "
+                       'of the phantom')
+    return region, value
+
+  def Restore(self) -> tuple:
+    '''Write back the healthy values of the patched region.
+
+    :return: Slices of the restored region, or None without a lesion.
+    '''
+    if self.saved is None:
+      return None
+    region, value = self.saved
+    for k, (m, stack) in self.Maps().items():
+      m[stack + region] = value[k]
+    self.Flush()
+    os.remove(self.path)
+    self.saved = None
+    return region
+
+  def Remove(self) -> tuple:
+    '''Remove the current lesion, restoring the healthy phantom.
+
+    :return: Slices of the restored region, or None without a lesion.
+    '''
+    return self.Restore()
+
+  def Flush(self) -> None:
+    '''Flush the memory-mapped maps.'''
+    for m, _ in self.Maps().values():
+      if isinstance(m, np.memmap):
+        m.flush()
+
+  def Patch(self, region: tuple, label: np.ndarray) -> None:
+    '''Write the labels of a region and update all maps in it.'''
+    changed = label != self.labelmap[region]
+    self.labelmap[region] = label
+
+    func = {}
+    for name in FUNC_NAME:
+      func[name] = np.array(self.func[name][region], dtype=np.float64)
+      new = AssignPropLUT(label, self.func_lut[name])
+      func[name][changed] = new[changed]
+    self.SolveLocal(region, label, func)
+    for name in FUNC_NAME:
+      self.func[name][region] = func[name]
+
+    for name in ACOU_NAME:
+      self.acou[name][region] = AssignPropLUT(label, self.acou_lut[name])
+
+    if self.opt:
+      stack = (slice(None),) + region
+      F     = ChromophoreFraction(*(func[k] for k in FUNC_NAME))
+      self.opt['mu_a'][stack] = (self.E @ F).reshape((len(self.E),)
+                                                     + label.shape)
+      for name, table in self.opt_table.items():
+        self.opt[name][stack] = table[:, label]
+
+    self.Flush()
+
+  def SolveLocal(self, region: tuple, label: np.ndarray, func: dict
+                 ) -> dict:
+    '''Re-solve the PDE-marked properties of a region in place, with the
+    outer layer of the region (inside the volume) held fixed.'''
+    shell = np.zeros(label.shape, dtype=bool)
+    for d, (s, n) in enumerate(zip(region, self.shape)):
+      index = [slice(None)]*3
+      if s.start > 0:
+        index[d] = 0
+        shell[tuple(index)] = True
+      if s.stop < n:
+        index[d] = -1
+        shell[tuple(index)] = True
+
+    for name in FUNC_NAME:
+      table  = getattr(Func_prop, name)
+      active = PDELabels(table)
+      if active.size == 0:
+        continue
+      is_active = np.isin(label, active)
+      fixed     = shell & is_active
+      bnd       = np.isin(label, DirichletLabels(table)) | fixed
+      u = SolvePDE(label, active, np.where(bnd, func[name], np.nan),
+                   x0=func[name])
+      # Voxels without a solution (e.g., of a component without boundary)
+      # keep their values
+      is_active &= ~fixed & np.isfinite(u)
+      func[name][is_active] = u[is_active]
+    return func
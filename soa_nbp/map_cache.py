@@ -0,0 +1,205 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Content-addressed cache of generated property maps
+───────────────────────────────────────────────────────────────────────────
+This includes a class `Map_cache` to store generated property maps on disk
+under a key computed from everything that determines them:
+
+  - the content of the tissue label map,
+  - the sampled realization of the tissue properties (and any further
+    settings, e.g., wavelengths or breast type),
+  - a canonical serialization of the property tables of `Func_prop`,
+    `Opt_prop`, and `Acou_prop`, and
+  - the package version.
+
+Maps are stored as `.npy` files in one directory per key and returned as
+read-only memory maps, so a cache hit costs no copy. The total size of the
+cache is bounded, evicting the least recently used entries first. Entries
+are written into a temporary directory and renamed on completion, so an
+interrupted write never appears as a hit.
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import hashlib
+import numbers
+import os
+import shutil
+import tempfile
+from collections.abc import Mapping
+
+import numpy as np
+
+from . import parameters
+from .parameters import Func_prop, Opt_prop, Acou_prop
+from .lookup_table import PROP_NAME, GetTable
+from .volume_io import OpenVolume, Slabs
+
+# File marking a complete entry; its modification time is the last access
+STAMP = '.stamp'
+
+
+def Digest(obj, h) -> None:
+  '''Update the hash with a canonical serialization of the object.'''
+  if obj is None:
+    h.update(b'N')
+  elif isinstance(obj, (bool, np.bool_)):
+    h.update(b'B1' if obj else b'B0')
+  elif isinstance(obj, numbers.Integral):
+    h.update(b'I' + str(int(obj)).encode())
+  elif isinstance(obj, numbers.Real):
+    h.update(b'F' + float(obj).hex().encode())
+  elif isinstance(obj, str):
+    h.update(b'S%d:' % len(obj.encode()) + obj.encode())
+  elif isinstance(obj, Mapping):
+    h.update(b'D%d' % len(obj))
+    for key in sorted(obj, key=str):
+      Digest(str(key), h)
+      Digest(obj[key], h)
+  elif isinstance(obj, np.ndarray):
+    a = np.ascontiguousarray(obj)
+    h.update(b'A' + str(a.dtype.descr).encode() + str(a.shape).encode())
+    h.update(a.tobytes())
+  elif isinstance(obj, (list, tuple)):
+    h.update(b'L%d' % len(obj))
+    for item in obj:
+      Digest(item, h)
+  else:
+    raise TypeError(f'Cannot serialize {type(obj).__name__}')
+
+
+def LabelmapDigest(labelmap, shape: tuple = None) -> str:
+  '''Return the hash of the content of a label map, read in slabs.'''
+  labelmap = OpenVolume(labelmap, shape)
+  h = hashlib.blake2b(digest_size=32)
+  h.update(str(labelmap.shape).encode())
+  for z in Slabs(labelmap.shape[0]):
+    h.update(np.ascontiguousarray(labelmap[z]).tobytes())
+  return h.hexdigest()
+
+
+def TableDigest() -> str:
+  '''Return the hash of the property tables.'''
+  h = hashlib.blake2b(digest_size=32)
+  Digest({prop.__name__: {name: GetTable(prop, name)
+                          for name in PROP_NAME[prop.__name__]}
+          for prop in (Func_prop, Opt_prop, Acou_prop)}, h)
+  Digest({'c_thbb': Func_prop.c_thbb, 'y': Acou_prop.y,
+          'wavelength_ref': Opt_prop.mu_sp['wavelength_ref']}, h)
+  return h.hexdigest()
+
+
+class Map_cache:
+  '''Size-bounded, least recently used cache of property maps.
+
+  :param root: Cache directory.
+  :param max_bytes: Maximum total size of the cached maps in bytes.
+  '''
+  def __init__(self, root: str, max_bytes: int) -> None:
+    self.root      = root
+    self.max_bytes = max_bytes
+    os.makedirs(root, exist_ok=True)
+
+  def Key(self, labelmap, realization=None, shape: tuple = None,
+          **setting) -> str:
+    '''Return the key of the maps of a label map and a realization.
+
+    :param labelmap: Label map, or path to it, or its `LabelmapDigest`.
+    :param realization: Sampled tissue properties, e.g., from
+      `sampling.SampleTable`.
+    :param setting: Further settings determining the maps.
+    '''
+    if not (isinstance(labelmap, str) and len(labelmap) == 64
+            and not os.path.exists(labelmap)):
+      labelmap = LabelmapDigest(labelmap, shape)
+    h = hashlib.blake2b(digest_size=32)
+    Digest({'labelmap':    labelmap,
+            'realization': realization,
+            'table':       TableDigest(),
+            'version':     parameters.__version__,
+            'setting':     setting}, h)
+    return h.hexdigest()
+
+  def Path(self, key: str) -> str:
+    '''Return the directory of an entry.'''
+    return os.path.join(self.root, key)
+
+  def Get(self, key: str) -> dict:
+    '''Return the cached maps as read-only memory maps, or None.'''
+    path = self.Path(key)
+    try:
+      os.utime(os.path.join(path, STAMP))
+      return {f[:-4]: np.load(os.path.join(path, f), mmap_mode='r')
+              for f in sorted(os.listdir(path)) if f.endswith('.npy')}
+    except FileNotFoundError:
+      # Missing, or evicted concurrently by another process
+      return None
+
+  def Put(self, key: str, maps: dict) -> dict:
+    '''Store maps keyed by name and return them as memory maps.'''
+    tmp = tempfile.mkdtemp(prefix='.tmp-', dir=self.root)
+    try:
+      for name, value in maps.items():
+        np.save(os.path.join(tmp, f'{name}.npy'), np.asarray(value))
+      open(os.path.join(tmp, STAMP), 'w').close()
+      try:
+        os.rename(tmp, self.Path(key))
+      except OSError:
+        # Stored concurrently by another process
+        shutil.rmtree(tmp, ignore_errors=True)
+    except BaseException:
+      shutil.rmtree(tmp, ignore_errors=True)
+      raise
+    self.Evict(keep=key)
+    return self.Get(key)
+
+  def GetOrCreate(self, key: str, create) -> dict:
+    '''Return the cached maps, creating them with `create()` on a miss.'''
+    maps = self.Get(key)
+    return maps if maps is not None else self.Put(key, create())
+
+  def Entries(self) -> list:
+    '''Return (last access, size, key) of the complete entries.'''
+    entry = []
+    for key in os.listdir(self.root):
+      stamp = os.path.join(self.Path(key), STAMP)
+      if key.startswith('.') or not os.path.exists(stamp):
+        continue
+      size = sum(os.path.getsize(os.path.join(self.Path(key), f))
+                 for f in os.listdir(self.Path(key)))
+      entry.append((os.path.getmtime(stamp), size, key))
+    return sorted(entry)
+
+  def Evict(self, keep: str = None) -> list:
+    '''Remove least recently used entries until the cache fits its size.
+
+    :param keep: Key never evicted, e.g., the entry just stored.
+    :return: Evicted keys.
+    '''
+    entry   = self.Entries()
+    total   = sum(size for _, size, _ in entry)
+    evicted = []
+    for _, size, key in entry:
+      if total <= self.max_bytes:
+        break
+      if key == keep:
+        continue
+      # Rename first so that readers never see a partial entry
+      trash = tempfile.mkdtemp(prefix='.del-', dir=self.root)
+      os.rename(self.Path(key), os.path.join(trash, key))
+      shutil.rmtree(trash, ignore_errors=True)
+      total -= size
+      evicted.append(key)
+    return evicted
+
+  def Clear(self) -> None:
+    '''Remove all entries.'''
+    for key in os.listdir(self.root):
+      shutil.rmtree(self.Path(key), ignore_errors=True)
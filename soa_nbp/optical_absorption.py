@@ -0,0 +1,151 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Multi-wavelength optical absorption coefficient
+───────────────────────────────────────────────────────────────────────────
+This computes optical absorption coefficient `μ_a` (mm^{-1}) maps at
+multiple wavelengths from the functional NBPs, i.e., oxygen saturation `s`
+and volume fractions of blood `f_b`, water `f_w`, fat `f_f`, and
+melanosome `f_m`, following Eq. (1) [Park2023]:
+
+  μ_a = log(10)*c_tHb*f_b*(s*ϵ_{HbO_2} + (1.-s)*ϵ_{Hb})
+        + f_w*μ_{a,w} + f_f*μ_{a,f} + f_m*μ_{a,m}.
+
+Eq. (1) is linear in the chromophore fractions
+
+  F = [f_b*s, f_b*(1.-s), f_w, f_f, f_m],
+
+so the `μ_a` maps at all wavelengths are obtained by one matrix product
+E @ F, where E (wavelength × chromophore) holds the chromophore spectra
+interpolated at the requested wavelengths. The spectra are loaded from
+`parameters/constants.mat` (430-1300 nm in 1 nm steps); the spectra of fat
+and melanin are tabulated up to 1098 and 1200 nm only, so the wavelengths
+must lie in the range tabulated for every chromophore used.
+
+Reference:
+  [Park2023] Seonyeong Park, Umberto Villa, Fu Li, Refik Mert Cam,
+          Alexander A. Oraevsky, Mark A. Anastasio, "Stochastic three-
+          dimensional numerical phantoms to enable computational studies in
+          quantitative optoacoustic computed tomography of breast cancer,"
+          J. Biomed. Opt. 28(6) 066002 (20 June 2023)
+          https://doi.org/10.1117/1.JBO.28.6.066002
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import functools
+import math
+import os
+
+import numpy as np
+import scipy.io
+
+from . import parameters
+from .volume_io import CreateVolume, Slabs, SLAB
+
+CONSTANTS = os.path.join(os.path.dirname(parameters.__file__),
+                         'constants.mat')
+
+# Chromophores of Eq. (1) in the order of the fraction stack F
+CHROMOPHORE = ('hbo2', 'hb', 'water', 'fat', 'melanin')
+FUNC_NAME   = ('s', 'f_b', 'f_w', 'f_f', 'f_m')
+
+
+@functools.lru_cache(maxsize=None)
+def LoadSpectra(path: str = CONSTANTS) -> dict:
+  '''Load the chromophore spectra.
+
+  :return: Wavelength [nm], molar extinction coefficients ϵ_{HbO_2} and
+    ϵ_{Hb} [1/(mmM)], and absorption coefficients of water, fat, and
+    melanin [1/mm], as 1D arrays.
+  '''
+  const = scipy.io.loadmat(path)
+  return {'wavelength': const['wavelength'].ravel().astype(np.float64),
+          'hbo2':       const['e_hbo2'].ravel(),
+          'hb':         const['e_hb'].ravel(),
+          'water':      const['mu_a_w'].ravel(),
+          'fat':        const['mu_a_f'].ravel(),
+          'melanin':    const['mu_a_m'].ravel()}
+
+
+def SpectralRange(chromophore: str) -> tuple:
+  '''Return the range [nm] of wavelengths over which the spectrum of a
+  chromophore is tabulated (finite).'''
+  spectra = LoadSpectra()
+  wl      = spectra['wavelength'][np.isfinite(spectra[chromophore])]
+  return wl[0], wl[-1]
+
+
+def ChromophoreSpectra(wavelength, c_thbb: float,
+                       chromophore: tuple = CHROMOPHORE) -> np.ndarray:
+  '''Return the matrix E of shape (wavelength, chromophore) of Eq. (1).
+
+  :param wavelength: Wavelengths [nm].
+  :param c_thbb: Molar concentration of hemoglobin in blood [μM].
+  :param chromophore: Chromophores of the columns (default: all of
+    `CHROMOPHORE`).
+  '''
+  spectra    = LoadSpectra()
+  wavelength = np.atleast_1d(np.asarray(wavelength, dtype=np.float64))
+  for c in chromophore:
+    if c not in CHROMOPHORE:
+      raise ValueError(f'Unknown chromophore {c!r}')
+    lo, hi = SpectralRange(c)
+    if wavelength.min() < lo or wavelength.max() > hi:
+      raise ValueError(f'Wavelength must be in [{lo:g}, {hi:g}] nm, the '
+                       f'range of the {c} spectrum')
+  E = np.stack([np.interp(wavelength, spectra['wavelength'], spectra[c])
+                for c in chromophore], axis=-1)
+  # ϵ [1/(mmM)] to μ_a [1/mm] of blood: log(10)*c_tHb*ϵ, c_tHb [μM -> M]
+  blood = [i for i, c in enumerate(chromophore) if c in ('hbo2', 'hb')]
+  E[:, blood] *= math.log(10.)*c_thbb*1e-6
+  return E
+
+
+def ChromophoreFraction(s, f_b, f_w, f_f, f_m) -> np.ndarray:
+  '''Return the chromophore fractions F of shape (chromophore, voxel).'''
+  s, f_b = np.ravel(s), np.ravel(f_b)
+  return np.stack([f_b*s, f_b*(1. - s), np.ravel(f_w), np.ravel(f_f),
+                   np.ravel(f_m)])
+
+
+def CalculateMuA(func: dict, wavelength, c_thbb: float,
+                 dtype=np.float32) -> np.ndarray:
+  '''Calculate `μ_a` maps at multiple wavelengths.
+
+  :param func: Functional NBPs keyed by 's', 'f_b', 'f_w', 'f_f', and
+    'f_m' (arrays of the same shape, or scalars per tissue).
+  :param wavelength: Wavelengths [nm].
+  :param c_thbb: Molar concentration of hemoglobin in blood [μM].
+  :return: `μ_a` [1/mm] of shape (wavelength, *map shape).
+  '''
+  shape = np.broadcast_shapes(*(np.shape(func[k]) for k in FUNC_NAME))
+  E     = ChromophoreSpectra(wavelength, c_thbb)
+  F     = ChromophoreFraction(*(np.broadcast_to(func[k], shape)
+                                for k in FUNC_NAME))
+  return (E @ F).astype(dtype, copy=False).reshape((len(E),) + shape)
+
+
+def GenerateMuAMap(func: dict, wavelength, c_thbb: float, out_path: str,
+                   slab: int = SLAB, dtype=np.float32) -> np.ndarray:
+  '''Calculate `μ_a` maps slab by slab and write them into a memory-mapped
+  file of shape (wavelength, z, y, x).
+
+  :param func: Functional NBPs (arrays or memory maps) keyed by 's', 'f_b',
+    'f_w', 'f_f', and 'f_m'.
+  :param out_path: Path of the output, `.npy` or raw binary file.
+  '''
+  shape = np.shape(func['s'])
+  E     = ChromophoreSpectra(wavelength, c_thbb)
+  mu_a  = CreateVolume(out_path, (len(E),) + shape, dtype)
+  for z in Slabs(shape[0], slab):
+    F = ChromophoreFraction(*(func[k][z] for k in FUNC_NAME))
+    mu_a[:, z] = (E @ F).reshape((len(E), z.stop - z.start) + shape[1:])
+  mu_a.flush()
+  return mu_a
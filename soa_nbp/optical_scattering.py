@@ -0,0 +1,128 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Multi-wavelength optical scattering coefficient
+───────────────────────────────────────────────────────────────────────────
+This computes optical scattering coefficient `μ_s` (mm^{-1}) and reduced
+scattering coefficient `μ_s'` (mm^{-1}) maps over a wavelength grid from a
+tissue label map, following Eq. (2) [Park2023]:
+
+  μ_s(r, λ) = μ_s'(r, λ)/(1 − g(r))
+            = μ_s'(r, λ_{ref})/(1 − g(r))*(λ/λ_{ref})^{−b(r)}.
+
+As `μ_s` is piecewise constant per tissue, the power law is evaluated once
+per (wavelength, label) into a small table of shape (wavelength, 256),
+which is then gathered into the volume. A sweep over L wavelengths thus
+costs L lookups rather than L elementwise power computations over the
+volume. Labels with a constant entry in `Opt_prop.mu_s` (e.g., air) take
+that value.
+
+Reference:
+  [Park2023] Seonyeong Park, Umberto Villa, Fu Li, Refik Mert Cam,
+          Alexander A. Oraevsky, Mark A. Anastasio, "Stochastic three-
+          dimensional numerical phantoms to enable computational studies in
+          quantitative optoacoustic computed tomography of breast cancer,"
+          J. Biomed. Opt. 28(6) 066002 (20 June 2023)
+          https://doi.org/10.1117/1.JBO.28.6.066002
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import os
+
+import numpy as np
+
+from .parameters import Opt_prop
+from .lookup_table import CompileProp, Lookup_table, AssignPropLUT
+from .sampling import SampleTable
+from .volume_io import OpenVolume, CreateVolume, Slabs, SLAB
+
+SCAT_NAME = ('mu_sp.ref', 'mu_sp.b', 'g')
+
+
+def OptLUT(sample: dict = None, index: int = 0, seed=None) -> dict:
+  '''Return lookup arrays of the optical properties for one realization.
+
+  :param sample: Realizations from `sampling.SampleTable`; drawn with
+    `seed` if not given.
+  :param index: Index of the realization in `sample`.
+  '''
+  table = CompileProp(Opt_prop)
+  if sample is None:
+    sample, index = SampleTable(table, 1, np.random.default_rng(seed)), 0
+  return {name: table[name].CompileBatch(sample[name][index:index+1])[0]
+          for name in table}
+
+
+def ScatteringTable(wavelength, lut: dict) -> tuple:
+  '''Return `μ_s` and `μ_s'` [1/mm] tables of shape (wavelength, 256).
+
+  :param wavelength: Wavelengths [nm].
+  :param lut: Lookup arrays of 'mu_sp.ref', 'mu_sp.b', and 'g'.
+  '''
+  wavelength = np.atleast_1d(np.asarray(wavelength, dtype=np.float64))
+  ratio = wavelength[:, None]/Opt_prop.mu_sp['wavelength_ref']
+  mu_sp = lut['mu_sp.ref'][None, :]*ratio**(-lut['mu_sp.b'][None, :])
+  with np.errstate(divide='ignore', invalid='ignore'):
+    mu_s = mu_sp/(1. - lut['g'][None, :])
+
+  # Constant entries of Opt_prop.mu_s, e.g., air
+  const = Lookup_table(Opt_prop.mu_s, 'mu_s')
+  mu_s[:, const.label] = const.Compile()[const.label]
+  mu_sp[:, const.label] = (mu_s*(1. - lut['g'][None, :]))[:, const.label]
+  return mu_s, mu_sp
+
+
+def CalculateMuS(labelmap: np.ndarray, wavelength, lut: dict = None,
+                 seed=None, dtype=np.float32) -> tuple:
+  '''Calculate `μ_s` and `μ_s'` maps at multiple wavelengths.
+
+  :param labelmap: uint8 tissue label map.
+  :param lut: Lookup arrays from `OptLUT`; sampled with `seed` if not
+    given.
+  :return: `μ_s` and `μ_s'` [1/mm] of shape (wavelength, *map shape).
+  '''
+  labelmap    = np.asarray(labelmap)
+  lut         = OptLUT(seed=seed) if lut is None else lut
+  mu_s, mu_sp = ScatteringTable(wavelength, lut)
+  out = []
+  for table in (mu_s.astype(dtype), mu_sp.astype(dtype)):
+    scat = np.empty((len(table),) + labelmap.shape, dtype=dtype)
+    for i in range(len(table)):
+      AssignPropLUT(labelmap, table[i], out=scat[i])
+    out.append(scat)
+  return tuple(out)
+
+
+def GenerateMuSMap(labelmap, wavelength, out_dir: str, lut: dict = None,
+                   seed=None, shape: tuple = None, slab: int = SLAB,
+                   dtype=np.float32) -> dict:
+  '''Calculate `μ_s` and `μ_s'` maps slab by slab and write them into
+  memory-mapped files 'mu_s.npy' and 'mu_sp.npy' of shape
+  (wavelength, z, y, x).
+
+  :param labelmap: uint8 tissue label map, or path to it (see
+    `volume_io.OpenVolume`).
+  '''
+  labelmap = OpenVolume(labelmap, shape)
+  lut      = OptLUT(seed=seed) if lut is None else lut
+  table    = dict(zip(('mu_s', 'mu_sp'), ScatteringTable(wavelength, lut)))
+  scat     = {name: CreateVolume(os.path.join(out_dir, f'{name}.npy'),
+                                 (len(table[name]),) + labelmap.shape, dtype)
+              for name in table}
+  table    = {name: table[name].astype(dtype) for name in table}
+
+  for z in Slabs(labelmap.shape[0], slab):
+    label = np.ascontiguousarray(labelmap[z])
+    for name in table:
+      for i in range(len(table[name])):
+        AssignPropLUT(label, table[name][i], out=scat[name][i, z])
+  for name in scat:
+    scat[name].flush()
+  return scat
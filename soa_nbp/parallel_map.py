@@ -0,0 +1,220 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Parallel property mapping over a shared label volume
+───────────────────────────────────────────────────────────────────────────
+This includes a class `Shared_labelmap` to map a tissue label map to
+property maps (see `lookup_table`) in parallel worker processes without
+copying the label map per worker. The label map is copied once into
+`multiprocessing.shared_memory`, along with the lookup arrays of each
+mapping, and workers attach to both without a copy. Each task maps one
+property over one z-range, writing into an output in shared memory or a
+memory-mapped `.npy` file, so the peak memory is one label map plus the
+outputs, regardless of the number of workers.
+
+Shared memory segments are unlinked when the `Shared_labelmap` is closed,
+at the end of a `with` block or of the process (also on exceptions), and
+the segments of a failed mapping are unlinked immediately. Returned
+outputs stay valid after unlinking until they are garbage collected.
+Segments left by a killed process are removed by the resource tracker of
+`multiprocessing`.
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import concurrent.futures
+import os
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .lookup_table import N_LABEL
+from .volume_io import OpenVolume, CreateVolume, Slabs, SLAB
+
+# Shared arrays attached by a worker process
+WORKER = {}
+
+
+class Shared_buffer:
+  '''Array interface of a shared memory segment, which the arrays viewing
+  it keep alive; the segment is unmapped with its last array.'''
+  def __init__(self, shm: shared_memory.SharedMemory, shape: tuple,
+               dtype) -> None:
+    self.shm = shm
+    view     = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    self.__array_interface__ = dict(view.__array_interface__)
+    del view
+
+
+class Shared_array:
+  '''NumPy array in a shared memory segment.
+
+  :param shape: Shape of the array.
+  :param dtype: Data type of the array.
+  :param name: Name of an existing segment to attach to; a new segment is
+    created if not given.
+  '''
+  def __init__(self, shape: tuple, dtype, name: str = None) -> None:
+    self.shape = tuple(int(n) for n in shape)
+    self.dtype = np.dtype(dtype)
+    size       = max(int(np.prod(self.shape))*self.dtype.itemsize, 1)
+    if name is None:
+      self.shm = shared_memory.SharedMemory(create=True, size=size)
+    else:
+      try:
+        # Attached segments are owned by the creating process
+        self.shm = shared_memory.SharedMemory(name=name, track=False)
+      except TypeError:
+        self.shm = shared_memory.SharedMemory(name=name)
+    self.name  = self.shm.name
+    self.array = np.asarray(Shared_buffer(self.shm, self.shape, self.dtype))
+
+  @classmethod
+  def FromArray(cls, array: np.ndarray) -> 'Shared_array':
+    '''Copy an array into a new segment.'''
+    shared = cls(np.shape(array), np.asarray(array).dtype)
+    shared.array[...] = array
+    return shared
+
+  @property
+  def spec(self) -> tuple:
+    '''Name, shape, and data type to attach to the segment.'''
+    return self.name, self.shape, self.dtype.str
+
+  @classmethod
+  def Attach(cls, spec: tuple) -> 'Shared_array':
+    '''Attach to a segment from its `spec`.'''
+    name, shape, dtype = spec
+    return cls(shape, dtype, name)
+
+  def Close(self, unlink: bool = False) -> None:
+    '''Drop this reference to the segment, and remove its name if
+    `unlink`. Arrays still viewing the segment stay valid.'''
+    if unlink and self.shm is not None:
+      try:
+        self.shm.unlink()
+      except FileNotFoundError:
+        pass
+    self.shm, self.array = None, None
+
+
+def UnlinkAll(shared: list) -> None:
+  '''Detach from and remove shared arrays.'''
+  while shared:
+    shared.pop().Close(unlink=True)
+
+
+def AttachWorker(label: tuple, table: tuple, out: dict) -> None:
+  '''Attach the shared label map, lookup arrays, and outputs in a worker.
+
+  :param out: Output per property name, as a shared array spec or a path
+    to a `.npy` file.
+  '''
+  WORKER['label'] = Shared_array.Attach(label)
+  WORKER['table'] = Shared_array.Attach(table)
+  WORKER['out']   = {name: np.load(o, mmap_mode='r+') if isinstance(o, str)
+                     else Shared_array.Attach(o).array
+                     for name, o in out.items()}
+
+
+def MapChunk(name: str, row: slice, z: slice) -> None:
+  '''Map rows `row` of the lookup arrays to the property `name` over the
+  z-range `z`, in a worker.'''
+  label = WORKER['label'].array[z]
+  table = WORKER['table'].array
+  out   = WORKER['out'][name]
+  for k, r in enumerate(range(row.start, row.stop)):
+    o = out[k, z] if out.ndim == label.ndim + 1 else out[z]
+    np.take(table[r], label, out=o, mode='clip')
+  if isinstance(out, np.memmap):
+    out.flush()
+
+
+class Shared_labelmap:
+  '''Label map in shared memory for parallel property mapping.
+
+  :param labelmap: uint8 tissue label map, or path to it (see
+    `volume_io.OpenVolume`).
+  :param slab: Number of z-slices copied at once and mapped per task.
+  '''
+  def __init__(self, labelmap, shape: tuple = None, slab: int = SLAB
+               ) -> None:
+    labelmap    = OpenVolume(labelmap, shape)
+    self.shape  = labelmap.shape
+    self.slab   = slab
+    self.shared = []
+    # Removes the segments if never closed, also at interpreter exit
+    self.finalizer = weakref.finalize(self, UnlinkAll, self.shared)
+    self.label  = Shared_array(self.shape, np.uint8)
+    self.shared.append(self.label)
+    for z in Slabs(self.shape[0], slab):
+      self.label.array[z] = labelmap[z]
+
+  def __enter__(self) -> 'Shared_labelmap':
+    return self
+
+  def __exit__(self, *exc) -> None:
+    self.Close()
+
+  def Close(self) -> None:
+    '''Remove the shared label map.'''
+    self.finalizer()
+
+  def Map(self, lut: dict, out_dir: str = None, workers: int = None,
+          dtype=np.float32) -> dict:
+    '''Map the label map to property maps in parallel.
+
+    :param lut: Lookup arrays keyed by property name, of shape (256,) or
+      (K, 256) for K maps of a property (e.g., per wavelength).
+    :param out_dir: Directory of the output maps, '<name>.npy'; the maps are
+      kept in shared memory if not given.
+    :param workers: Number of worker processes (default: CPU count).
+    :return: Maps keyed by property name, of shape (*map shape) or (K, *map
+      shape).
+    '''
+    name  = list(lut)
+    table = [np.atleast_2d(np.asarray(lut[k], dtype=dtype)) for k in name]
+    if any(t.shape[1] != N_LABEL for t in table):
+      raise ValueError(f'Lookup arrays must have {N_LABEL} entries')
+    row   = np.cumsum([0] + [len(t) for t in table])
+    shape = {k: (self.shape if np.ndim(lut[k]) == 1
+                 else (len(t),) + self.shape) for k, t in zip(name, table)}
+
+    created = []
+    try:
+      table_shared = Shared_array.FromArray(np.concatenate(table))
+      created.append(table_shared)
+      out, spec = {}, {}
+      for k in name:
+        if out_dir is None:
+          o = Shared_array(shape[k], dtype)
+          created.append(o)
+          out[k], spec[k] = o.array, o.spec
+        else:
+          path = os.path.join(out_dir, f'{k}.npy')
+          out[k], spec[k] = CreateVolume(path, shape[k], dtype), path
+
+      task = [(k, slice(row[i], row[i + 1]), z)
+              for i, k in enumerate(name)
+              for z in Slabs(self.shape[0], self.slab)]
+      with concurrent.futures.ProcessPoolExecutor(
+          workers, initializer=AttachWorker,
+          initargs=(self.label.spec, table_shared.spec, spec)) as pool:
+        for f in [pool.submit(MapChunk, *t) for t in task]:
+          f.result()
+    except BaseException:
+      UnlinkAll(created)
+      raise
+
+    # Outputs stay mapped in this process through the returned arrays
+    UnlinkAll(created)
+    if out_dir is not None:
+      out = {k: np.load(spec[k], mmap_mode='r+') for k in name}
+    return out
@@ -0,0 +1,393 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Frozen compiled parameter set
+───────────────────────────────────────────────────────────────────────────
+This includes a class `Param_set` to validate the tables of `Func_prop`,
+`Opt_prop`, `Acou_prop`, and `VICTRE_param` once and freeze them into flat
+NumPy arrays saved in a single file. Workers (see `ensemble`) memory-map
+the file and draw realizations and lookup arrays (see `lookup_table`)
+without resolving aliases, distribution dictionaries, or 'remainder'
+entries at runtime.
+
+Each root tissue entry of a property class is one record of
+
+  ┌────────┬──────────────────────────────────────────────────────────────┐
+  │ Field  │ Content                                                      │
+  ├────────┼──────────────────────────────────────────────────────────────┤
+  │ table  │ Index of the property table                                  │
+  │ label  │ `Tissue_type` label of the root tissue                       │
+  │ kind   │ Index into `KIND`: const, random, pde, or remainder          │
+  │ dist   │ Index into `sampling.DIST`                                   │
+  │ param  │ Parameters of the distribution (see `sampling.SpecParam`)    │
+  │ column │ Column of the uniform variates (-1 if not sampled)           │
+  └────────┴──────────────────────────────────────────────────────────────┘
+
+and the slots (table, 256) map each label to its record (-1 for labels
+not in the table). Realizations use the same uniform variates as
+`sampling.SampleTable`, and the volume fractions of `Func_prop` are
+constrained as in `sampling.SampleComposition` (through
+`sampling.ComposeParam`), so a seed gives the same values either way.
+
+Validation rejects tissue names that are not `Tissue_type` labels, invalid
+aliases or distributions, tissues covered by some but not all tables of a
+property class, values outside their physical range, and volume fractions
+of a tissue whose lower bounds add up to more than 1. Volume fractions
+whose upper bounds add up to more than 1 (i.e., possibly for some draws)
+are reported with a warning.
+
+File format (little endian): the magic string b'NBPPAR2\\n', the length of
+a JSON header (uint32), the header with the table names, root tissue names,
+scalars, and array types, and the arrays.
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import json
+import warnings
+
+import numpy as np
+
+from . import parameters
+from .parameters import Func_prop, Opt_prop, Acou_prop, VICTRE_param
+from .lookup_table import N_LABEL, CompileProp, TissueLabel
+from .sampling import (FRACTION, DIST, SpecKind, SpecParam, TransformParam,
+                       ComposeParam)
+
+MAGIC = b'NBPPAR2\n'
+
+KIND = ('const', 'random', 'pde', 'remainder')
+
+# Volume fractions summing to 1 with 'remainder'
+REMAINDER_PART = ('f_b', 'f_w', 'f_m')
+
+# Physically valid range of each property
+VALID_RANGE = {
+  'Func_prop': {'s':   (0., 1.), 'f_b': (0., 1.), 'f_w': (0., 1.),
+                'f_f': (0., 1.), 'f_m': (0., 1.)},
+  'Opt_prop':  {'mu_sp.ref': (0., np.inf), 'mu_sp.b': (0., np.inf),
+                'g': (-1., 1.), 'n': (1., np.inf)},
+  'Acou_prop': {'sound_speed': (0., np.inf), 'density': (0., np.inf),
+                'alpha_coeff': (0., np.inf)}
+}
+
+ROOT_DTYPE = np.dtype([('table',  np.uint8),
+                       ('label',  np.uint8),
+                       ('kind',   np.uint8),
+                       ('dist',   np.uint8),
+                       ('param',  np.float64, (4,)),
+                       ('column', np.int32)])
+
+BREAST_TYPE  = ('A', 'B', 'C', 'D')
+BREAST_SHAPE = ('natural', 'hemisphere')
+
+
+def Bounds(spec) -> tuple:
+  '''Return the lower and upper bounds of a distribution (or constant).'''
+  kind = SpecKind(spec)
+  if kind == 'const':
+    return float(spec), float(spec)
+  if kind in ('TN', 'U'):
+    return float(spec['min']), float(spec['max'])
+  if kind == 'range':
+    return tuple(sorted((float(spec['upper']), float(spec['lower']))))
+  return -np.inf, np.inf
+
+
+def Validate(table: dict = None) -> list:
+  '''Validate the compiled property tables of all property classes.
+
+  :param table: Dictionaries of `Lookup_table` per property class (default:
+    `lookup_table.CompileAll()`).
+  :return: Error messages; empty if the tables are valid.
+  '''
+  if table is None:
+    table = {prop.__name__: CompileProp(prop)
+             for prop in (Func_prop, Opt_prop, Acou_prop)}
+  error = []
+  for prop, lut in table.items():
+    # Coverage: every tissue of the class is in every table
+    used = set().union(*(l.root for l in lut.values()))
+    for name, l in lut.items():
+      excused = set(Opt_prop.mu_s) if name.startswith('mu_sp.') else set()
+      missing = sorted(used - set(l.root) - excused, key=TissueLabel)
+      if missing:
+        error.append(f"{prop}.{name} does not cover {', '.join(missing)}")
+
+    # Physical ranges
+    for name, l in lut.items():
+      lo, hi = VALID_RANGE[prop][name]
+      for tissue in l.tissue:
+        spec = l.spec[tissue]
+        if l.kind[tissue] not in ('const', 'random'):
+          continue
+        if SpecKind(spec) == 'N':
+          a = b = float(spec['mean'])
+        else:
+          a, b = Bounds(spec)
+        if a < lo or b > hi:
+          error.append(f'{prop}.{name}[{tissue}] in [{a}, {b}] is outside '
+                       f'[{lo}, {hi}]')
+
+  # Volume fractions per tissue of functional properties
+  func = table.get('Func_prop', {})
+  for tissue in sorted(set().union(*(func[n].root for n in FRACTION
+                                     if n in func)), key=TissueLabel):
+    lo_sum, hi_sum = 0., 0.
+    for name in FRACTION:
+      root = func[name].root.get(tissue)
+      if root is None or func[name].kind[root] not in ('const', 'random'):
+        continue
+      spec = func[name].spec[root]
+      a, b = Bounds(spec)
+      lo_sum += a
+      hi_sum += b
+    if lo_sum > 1.:
+      error.append(f'Volume fractions of {tissue} add up to at least '
+                   f'{lo_sum:g} > 1')
+    elif hi_sum > 1.:
+      warnings.warn(f'Volume fractions of {tissue} may add up to '
+                    f'{hi_sum:g} > 1')
+
+  # Shape and size parameters
+  for bt in BREAST_TYPE:
+    for bs in BREAST_SHAPE:
+      for name, spec in VICTRE_param(bt, bs).Spec().items():
+        try:
+          SpecKind(spec)
+        except ValueError as e:
+          error.append(f'VICTRE_param({bt!r}, {bs!r}).{name}: {e}')
+  return error
+
+
+def CompileRoot(lut: dict) -> tuple:
+  '''Return the root records and slots of the tables of a property class,
+  and the number of uniform variates per realization.'''
+  record, group, offset = [], [], []
+  for t, (name, l) in enumerate(lut.items()):
+    offset.append(len(record))
+    for tissue in l.tissue:
+      kind = l.kind[tissue]
+      spec = l.spec[tissue] if kind in ('const', 'random') else 0.
+      dist, param = SpecParam([spec])
+      record.append((t, TissueLabel(tissue), KIND.index(kind), dist[0],
+                     param[0], -1))
+      # Same joint sampling groups as `sampling.SampleTable`
+      group.append(None if kind not in ('const', 'random') else
+                   f'{name.rpartition(".")[0]}/{tissue}'
+                   if SpecKind(spec) == 'range' else f'{name}/{tissue}')
+  root = np.array(record, dtype=ROOT_DTYPE)
+  sampled = np.flatnonzero([g is not None for g in group])
+  key, col = np.unique(np.array([group[i] for i in sampled], dtype=str),
+                       return_inverse=True)
+  root['column'][sampled] = col
+
+  slot = np.full((len(lut), N_LABEL), -1, dtype=np.int16)
+  for t, l in enumerate(lut.values()):
+    slot[t, l.label] = offset[t] + l.slot[l.label]
+  return root, slot, len(key)
+
+
+class Param_set:
+  '''Validated parameter tables frozen into flat arrays.
+
+  :param header: Table names and scalars (see `Compile`).
+  :param array: Arrays keyed by name.
+  '''
+  def __init__(self, header: dict, array: dict) -> None:
+    self.header = header
+    self.array  = array
+
+  @classmethod
+  def Compile(cls) -> 'Param_set':
+    '''Validate and compile the parameter tables of the `parameters`
+    package.'''
+    table = {prop.__name__: CompileProp(prop)
+             for prop in (Func_prop, Opt_prop, Acou_prop)}
+    error = Validate(table)
+    if error:
+      raise ValueError('Invalid parameter tables:\n  '
+                       + '\n  '.join(error))
+
+    header = {'version':        parameters.__version__,
+              'table':          {},
+              'tissue':         {},
+              'n_column':       {},
+              'c_thbb':         [Func_prop.c_thbb['min'],
+                                 Func_prop.c_thbb['max']],
+              'y':              dict(Acou_prop.y),
+              'wavelength_ref': Opt_prop.mu_sp['wavelength_ref'],
+              'shape_param':    list(VICTRE_param.SHAPE_PARAM)}
+    array  = {}
+    for prop, lut in table.items():
+      root, slot, n_column = CompileRoot(lut)
+      header['table'][prop]    = list(lut)
+      header['tissue'][prop]   = [t for l in lut.values() for t in l.tissue]
+      header['n_column'][prop] = n_column
+      array[f'{prop}.root']    = root
+      array[f'{prop}.slot']    = slot
+
+    # Constant overrides of μ_a and μ_s
+    for name in ('mu_a', 'mu_s'):
+      a = np.full(N_LABEL, np.nan)
+      for tissue, value in getattr(Opt_prop, name).items():
+        a[TissueLabel(tissue)] = value
+      array[f'Opt_prop.{name}'] = a
+
+    k      = len(VICTRE_param.SHAPE_PARAM)
+    victre = np.empty(len(BREAST_TYPE)*len(BREAST_SHAPE),
+                      dtype=[('breast_type', 'S1'), ('breast_shape', 'S10'),
+                             ('dist', np.uint8, (k,)),
+                             ('param', np.float64, (k, 4))])
+    for i, (bt, bs) in enumerate((bt, bs) for bt in BREAST_TYPE
+                                 for bs in BREAST_SHAPE):
+      dist, param = SpecParam(list(VICTRE_param(bt, bs).Spec().values()))
+      victre[i] = (bt, bs, dist, param)
+    array['VICTRE_param'] = victre
+    return cls(header, array)
+
+  @classmethod
+  def Load(cls, path: str) -> 'Param_set':
+    '''Open a compiled parameter set as memory maps.'''
+    with open(path, 'rb') as f:
+      if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"'{path}' is not a compiled parameter set")
+      size   = int(np.frombuffer(f.read(4), dtype='<u4')[0])
+      header = json.loads(f.read(size))
+    offset = len(MAGIC) + 4 + size
+    array  = {}
+    for name, (descr, shape) in header.pop('array').items():
+      dtype = np.lib.format.descr_to_dtype(descr)
+      array[name] = np.memmap(path, dtype=dtype, mode='r', offset=offset,
+                              shape=tuple(shape))
+      offset += dtype.itemsize*int(np.prod(shape))
+    return cls(header, array)
+
+  def Save(self, path: str) -> None:
+    '''Save the compiled parameter set.'''
+    header = dict(self.header)
+    header['array'] = {name: [np.lib.format.dtype_to_descr(a.dtype),
+                              list(a.shape)]
+                       for name, a in self.array.items()}
+    header = json.dumps(header).encode()
+    with open(path, 'wb') as f:
+      f.write(MAGIC)
+      f.write(np.array(len(header), dtype='<u4').tobytes())
+      f.write(header)
+      for a in self.array.values():
+        f.write(np.ascontiguousarray(a).tobytes())
+
+  def Table(self, prop: str) -> tuple:
+    '''Return the table names of a property class.'''
+    return tuple(self.header['table'][prop])
+
+  def Root(self, prop: str, name: str) -> np.ndarray:
+    '''Return the root label of each label (-1 if not in the table).'''
+    slot = self.array[f'{prop}.slot'][self.Table(prop).index(name)]
+    root = self.array[f'{prop}.root']['label'].astype(np.int16)[slot]
+    return np.where(slot >= 0, root, -1)
+
+  def Const(self, prop: str, name: str) -> np.ndarray:
+    '''Return the lookup array of constant entries (NaN otherwise).'''
+    root  = self.array[f'{prop}.root']
+    value = np.where(root['kind'] == KIND.index('const'),
+                     root['param'][:, 0], np.nan)
+    slot  = self.array[f'{prop}.slot'][self.Table(prop).index(name)]
+    return np.append(value, np.nan)[slot]
+
+  def SampleRoot(self, prop: str, n: int, rng: np.random.Generator
+                 ) -> dict:
+    '''Draw `n` realizations of the tables of a property class, with the
+    volume fractions of `Func_prop` constrained.
+
+    :return: Structured arrays of shape (n,) with one field per root
+      tissue, keyed by table name (see `sampling.SampleTable`).
+    '''
+    root = self.array[f'{prop}.root']
+    u    = rng.random((n, self.header['n_column'][prop]))
+    idx  = np.flatnonzero(root['column'] >= 0)
+    u    = u[:, root['column'][idx]]
+    if prop == 'Func_prop':
+      x = ComposeParam(root['dist'][idx], root['param'][idx], u,
+                       self.Member(prop, idx))[0]
+    else:
+      x = TransformParam(root['dist'][idx], root['param'][idx], u)
+
+    name   = self.Table(prop)
+    tissue = self.header['tissue'][prop]
+    out    = {k: np.full(n, np.nan, dtype=[(tissue[i], np.float64)
+                                           for i in np.flatnonzero(
+                                             root['table'] == t)])
+              for t, k in enumerate(name)}
+    for j, i in enumerate(idx):
+      out[name[root['table'][i]]][tissue[i]] = x[:, j]
+    return out
+
+  def Member(self, prop: str, idx: np.ndarray) -> dict:
+    '''Return the columns of the sampled volume fractions of each label
+    (see `sampling.ComposeParam`), given the sampled records `idx`.'''
+    column       = np.full(self.array[f'{prop}.root'].size, -1)
+    column[idx]  = np.arange(idx.size)
+    slot, name   = self.array[f'{prop}.slot'], self.Table(prop)
+    member       = {}
+    for fraction in FRACTION:
+      for label, i in enumerate(slot[name.index(fraction)]):
+        if i >= 0 and column[i] >= 0:
+          member.setdefault(f'label {label}', {})[fraction] = column[i]
+    return member
+
+  def Lookup(self, prop: str, sample: dict) -> dict:
+    '''Return the lookup arrays of shape (n, 256) of `n` realizations
+    (see `SampleRoot`), keyed by table name, with 'remainder' entries
+    resolved; PDE entries are NaN.'''
+    root   = self.array[f'{prop}.root']
+    slot   = self.array[f'{prop}.slot']
+    name   = self.Table(prop)
+    tissue = self.header['tissue'][prop]
+    n      = len(sample[name[0]])
+    x      = np.full((n, root.size + 1), np.nan)
+    for i in range(root.size):
+      x[:, i] = sample[name[root['table'][i]]][tissue[i]]
+
+    rem = np.flatnonzero(root['kind'] == KIND.index('remainder'))
+    if rem.size:
+      part = [x[:, slot[name.index(p)][root['label'][rem]]]
+              for p in REMAINDER_PART]
+      x[:, rem] = 1. - sum(part)
+    return {name[t]: x[:, slot[t]] for t in range(len(name))}
+
+  def Sample(self, prop: str, n: int, rng: np.random.Generator) -> dict:
+    '''Draw `n` realizations of the tables of a property class and
+    return their lookup arrays (see `Lookup`).'''
+    return self.Lookup(prop, self.SampleRoot(prop, n, rng))
+
+  def SampleCThbb(self, n: int, rng: np.random.Generator) -> np.ndarray:
+    '''Draw `n` molar concentrations of hemoglobin in blood [μM].'''
+    param = np.full((1, 4), np.nan)
+    param[0, :2] = self.header['c_thbb']
+    return TransformParam(np.array([DIST.index('U')]), param,
+                          rng.random((n, 1)))[:, 0]
+
+  def SampleVICTRE(self, breast_type: str, breast_shape: str, n: int,
+                   rng: np.random.Generator) -> np.ndarray:
+    '''Draw `n` sets of the shape and size parameters, returned as a
+    structured array with one field per parameter.'''
+    victre = self.array['VICTRE_param']
+    i      = np.flatnonzero((victre['breast_type'] == breast_type[0].encode())
+                            & (victre['breast_shape'] == breast_shape.encode()))
+    if i.size == 0:
+      raise ValueError(f"Unknown breast type '{breast_type}' or shape "
+                       f"'{breast_shape}'")
+    name = self.header['shape_param']
+    x    = TransformParam(victre['dist'][i[0]], victre['param'][i[0]],
+                          rng.random((n, len(name))))
+    out  = np.empty(n, dtype=[(k, np.float64) for k in name])
+    for j, k in enumerate(name):
+      out[k] = x[:, j]
+    return out
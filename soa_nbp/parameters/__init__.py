@@ -31,3 +31,4 @@ from .predefined_prob_dist_victre import  VICTRE_param
 from .predefined_prob_dist_func   import  Func_prop
 from .predefined_prob_dist_opt    import  Opt_prop
 from .predefined_prob_dist_acou   import  Acou_prop
+from ..                           import  __version__
@@ -67,58 +67,100 @@ Copyright (C) 2024 Seonyeong Park and Mark Anastasio
 License : GNU General Public License version 3, Please see 'LICENSE' for 
           details.
 '''
+from types import MappingProxyType
+
+
 class VICTRE_param:
-  def __new__(self, breast_type: str, breast_shape: str) -> object:
+  # Shape and size parameters drawn per phantom
+  SHAPE_PARAM = ('a1t', 'a1b_a1t', 'a2r_a1t', 'a2l_a2r', 'a3_a1t', 'eps1',
+                 'ptosisB0', 'ptosisB1', 'turnTopH0', 'turnTopH1')
+
+  # Instances memoized per (breast type, breast shape)
+  _instance = {}
+
+  def __new__(cls, breast_type: str, breast_shape: str) -> 'VICTRE_param':
+    key  = (breast_type[0], breast_shape)
+    self = cls._instance.get(key)
+    if self is not None:
+      return self
+    if breast_type[0] not in ['A', 'B', 'C', 'D']:
+      raise ValueError(f"Unknown breast type '{breast_type}'")
+    if breast_shape not in ['natural', 'hemisphere']:
+      raise ValueError(f"Unknown breast shape '{breast_shape}'")
+
+    param = {'breast_type': breast_type[0], 'breast_shape': breast_shape}
     if breast_type[0] in ['A', 'B', 'C']:  # Types A, B, and C
-      self.a1t = {'mean': 59.7025, 
-                  'std':  3.5750, 
-                  'min':  50.7650, 
-                  'max':  71.5000} # [mm]
+      param['a1t'] = {'mean': 59.7025,
+                      'std':  3.5750,
+                      'min':  50.7650,
+                      'max':  71.5000} # [mm]
     elif breast_type[0] == 'D':            # Type D
-      self.a1t = {'mean': 50.0500, 
-                  'std':  3.5750, 
-                  'min':  42.9000, 
-                  'max':  57.2000} # [mm]
+      param['a1t'] = {'mean': 50.0500,
+                      'std':  3.5750,
+                      'min':  42.9000,
+                      'max':  57.2000} # [mm]
     
     if breast_shape == 'natural':
-      self.a1b_a1t  = {'mean': 1, 'std': 0.02}
-      self.a2r_a1t  = {'mean': 1, 'std': 0.05}
-      self.a2l_a2r  = {'mean': 1, 'std': 0.05}
+      param['a1b_a1t']  = {'mean': 1, 'std': 0.02}
+      param['a2r_a1t']  = {'mean': 1, 'std': 0.05}
+      param['a2l_a2r']  = {'mean': 1, 'std': 0.05}
       if breast_type[0] in ['A', 'B']:     # Types A and B
-        self.a3_a1t = {'mean':  0.85,
-                       'std':   0.14,
-                       'min':   0.8,
-                       'max':   1.2}
+        param['a3_a1t'] = {'mean':  0.85,
+                           'std':   0.14,
+                           'min':   0.8,
+                           'max':   1.2}
       elif breast_type[0] == 'C':          # Type C
-        self.a3_a1t = {'mean':  0.85,
-                       'std':   0.12,
-                       'min':   0.7,
-                       'max':   1.1}
+        param['a3_a1t'] = {'mean':  0.85,
+                           'std':   0.12,
+                           'min':   0.7,
+                           'max':   1.1}
       elif breast_type[0] == 'D':          # Type D
-        self.a3_a1t = {'mean': 0.85,
-                       'std': 0.1,
-                       'min': 0.7,
-                       'max': 1.1}
-      self.eps1       = {'mean': 1,     'std': 0.1}
-      self.doPtosis   = 'true'
-      self.ptosisB0   = {'mean': 0, 'std': 0.1,   'min': -0.18, 'max': 0.18}
-      self.ptosisB1   = {'mean': 0, 'std': 0.1,   'min': -0.18, 'max': 0.18}
-      self.doTurnTop  = 'true'
-      self.turnTopH0  = {'mean': 0, 'std': 0.15,  'min': -0.11, 'max': 0.11}
-      self.turnTopH1  = {'mean': 0, 'std': 0.25,  'min': -0.3,  'max': 0.3}
+        param['a3_a1t'] = {'mean': 0.85,
+                           'std': 0.1,
+                           'min': 0.7,
+                           'max': 1.1}
+      param['eps1']       = {'mean': 1,     'std': 0.1}
+      param['doPtosis']   = 'true'
+      param['ptosisB0']   = {'mean': 0, 'std': 0.1,   'min': -0.18, 'max': 0.18}
+      param['ptosisB1']   = {'mean': 0, 'std': 0.1,   'min': -0.18, 'max': 0.18}
+      param['doTurnTop']  = 'true'
+      param['turnTopH0']  = {'mean': 0, 'std': 0.15,  'min': -0.11, 'max': 0.11}
+      param['turnTopH1']  = {'mean': 0, 'std': 0.25,  'min': -0.3,  'max': 0.3}
     elif breast_shape == 'hemisphere':
-      self.a1b_a1t    = 1
-      self.a1b_a1t    = 1
-      self.a2r_a1t    = 1
-      self.a2l_a2r    = 1
-      self.a3_a1t     = 1
-      self.eps1       = 1
-      self.doPtosis   = 'false'
-      self.ptosisB0   = 0
-      self.ptosisB1   = 0
-      self.doTurnTop  = 'false'
-      self.turnTopH0  = 0
-      self.turnTopH1  = 0
-    
-    return self
-  
\ No newline at end of file
+      param['a1b_a1t']    = 1
+      param['a2r_a1t']    = 1
+      param['a2l_a2r']    = 1
+      param['a3_a1t']     = 1
+      param['eps1']       = 1
+      param['doPtosis']   = 'false'
+      param['ptosisB0']   = 0
+      param['ptosisB1']   = 0
+      param['doTurnTop']  = 'false'
+      param['turnTopH0']  = 0
+      param['turnTopH1']  = 0
+
+    self = super().__new__(cls)
+    for name, value in param.items():
+      if isinstance(value, dict):
+        value = MappingProxyType(value)
+      object.__setattr__(self, name, value)
+    return cls._instance.setdefault(key, self)
+
+  def __setattr__(self, name: str, value) -> None:
+    raise AttributeError(f"'{type(self).__name__}' object is immutable")
+
+  def __delattr__(self, name: str) -> None:
+    raise AttributeError(f"'{type(self).__name__}' object is immutable")
+
+  def __reduce__(self) -> tuple:
+    # Pickled and copied as the memoized instance of its key
+    return type(self), (self.breast_type, self.breast_shape)
+
+  def __repr__(self) -> str:
+    return (f"{type(self).__name__}('{self.breast_type}', "
+            f"'{self.breast_shape}')")
+
+  def Spec(self) -> dict:
+    '''Return the distributions (or constants) of the shape and size
+    parameters.'''
+    return {name: getattr(self, name) for name in self.SHAPE_PARAM}
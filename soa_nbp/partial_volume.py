@@ -0,0 +1,156 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Sub-voxel partial-volume model of the two-layer skin
+───────────────────────────────────────────────────────────────────────────
+The epidermis of the two-layer skin model (`Tissue_type.epidermis`, with
+melanosome volume fraction `f_m` of 0.305 against 0 in dermis) is much
+thinner than typical simulation voxels. Labeling whole voxels either drops
+the epidermis or inflates its absorption. This computes the sub-voxel
+volume fractions of four layers in each voxel,
+
+  outside (coupling water) | epidermis | dermis | inner tissue,
+
+and mixes the chromophore fractions of Eq. (1) [Park2023] per voxel,
+
+  F = [f_b*s, f_b*(1.-s), f_w, f_f, f_m] = ∑_k φ_k F_k,
+
+which is exact for `μ_a` because Eq. (1) is linear in F. The mixed `s` is
+recovered as (f_b*s)/f_b.
+
+The layer fractions are obtained either from a signed distance `d` (mm) to
+the outer skin surface, positive inside the breast, where the epidermis
+and dermis occupy 0 ≤ d < t_e and t_e ≤ d < t_s, respectively, and each
+voxel is approximated by the interval of `d` it spans along the surface
+normal, or from a supersampled label map by counting labels per coarse
+voxel (see `pyramid.Label_pyramid`).
+
+Reference:
+  [Park2023] Seonyeong Park, Umberto Villa, Fu Li, Refik Mert Cam,
+          Alexander A. Oraevsky, Mark A. Anastasio, "Stochastic three-
+          dimensional numerical phantoms to enable computational studies in
+          quantitative optoacoustic computed tomography of breast cancer,"
+          J. Biomed. Opt. 28(6) 066002 (20 June 2023)
+          https://doi.org/10.1117/1.JBO.28.6.066002
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import numpy as np
+from scipy.ndimage import distance_transform_edt
+
+from .parameters import Tissue_type
+from .pyramid import Label_pyramid
+from .functional_map import FUNC_NAME, WATER
+
+LAYER = ('outside', 'epidermis', 'dermis', 'inner')
+
+# Labels outside the breast
+OUTSIDE_LABEL = (Tissue_type.water, Tissue_type.air)
+
+
+def SignedDistance(mask: np.ndarray, voxel_size: float) -> np.ndarray:
+  '''Return the signed distance [mm] of voxel centers to the surface of a
+  breast mask, positive inside.'''
+  mask = np.asarray(mask, dtype=bool)
+  return (distance_transform_edt(mask) - distance_transform_edt(~mask)
+          - 0.5*np.where(mask, 1., -1.))*voxel_size
+
+
+def SkinFractionSDF(sdf: np.ndarray, voxel_size: float,
+                    epidermis_thick: float, skin_thick: float
+                    ) -> np.ndarray:
+  '''Return the layer fractions of shape (4, *map shape) from a signed
+  distance [mm] to the outer skin surface.
+
+  :param epidermis_thick: Thickness of epidermis t_e [mm].
+  :param skin_thick: Total thickness of skin t_s (epidermis and dermis)
+    [mm].
+  '''
+  lo   = np.asarray(sdf, dtype=np.float64) - 0.5*voxel_size
+  hi   = lo + voxel_size
+  edge = (-np.inf, 0., epidermis_thick, skin_thick, np.inf)
+  return np.stack([np.clip(np.minimum(hi, b) - np.maximum(lo, a), 0., None)
+                   for a, b in zip(edge[:-1], edge[1:])])/voxel_size
+
+
+def SkinFractionSupersampled(labelmap_fine, factor: int,
+                             shape: tuple = None) -> np.ndarray:
+  '''Return the layer fractions of shape (4, *coarse shape) from a label
+  map supersampled by the factor.'''
+  pyr   = Label_pyramid.Build(labelmap_fine, (factor,), shape)
+  frac  = np.moveaxis(pyr.Fraction(factor), -1, 0)
+  layer = np.zeros((len(LAYER),) + frac.shape[1:])
+  for k, label in enumerate(pyr.label):
+    if label in OUTSIDE_LABEL:
+      layer[0] += frac[k]
+    elif label == Tissue_type.epidermis:
+      layer[1] += frac[k]
+    elif label == Tissue_type.dermis:
+      layer[2] += frac[k]
+    else:
+      layer[3] += frac[k]
+  return layer
+
+
+def ChromophoreStack(value: dict) -> np.ndarray:
+  '''Return the chromophore fractions F of functional properties.'''
+  f_b, s = np.asarray(value['f_b']), np.asarray(value['s'])
+  return np.stack(np.broadcast_arrays(f_b*s, f_b*(1. - s), value['f_w'],
+                                      value['f_f'], value['f_m']))
+
+
+def MixSkin(func: dict, labelmap: np.ndarray, frac: np.ndarray,
+            lut: dict, outside: dict = WATER) -> dict:
+  '''Mix the functional maps of the voxels intersecting the skin layers.
+
+  :param func: Functional maps keyed by 's', 'f_b', 'f_w', 'f_f', and 'f_m'
+    (e.g., from `functional_map.GenerateFuncMap`).
+  :param labelmap: uint8 tissue label map of the same grid.
+  :param frac: Layer fractions of shape (4, *map shape).
+  :param lut: Functional lookup arrays of the realization of `func` (see
+    `functional_map.FuncLUT`), e.g., of the phantom's sample, so that the
+    skin layers take the properties of the same realization.
+  :param outside: Functional properties of the medium outside the breast.
+  :return: Mixed functional maps.
+  '''
+  labelmap = np.asarray(labelmap)
+  partial  = (frac[1] + frac[2]) > 0
+  label    = labelmap[partial]
+  phi      = frac[:, partial]
+
+  # Inner tissue: the voxel's own values, or subcutaneous fat for voxels
+  # labeled as skin or outside; PDE values of fat are averaged over the map
+  own    = {name: np.asarray(func[name])[partial] for name in FUNC_NAME}
+  is_fat = labelmap == Tissue_type.fat
+  fat    = {}
+  for name in FUNC_NAME:
+    v = lut[name][Tissue_type.fat]
+    if np.isnan(v) and is_fat.any():
+      v = np.nanmean(np.asarray(func[name])[is_fat])
+    fat[name] = v
+  replace = np.isin(label, OUTSIDE_LABEL + (Tissue_type.epidermis,
+                                            Tissue_type.dermis))
+  inner = {name: np.where(replace, fat[name], own[name])
+           for name in FUNC_NAME}
+
+  F = (phi[0]*ChromophoreStack(outside)[:, None]
+       + phi[1]*ChromophoreStack({n: lut[n][Tissue_type.epidermis]
+                                  for n in FUNC_NAME})[:, None]
+       + phi[2]*ChromophoreStack({n: lut[n][Tissue_type.dermis]
+                                  for n in FUNC_NAME})[:, None]
+       + phi[3]*ChromophoreStack(inner))
+
+  mixed = {name: np.array(func[name], copy=True) for name in FUNC_NAME}
+  f_b   = F[0] + F[1]
+  with np.errstate(invalid='ignore', divide='ignore'):
+    s = np.where(f_b > 0, F[0]/f_b, inner['s'])
+  for name, v in zip(FUNC_NAME, (s, f_b, F[2], F[3], F[4])):
+    mixed[name][partial] = v
+  return mixed
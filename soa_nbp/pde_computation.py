@@ -0,0 +1,206 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+PDE computation of smooth tissue property distributions
+───────────────────────────────────────────────────────────────────────────
+This computes the tissue property distributions marked as PDE in
+`Func_prop` (entries of `None`), i.e., oxygen saturation `s` of fat,
+glandular, and peripheral angiogenesis (PA), and volume fraction of blood
+`f_b` of PA. The PDE formulation creates a smooth transition of the
+property between tissues with known properties, e.g., artery, vein, and
+viable tumor cell (VTC). The property `u` solves the Laplace equation
+
+  ∇²u = 0 on the PDE-marked (active) voxels,
+  u = u_D on voxels of tissues with known properties (Dirichlet),
+
+with zero flux toward any other voxels. The equation is discretized by the
+7-point Laplacian restricted to the active voxels, so the size of the
+linear system is the number of active voxels. Connected regions of active
+voxels without a Dirichlet neighbor are left undetermined.
+
+The sparse symmetric positive-definite system is solved by algebraic
+multigrid preconditioned conjugate gradient (CG) when `pyamg` is
+installed, and by Jacobi-preconditioned CG otherwise. A previous solution,
+e.g., of another phantom, may be given as an initial guess (warm start).
+
+Reference:
+  [Park2023] Seonyeong Park, Umberto Villa, Fu Li, Refik Mert Cam,
+          Alexander A. Oraevsky, Mark A. Anastasio, "Stochastic three-
+          dimensional numerical phantoms to enable computational studies in
+          quantitative optoacoustic computed tomography of breast cancer,"
+          J. Biomed. Opt. 28(6) 066002 (20 June 2023)
+          https://doi.org/10.1117/1.JBO.28.6.066002
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+from scipy.sparse.csgraph import connected_components
+
+try:
+  import pyamg
+except ImportError:
+  pyamg = None
+
+from .lookup_table import Lookup_table, TissueLabel
+
+# Tissues providing the Dirichlet values of the PDE
+DIRICHLET_TISSUE = ('artery', 'vein', 'vtc')
+
+
+def PDELabels(table: dict) -> np.ndarray:
+  '''Return the labels of the PDE-marked tissues of a property table.'''
+  lut = Lookup_table(table)
+  return np.array(sorted(TissueLabel(t) for t, r in lut.root.items()
+                         if lut.kind[r] == 'pde'), dtype=np.uint8)
+
+
+def DirichletLabels(table: dict, tissue: tuple = DIRICHLET_TISSUE
+                    ) -> np.ndarray:
+  '''Return the labels of the given tissues and of tissues aliased to them
+  in a property table.'''
+  lut = Lookup_table(table)
+  return np.array(sorted(TissueLabel(t) for t, r in lut.root.items()
+                         if r in tissue or t in tissue), dtype=np.uint8)
+
+
+class Laplace_system:
+  '''7-point Laplacian restricted to the active voxels of a label map.
+
+  :param labelmap: uint8 tissue label map.
+  :param active: Labels of the active (PDE-marked) tissues.
+  :param dirichlet: Boolean mask of the Dirichlet voxels.
+  '''
+  def __init__(self, labelmap: np.ndarray, active,
+               dirichlet: np.ndarray) -> None:
+    self.shape  = labelmap.shape
+    is_active   = np.isin(labelmap, np.asarray(active, dtype=np.uint8))
+    is_active  &= ~dirichlet
+    self.index  = np.flatnonzero(is_active)
+    n           = self.index.size
+
+    # Position of each voxel in the system (-1 for inactive voxels)
+    self.pos = np.full(labelmap.size, -1, dtype=np.int64 if n >= 2**31
+                       else np.int32)
+    self.pos[self.index] = np.arange(n)
+    dirichlet = dirichlet.ravel()
+
+    coord  = np.unravel_index(self.index, self.shape)
+    stride = np.array([int(np.prod(self.shape[d+1:]))
+                       for d in range(len(self.shape))])
+    diag   = np.zeros(n)
+    row, col = [], []
+    # Dirichlet neighbors: (row, flat voxel index)
+    self.bnd_row, self.bnd_voxel = [], []
+    for d in range(len(self.shape)):
+      for step in (-1, 1):
+        valid = (coord[d] + step >= 0) & (coord[d] + step < self.shape[d])
+        r     = np.flatnonzero(valid)
+        nb    = self.index[r] + step*stride[d]
+        p     = self.pos[nb]
+        a     = p >= 0
+        row.append(r[a])
+        col.append(p[a])
+        b     = dirichlet[nb]
+        self.bnd_row.append(r[b])
+        self.bnd_voxel.append(nb[b])
+        diag += np.bincount(r[a | b], minlength=n)
+
+    row = np.concatenate(row)
+    col = np.concatenate(col)
+    self.bnd_row   = np.concatenate(self.bnd_row)
+    self.bnd_voxel = np.concatenate(self.bnd_voxel)
+    adj = sp.csr_matrix((np.ones(row.size), (row, col)), shape=(n, n))
+
+    # Keep only regions connected to a Dirichlet voxel
+    ncomp, comp = connected_components(adj, directed=False)
+    anchored = np.zeros(ncomp, dtype=bool)
+    anchored[comp[self.bnd_row]] = True
+    keep = anchored[comp]
+    if not keep.all():
+      new = np.cumsum(keep) - 1
+      self.pos[self.index[~keep]] = -1
+      self.pos[self.index[keep]] = new[keep]
+      self.index   = self.index[keep]
+      adj          = adj[keep][:, keep]
+      diag         = diag[keep]
+      b            = keep[self.bnd_row]
+      self.bnd_row, self.bnd_voxel = new[self.bnd_row[b]], self.bnd_voxel[b]
+
+    self.A  = (sp.diags(diag) - adj).tocsr()
+    self.ml = None
+
+  def RHS(self, value: np.ndarray) -> np.ndarray:
+    '''Return the right-hand side from Dirichlet values given as a map.'''
+    return np.bincount(self.bnd_row, weights=value.ravel()[self.bnd_voxel],
+                       minlength=self.index.size)
+
+  def Solve(self, value: np.ndarray, x0: np.ndarray = None,
+            rtol: float = 1e-6, maxiter: int = None,
+            backend: str = None) -> np.ndarray:
+    '''Solve for the active voxels.
+
+    :param value: Map of the Dirichlet values.
+    :param x0: Initial guess as a map, e.g., a previous solution.
+    :param backend: 'amg' or 'cg' (default: 'amg' if `pyamg` is
+      installed).
+    :return: Solution at the active voxels.
+    '''
+    b = self.RHS(value)
+    if x0 is not None:
+      x0 = np.nan_to_num(np.asarray(x0, dtype=np.float64).ravel()[self.index])
+    if self.index.size == 0:
+      return b
+    backend = backend or ('amg' if pyamg is not None else 'cg')
+    if backend == 'amg':
+      if pyamg is None:
+        raise ImportError("Backend 'amg' requires pyamg")
+      # The hierarchy is reused for further right-hand sides
+      if self.ml is None:
+        self.ml = pyamg.smoothed_aggregation_solver(self.A,
+                                                    symmetry='symmetric')
+      return self.ml.solve(b, x0=x0, tol=rtol, maxiter=maxiter or 100,
+                           accel='cg')
+    M = sp.diags(1./self.A.diagonal())
+    x, info = spla.cg(self.A, b, x0=x0, rtol=rtol, maxiter=maxiter, M=M)
+    if info > 0:
+      raise RuntimeError(f'CG did not converge in {info} iterations')
+    return x
+
+
+def SolvePDE(labelmap: np.ndarray, active, dirichlet, x0: np.ndarray = None,
+             fill: float = np.nan, rtol: float = 1e-6, maxiter: int = None,
+             backend: str = None) -> np.ndarray:
+  '''Compute the smooth property distribution over the active tissues.
+
+  :param labelmap: uint8 tissue label map.
+  :param active: Labels of the PDE-marked tissues (see `PDELabels`).
+  :param dirichlet: Dirichlet values, as a dictionary of a value per label
+    or as a map with NaN outside the Dirichlet voxels.
+  :param x0: Initial guess as a map, e.g., the solution of another phantom.
+  :param fill: Value of voxels that are neither active nor Dirichlet.
+  :return: Map of the active voxels' solution and the Dirichlet values.
+  '''
+  labelmap = np.asarray(labelmap)
+  if isinstance(dirichlet, dict):
+    lut = np.full(256, np.nan)
+    for label, v in dirichlet.items():
+      lut[label] = v
+    value = lut[labelmap]
+  else:
+    value = np.asarray(dirichlet, dtype=np.float64)
+  is_dirichlet = np.isfinite(value)
+
+  system = Laplace_system(labelmap, active, is_dirichlet)
+  u = np.where(is_dirichlet, value, fill)
+  u.ravel()[system.index] = system.Solve(np.nan_to_num(value), x0, rtol,
+                                         maxiter, backend)
+  return u
@@ -0,0 +1,222 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Multi-resolution property pyramids of numerical breast phantoms (NBPs)
+───────────────────────────────────────────────────────────────────────────
+This includes a class `Label_pyramid` to build coarse grids of a tissue
+label map for coarse-to-fine simulation and reconstruction. For each
+level, downsampled by an integer factor `f`, the number of voxels of each
+label within each coarse voxel (f×f×f block) is counted. The counts of the
+finest level are accumulated in one streaming pass over the label map,
+and those of the coarser levels are obtained by summing the blocks of the
+finer level, so the full-resolution label map is read only once, also
+when the labels present in it are found on the way. The identity level
+(f = 1), whose counts would be as large as the label map one-hot encoded,
+is not stored but computed from the label map on demand.
+
+Properties of each level are then computed from the label volume
+fractions `φ_l` and the per-label values `p_l` of a lookup array (see
+`lookup_table`), consistently with the physics of the property:
+
+  ┌────────────┬───────────────────────────────┬────────────────────────┐
+  │ Average    │ Coarse value                  │ Property               │
+  ├────────────┼───────────────────────────────┼────────────────────────┤
+  │ arithmetic │ ∑_l φ_l p_l                   │ μ_a, μ_s, ρ, α_0, f_*  │
+  │ harmonic   │ 1/∑_l (φ_l/p_l)               │ c (travel time)        │
+  │ Wood       │ sqrt(1/(ρ ∑_l φ_l/(ρ_l c_l²)))│ c (mixture             │
+  │            │ with ρ = ∑_l φ_l ρ_l          │ compressibility)       │
+  └────────────┴───────────────────────────────┴────────────────────────┘
+
+Coarse voxels at the edges of a label map whose shape is not divisible by
+the factor cover fewer voxels, and their fractions are normalized
+accordingly. Labels without a value (NaN) propagate NaN to the coarse
+voxels containing them.
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import numpy as np
+
+from .lookup_table import N_LABEL
+from .volume_io import OpenVolume, Slabs
+
+
+def CoarseShape(shape: tuple, factor: int) -> tuple:
+  '''Return the shape of a grid downsampled by the factor.'''
+  return tuple(-(-n//factor) for n in shape)
+
+
+def BlockSum(a: np.ndarray, factor: int) -> np.ndarray:
+  '''Sum f×f×f blocks of the first three axes of an array, padding the
+  edges with zeros.'''
+  shape = CoarseShape(a.shape[:3], factor)
+  pad   = [(0, c*factor - n) for c, n in zip(shape, a.shape[:3])]
+  a     = np.pad(a, pad + [(0, 0)]*(a.ndim - 3))
+  a     = a.reshape(shape[0], factor, shape[1], factor, shape[2], factor,
+                    *a.shape[3:])
+  return a.sum(axis=(1, 3, 5))
+
+
+class Label_pyramid:
+  '''Per-label voxel counts of coarse grids of a label map.
+
+  :param label: Labels present in the label map, of shape (K,).
+  :param factor: Downsampling factors of the levels.
+  :param count: Counts per level, of shape (*coarse shape, K); None for the
+    identity level.
+  :param labelmap: Label map of the identity level, if any.
+  '''
+  def __init__(self, label: np.ndarray, factor: tuple, count: list,
+               labelmap: np.ndarray = None) -> None:
+    self.label    = np.asarray(label, dtype=np.uint8)
+    self.factor   = tuple(factor)
+    self.count    = count
+    self.labelmap = labelmap
+
+  @classmethod
+  def Build(cls, labelmap, factor: tuple = (2, 4, 8), shape: tuple = None,
+            label=None) -> 'Label_pyramid':
+    '''Count labels per coarse voxel in one pass over the label map.
+
+    :param labelmap: uint8 tissue label map, or path to it (see
+      `volume_io.OpenVolume`).
+    :param factor: Increasing downsampling factors, each dividing the next.
+    :param label: Labels to count (default: labels present in the map,
+      found in the same pass).
+    '''
+    factor   = tuple(sorted(factor))
+    if any(b % a for a, b in zip(factor, factor[1:])):
+      raise ValueError('Each factor must divide the next')
+    labelmap = OpenVolume(labelmap, shape)
+    found    = label is None
+    label    = np.asarray([] if found else label, dtype=np.uint8)
+    # Column of each label in the counts (K or more for labels not counted)
+    column   = np.full(N_LABEL, N_LABEL, dtype=np.int64)
+    column[label] = np.arange(label.size)
+
+    level  = [f for f in factor if f > 1]
+    dtype  = np.uint16 if factor[-1]**3 <= np.iinfo(np.uint16).max \
+             else np.uint32
+    count  = [np.zeros(CoarseShape(labelmap.shape, f) + (label.size,),
+                       dtype=dtype) for f in level]
+    for z in Slabs(labelmap.shape[0], factor[-1]):
+      slab = np.asarray(labelmap[z])
+      if found:
+        new = np.setdiff1d(np.flatnonzero(np.bincount(slab.ravel(),
+                                                      minlength=N_LABEL)),
+                           label)
+        if new.size:
+          column[new] = label.size + np.arange(new.size)
+          label = np.append(label, new.astype(np.uint8))
+          count = [np.concatenate([c, np.zeros(c.shape[:-1] + (new.size,),
+                                               dtype=dtype)], axis=-1)
+                   for c in count]
+      if not level:
+        continue
+      k      = label.size
+      f0     = level[0]
+      cshape = CoarseShape(slab.shape, f0)
+      # Coarse voxel of each voxel of the slab, for one bincount
+      iz, iy, ix = np.indices(slab.shape, sparse=True)
+      cell   = ((iz//f0)*cshape[1] + iy//f0)*cshape[2] + ix//f0
+      key    = cell*(k + 1) + np.minimum(column[slab], k)
+      fine   = np.bincount(key.ravel(), minlength=np.prod(cshape)*(k + 1))
+      fine   = fine.reshape(cshape + (k + 1,))[..., :k]
+      for c, f in zip(count, level):
+        b  = fine if f == f0 else BlockSum(fine, f//f0)
+        z0 = z.start//f
+        c[z0:z0 + b.shape[0]] = b
+
+    if np.any(np.diff(label.astype(np.int16)) < 0):
+      order = np.argsort(label)
+      label = label[order]
+      count = [c[..., order] for c in count]
+    count = iter(count)
+    return cls(label, factor, [None if f == 1 else next(count)
+                               for f in factor],
+               labelmap if 1 in factor else None)
+
+  def Level(self, factor: int) -> int:
+    '''Return the level of the downsampling factor.'''
+    return self.factor.index(factor)
+
+  def Fraction(self, factor: int) -> np.ndarray:
+    '''Return the label volume fractions of shape (*coarse shape, K).'''
+    count = self.count[self.Level(factor)]
+    if count is None:
+      return (np.asarray(self.labelmap)[..., None]
+              == self.label).astype(np.float64)
+    count = count.astype(np.float64)
+    total = count.sum(axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore'):
+      return count/total
+
+  def Average(self, factor: int, lut: np.ndarray, mode: str = 'arithmetic'
+              ) -> np.ndarray:
+    '''Return the volume-fraction-weighted average of a property.
+
+    :param lut: Lookup array of shape (256,) of the property.
+    :param mode: 'arithmetic' or 'harmonic'.
+    '''
+    frac  = self.Fraction(factor)
+    value = np.asarray(lut, dtype=np.float64)[self.label]
+    undef = np.isnan(value)
+    value = np.where(undef, 0., value)
+    if mode == 'arithmetic':
+      avg = frac @ value
+    elif mode == 'harmonic':
+      with np.errstate(divide='ignore'):
+        avg = 1./(frac @ np.where(undef, 0., 1./value))
+    else:
+      raise ValueError(f"Unknown average '{mode}'")
+    avg[(frac @ undef.astype(np.float64)) > 0] = np.nan
+    return avg
+
+  def SoundSpeed(self, factor: int, c: np.ndarray, rho: np.ndarray
+                 ) -> np.ndarray:
+    '''Return the sound speed of the mixture (Wood's equation) from lookup
+    arrays of sound speed and density.'''
+    c, rho = np.asarray(c, np.float64), np.asarray(rho, np.float64)
+    # Compressibility κ = 1/(ρc^2) is volume-averaged
+    kappa  = self.Average(factor, 1./(rho*c*c))
+    return np.sqrt(1./(self.Average(factor, rho)*kappa))
+
+  def Pyramid(self, lut: dict, mode: dict = None) -> dict:
+    '''Return property maps of all levels.
+
+    :param lut: Lookup arrays keyed by property name. If 'sound_speed' and
+      'density' are both given, the sound speed is Wood-averaged.
+    :param mode: Average per property name other than Wood (default:
+      'arithmetic').
+    :return: Dictionary of property maps per factor.
+    '''
+    mode = mode or {}
+    out  = {}
+    for f in self.factor:
+      out[f] = {}
+      for name, l in lut.items():
+        if name == 'sound_speed' and 'density' in lut \
+           and name not in mode:
+          out[f][name] = self.SoundSpeed(f, l, lut['density'])
+        else:
+          out[f][name] = self.Average(f, l, mode.get(name, 'arithmetic'))
+    return out
+
+
+def BlockMean(volume, factor: int, shape: tuple = None, dtype=np.float32
+              ) -> np.ndarray:
+  '''Downsample a voxelwise property map (e.g., with PDE-computed values)
+  by averaging f×f×f blocks, streaming over slabs.'''
+  volume = OpenVolume(volume, shape, dtype)
+  out    = np.empty(CoarseShape(volume.shape, factor), dtype=dtype)
+  for z in Slabs(volume.shape[0], factor):
+    slab = np.asarray(volume[z], dtype=np.float64)[..., None]
+    n    = BlockSum(np.ones_like(slab), factor)
+    out[z.start//factor] = (BlockSum(slab, factor)/n)[0, ..., 0]
+  return out
@@ -0,0 +1,341 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Vectorized batch sampling of the predefined probability distributions
+───────────────────────────────────────────────────────────────────────────
+This draws N realizations of every tissue property of `Func_prop`,
+`Opt_prop`, or `Acou_prop` (and of any flat dictionary of parameters such
+as the shape and size parameters of `VICTRE_param`) in one vectorized
+call. A distribution is specified by a dictionary, where the kind is
+determined by its keys:
+
+  ┌───────┬─────────────────────────────┬──────────────────────────────────┐
+  │ Kind  │ Keys                        │ Distribution                     │
+  ├───────┼─────────────────────────────┼──────────────────────────────────┤
+  │ TN    │ 'mean', 'std', 'min', 'max' │ Truncated Gaussian in (min, max) │
+  │ N     │ 'mean', 'std'               │ Gaussian                         │
+  │ U     │ 'min', 'max'                │ Uniform in (min, max)            │
+  │ range │ 'upper', 'lower'            │ Uniform between the upper and    │
+  │       │                             │ lower bounds                     │
+  └───────┴─────────────────────────────┴──────────────────────────────────┘
+
+All distributions are sampled by inverse transform of one matrix of
+uniform variates, so truncated Gaussians need no rejection loop. The
+ranges of the reduced scattering coefficient at the reference wavelength
+and the scattering power (`Opt_prop.mu_sp['ref']` and `['b']`) are jointly
+sampled, i.e., both use the same uniform variate per tissue, as they
+describe the upper and lower bounds of the same μ_s' spectrum.
+
+Volume fractions of each tissue drawn independently may add up to more
+than 1, leaving a negative 'remainder' (see `lookup_table`).
+`SampleComposition` enforces the constraint on the drawn compositions
+exactly: for the violating realizations only, the quantiles `u_i` of the
+sampled fractions of the tissue are shrunk by a common factor `t`,
+
+  f_i = F_i^{-1}(t*u_i),   t = max{t ∈ [0, 1] : ∑_i f_i ≤ 1},
+
+found by vectorized bisection. This keeps the rank of each fraction and
+its bounds, and the realizations satisfying the constraint keep the
+documented marginals unchanged; the number of adjusted realizations and
+the mean shift of each fraction are reported.
+
+Samples are returned as structured arrays with one field per root tissue
+(see `lookup_table`), which `Lookup_table.CompileBatch` turns into a stack
+of lookup arrays for volume mapping.
+
+Reference:
+  [Park2023] Seonyeong Park, Umberto Villa, Fu Li, Refik Mert Cam,
+          Alexander A. Oraevsky, Mark A. Anastasio, "Stochastic three-
+          dimensional numerical phantoms to enable computational studies in
+          quantitative optoacoustic computed tomography of breast cancer,"
+          J. Biomed. Opt. 28(6) 066002 (20 June 2023)
+          https://doi.org/10.1117/1.JBO.28.6.066002
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import numbers
+from collections.abc import Mapping
+
+import numpy as np
+from scipy.special import ndtr, ndtri
+
+from .parameters import Func_prop, VICTRE_param
+from .lookup_table import CompileProp, TissueLabel
+
+# Bounds of uniform variates keeping Gaussian quantiles finite
+U_EPS = np.finfo(np.float64).eps
+
+# Volume fractions of a tissue, of which 'remainder' takes the rest of 1
+FRACTION   = ('f_b', 'f_w', 'f_f', 'f_m')
+
+# Kinds of distributions and their parameters
+DIST       = ('const', 'TN', 'N', 'U', 'range')
+DIST_PARAM = {'TN':    ('mean', 'std', 'min', 'max'),
+              'N':     ('mean', 'std'),
+              'U':     ('min', 'max'),
+              'range': ('upper', 'lower')}
+
+
+def SpecKind(spec) -> str:
+  '''Return the kind of a distribution specification.'''
+  if isinstance(spec, numbers.Real):
+    return 'const'
+  if isinstance(spec, Mapping):
+    key = set(spec)
+    if key == {'mean', 'std', 'min', 'max'}:
+      return 'TN'
+    if key == {'mean', 'std'}:
+      return 'N'
+    if key == {'min', 'max'}:
+      return 'U'
+    if key == {'upper', 'lower'}:
+      return 'range'
+  raise ValueError(f'Invalid distribution {spec!r}')
+
+
+def TruncNormPPF(u: np.ndarray, mean, std, lo, hi) -> np.ndarray:
+  '''Inverse CDF of truncated Gaussian distributions.'''
+  alpha = (lo - mean)/std
+  beta  = (hi - mean)/std
+  # Evaluate in the lower tail for accuracy, using the symmetry
+  flip  = alpha > 0
+  a     = np.where(flip, -beta, alpha)
+  b     = np.where(flip, -alpha, beta)
+  u     = np.where(flip, 1. - u, u)
+  pa, pb = ndtr(a), ndtr(b)
+  z     = ndtri(pa + u*(pb - pa))
+  z     = np.where(flip, -z, z)
+  return np.clip(mean + std*z, lo, hi)
+
+
+def SpecParam(spec: list) -> tuple:
+  '''Return the kind codes (indices into `DIST`) and parameters of shape
+  (K, 4) of K distributions, in the order of `DIST_PARAM`.'''
+  dist  = np.empty(len(spec), dtype=np.uint8)
+  param = np.full((len(spec), 4), np.nan)
+  for i, s in enumerate(spec):
+    kind    = SpecKind(s)
+    dist[i] = DIST.index(kind)
+    if kind == 'const':
+      param[i, 0] = float(s)
+    else:
+      for j, key in enumerate(DIST_PARAM[kind]):
+        param[i, j] = float(s[key])
+  return dist, param
+
+
+def TransformParam(dist: np.ndarray, param: np.ndarray, u: np.ndarray
+                   ) -> np.ndarray:
+  '''Map uniform variates `u` of shape (N, K) to K distributions given by
+  kind codes and parameters (see `SpecParam`).'''
+  u = np.clip(u, U_EPS, 1. - U_EPS)
+  x = np.empty(u.shape, dtype=np.float64)
+
+  def Param(k):
+    idx = np.flatnonzero(dist == DIST.index(k))
+    return idx, param[idx].T
+
+  idx, (value, _, _, _) = Param('const')
+  x[:, idx] = value
+  idx, (mean, std, lo, hi) = Param('TN')
+  x[:, idx] = TruncNormPPF(u[:, idx], mean, std, lo, hi)
+  idx, (mean, std, _, _) = Param('N')
+  x[:, idx] = mean + std*ndtri(u[:, idx])
+  idx, (lo, hi, _, _) = Param('U')
+  x[:, idx] = lo + u[:, idx]*(hi - lo)
+  idx, (upper, lower, _, _) = Param('range')
+  x[:, idx] = upper + u[:, idx]*(lower - upper)
+  return x
+
+
+def TransformUniform(spec: list, u: np.ndarray) -> np.ndarray:
+  '''Map uniform variates `u` of shape (N, K) to K distributions.
+
+  :param spec: Distribution specifications (or constants) of length K.
+  :param u: Uniform variates in (0, 1).
+  :return: Samples of shape (N, K).
+  '''
+  return TransformParam(*SpecParam(spec), u)
+
+
+def Uniform(k: int, n: int, rng: np.random.Generator,
+            group: list = None) -> np.ndarray:
+  '''Draw uniform variates of shape (n, k), shared by the columns of the
+  same group key.'''
+  if group is None:
+    return rng.random((n, k))
+  key, col = np.unique(np.array(group, dtype=object).astype(str),
+                       return_inverse=True)
+  return rng.random((n, len(key)))[:, col]
+
+
+def SampleSpec(spec: list, n: int, rng: np.random.Generator,
+               group: list = None) -> np.ndarray:
+  '''Draw `n` samples of each of the given distributions.
+
+  :param group: Optional keys; distributions with the same key share the
+    same uniform variates (joint sampling).
+  :return: Samples of shape (n, len(spec)).
+  '''
+  return TransformUniform(spec, Uniform(len(spec), n, rng, group))
+
+
+def SampleParam(param: dict, n: int, rng: np.random.Generator
+                ) -> np.ndarray:
+  '''Draw `n` realizations of a flat dictionary of distributions and
+  constants, returned as a structured array with one field per key.'''
+  name = list(param)
+  x    = SampleSpec([param[k] for k in name], n, rng)
+  out  = np.empty(n, dtype=[(k, np.float64) for k in name])
+  for i, k in enumerate(name):
+    out[k] = x[:, i]
+  return out
+
+
+def TableSpec(table: dict) -> tuple:
+  '''Return the distributions of the sampled root entries of compiled
+  property tables, their joint sampling groups, and their (property name,
+  root tissue).'''
+  spec, group, where = [], [], []
+  for name, lut in table.items():
+    for tissue in lut.tissue:
+      if lut.kind[tissue] in ('const', 'random'):
+        s = lut.spec[tissue]
+        spec.append(s)
+        # Jointly sample ranges of the same parent table, e.g., mu_sp
+        group.append(f'{name.rpartition(".")[0]}/{tissue}'
+                     if SpecKind(s) == 'range' else f'{name}/{tissue}')
+        where.append((name, tissue))
+  return spec, group, where
+
+
+def TableSample(table: dict, where: list, x: np.ndarray) -> dict:
+  '''Return samples of shape (n, len(where)) as structured arrays with one
+  field per root tissue, keyed by property name.'''
+  out = {name: np.full(len(x), np.nan,
+                       dtype=[(t, np.float64) for t in lut.tissue])
+         for name, lut in table.items()}
+  for i, (name, tissue) in enumerate(where):
+    out[name][tissue] = x[:, i]
+  return out
+
+
+def SampleTable(table: dict, n: int, rng: np.random.Generator) -> dict:
+  '''Draw `n` realizations of compiled property tables.
+
+  :param table: Dictionary of `Lookup_table` keyed by property name.
+  :return: Dictionary of structured arrays of shape (n,) with one field
+    per root tissue. Fields of 'pde' and 'remainder' roots are NaN.
+  '''
+  spec, group, where = TableSpec(table)
+  return TableSample(table, where, SampleSpec(spec, n, rng, group))
+
+
+def SampleComposition(table: dict, n: int, rng: np.random.Generator,
+                      iteration: int = 40) -> tuple:
+  '''Draw `n` realizations of the compiled functional property tables
+  whose volume fractions satisfy the simplex constraint of every tissue.
+
+  :param table: Dictionary of `Lookup_table` of `Func_prop`.
+  :param iteration: Number of bisection steps.
+  :return: Realizations as from `SampleTable`, and the adjustment per
+    tissue: number and rate of adjusted realizations, and mean shift of
+    each volume fraction.
+  '''
+  spec, group, where = TableSpec(table)
+  return ComposeUniform(table, Uniform(len(spec), n, rng, group),
+                        iteration)
+
+
+def ComposeUniform(table: dict, u: np.ndarray, iteration: int = 40
+                   ) -> tuple:
+  '''Map uniform variates of shape (n, K) of the K sampled root entries
+  (see `TableSpec`) of the functional property tables to realizations
+  satisfying the simplex constraint (see `SampleComposition`).'''
+  spec, _, where = TableSpec(table)
+  column = {w: i for i, w in enumerate(where)}
+
+  # Sampled volume fractions of each tissue, in the order of the labels
+  member = {}
+  for name in FRACTION:
+    for tissue, root in sorted(table[name].root.items(),
+                               key=lambda item: TissueLabel(item[0])):
+      if table[name].kind[root] in ('const', 'random'):
+        member.setdefault(tissue, {})[name] = column[(name, root)]
+
+  x, report = ComposeParam(*SpecParam(spec), u, member, iteration)
+  return TableSample(table, where, x), report
+
+
+def ComposeParam(dist: np.ndarray, param: np.ndarray, u: np.ndarray,
+                 member: dict, iteration: int = 40) -> tuple:
+  '''Map uniform variates of shape (n, K) to K distributions given by
+  kind codes and parameters (see `SpecParam`), shrinking the quantiles of
+  the volume fractions of each tissue to satisfy its simplex constraint.
+
+  :param member: Column of each sampled volume fraction keyed by fraction
+    name, per tissue; tissues are constrained in this order.
+  :return: Samples of shape (n, K), and the adjustment per tissue (see
+    `SampleComposition`).
+  '''
+  n  = len(u)
+  u  = np.array(u, dtype=np.float64)
+  x0 = TransformParam(dist, param, u)
+  x  = x0.copy()
+
+  for tissue, var in member.items():
+    col = np.array(sorted(set(var.values())))
+    bad = np.flatnonzero(x[:, col].sum(axis=1) > 1.)
+    if bad.size == 0:
+      continue
+    sub = dist[col], param[col]
+    ub  = u[np.ix_(bad, col)]
+    if TransformParam(*sub, 0.*ub[:1]).sum() > 1.:
+      raise ValueError(f'Volume fractions of {tissue} cannot add up to 1 '
+                       'or less')
+    # Largest common shrink of the quantiles meeting the constraint
+    lo, hi = np.zeros(bad.size), np.ones(bad.size)
+    for _ in range(iteration):
+      t  = 0.5*(lo + hi)
+      ok = TransformParam(*sub, t[:, None]*ub).sum(axis=1) <= 1.
+      lo = np.where(ok, t, lo)
+      hi = np.where(ok, hi, t)
+    # Shrinking only lowers fractions, so tissues sharing a root entry that
+    # are already satisfied stay satisfied
+    u[np.ix_(bad, col)] = lo[:, None]*ub
+    x[np.ix_(bad, col)] = TransformParam(*sub, u[np.ix_(bad, col)])
+
+  report = {}
+  for tissue, var in member.items():
+    col      = list(var.values())
+    adjusted = int(np.any(x[:, col] != x0[:, col], axis=1).sum())
+    report[tissue] = {'adjusted': adjusted,
+                      'rate':     adjusted/n if n else 0.,
+                      'shift':    {name: float(np.mean(x[:, i] - x0[:, i]))
+                                   for name, i in var.items()}}
+  return x, report
+
+
+def SampleProp(prop: type, n: int, seed=None) -> dict:
+  '''Draw `n` realizations of every property table of `Func_prop`,
+  `Opt_prop`, or `Acou_prop`, with the volume fractions of `Func_prop`
+  constrained (see `SampleComposition`).'''
+  table, rng = CompileProp(prop), np.random.default_rng(seed)
+  if prop is Func_prop:
+    return SampleComposition(table, n, rng)[0]
+  return SampleTable(table, n, rng)
+
+
+def SampleVICTRE(breast_type: str, breast_shape: str, n: int, seed=None
+                 ) -> np.ndarray:
+  '''Draw `n` sets of the shape and size parameters of `VICTRE_param`,
+  returned as a structured array with one field per parameter.'''
+  return SampleParam(VICTRE_param(breast_type, breast_shape).Spec(), n,
+                     np.random.default_rng(seed))
@@ -0,0 +1,196 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Batched spectral unmixing of optical absorption maps
+───────────────────────────────────────────────────────────────────────────
+This includes a class `Spectral_unmixer` to invert Eq. (1) [Park2023],
+
+  μ_a(r, λ) = ∑_i E_i(λ)F_i(r),
+  F = [f_b*s, f_b*(1.-s), f_w, f_f, f_m],
+
+for the non-negative chromophore fractions `F` of all voxels at once,
+
+  min_{F ≥ 0} ||E F - μ_a||^2,
+
+and to recover the oxygen saturation `s` = F_0/(F_0 + F_1) and the blood
+volume fraction `f_b` = F_0 + F_1 as defined in `Func_prop`.
+
+The matrix E (wavelength × chromophore) is fixed per wavelength set, so its
+factorizations are computed once, and all voxels of a slab are solved as
+one matrix problem by either method:
+
+  ┌───────────┬──────────────────────────────────────────────────────────┐
+  │ Method    │ Solution                                                 │
+  ├───────────┼──────────────────────────────────────────────────────────┤
+  │ active    │ Exact: the pseudo-inverse of E restricted to each of the │
+  │           │ 2^K - 1 supports (active sets) is precomputed, and each  │
+  │           │ voxel takes the feasible (F ≥ 0) least-squares solution  │
+  │           │ with the smallest residual. For few chromophores (K).    │
+  │ projected │ Accelerated projected gradient (FISTA) on the scaled     │
+  │           │ columns, started from the clipped least-squares          │
+  │           │ solution, with the projection onto F ≥ 0 elementwise.    │
+  └───────────┴──────────────────────────────────────────────────────────┘
+
+Maps are processed in slabs along the z-axis, and error maps against the
+ground-truth functional NBP are provided.
+
+Reference:
+  [Park2023] Seonyeong Park, Umberto Villa, Fu Li, Refik Mert Cam,
+          Alexander A. Oraevsky, Mark A. Anastasio, "Stochastic three-
+          dimensional numerical phantoms to enable computational studies in
+          quantitative optoacoustic computed tomography of breast cancer,"
+          J. Biomed. Opt. 28(6) 066002 (20 June 2023)
+          https://doi.org/10.1117/1.JBO.28.6.066002
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import numpy as np
+
+from .optical_absorption import CHROMOPHORE, ChromophoreSpectra
+from .volume_io import OpenVolume, Slabs, SLAB
+
+# Volume fractions recovered from the chromophore fractions
+FRACTION_NAME = {'water': 'f_w', 'fat': 'f_f', 'melanin': 'f_m'}
+
+
+class Spectral_unmixer:
+  '''Non-negative least-squares unmixing for a fixed wavelength set.
+
+  :param wavelength: Wavelengths [nm].
+  :param c_thbb: Molar concentration of hemoglobin in blood [μM].
+  :param chromophore: Chromophores to unmix, including 'hbo2' and 'hb'.
+  '''
+  def __init__(self, wavelength, c_thbb: float,
+               chromophore: tuple = CHROMOPHORE) -> None:
+    if not {'hbo2', 'hb'} <= set(chromophore):
+      raise ValueError("Chromophores must include 'hbo2' and 'hb'")
+    self.chromophore = tuple(chromophore)
+    self.E = ChromophoreSpectra(wavelength, c_thbb, self.chromophore)
+    if self.E.shape[0] < self.E.shape[1]:
+      raise ValueError(f'{self.E.shape[1]} chromophores need at least as '
+                       'many wavelengths')
+    # Columns scaled to unit norm, F = scale*G
+    self.scale = 1./np.linalg.norm(self.E, axis=0)
+    Es         = self.E*self.scale
+    self.gram  = Es.T @ Es
+    self.pinv  = np.linalg.pinv(Es)
+    self.Es    = Es
+    self.step  = 1./np.linalg.eigvalsh(self.gram)[-1]
+
+    # Pseudo-inverses of the columns of each nonempty support
+    k = len(self.chromophore)
+    self.support = [np.flatnonzero([(m >> i) & 1 for i in range(k)])
+                    for m in range(1, 2**k)]
+    self.support_pinv = [np.linalg.pinv(self.E[:, S]) for S in self.support]
+
+  def SolveActive(self, mu_a: np.ndarray) -> np.ndarray:
+    '''Return the exact non-negative least-squares chromophore fractions
+    (chromophore, voxel) of `μ_a` of shape (wavelength, voxel).'''
+    mu_a = np.nan_to_num(np.asarray(mu_a, dtype=np.float64))
+    F    = np.zeros((len(self.chromophore), mu_a.shape[1]))
+    best = np.sum(mu_a*mu_a, axis=0)
+    for S, P in zip(self.support, self.support_pinv):
+      X   = P @ mu_a
+      r   = self.E[:, S] @ X - mu_a
+      res = np.sum(r*r, axis=0)
+      ok  = np.flatnonzero(np.all(X >= 0., axis=0) & (res < best))
+      F[:, ok] = 0.
+      F[np.ix_(S, ok)] = X[:, ok]
+      best[ok] = res[ok]
+    return F
+
+  def SolveProjected(self, mu_a: np.ndarray, iteration: int = 200,
+                     tol: float = 1e-8) -> np.ndarray:
+    '''Return the chromophore fractions (chromophore, voxel) of `μ_a` of
+    shape (wavelength, voxel) by the projected gradient method.'''
+    mu_a = np.nan_to_num(np.asarray(mu_a, dtype=np.float64))
+    b    = self.Es.T @ mu_a
+    g    = np.maximum(self.pinv @ mu_a, 0.)
+    y, t = g.copy(), 1.
+    for _ in range(iteration):
+      g_new = np.maximum(y - self.step*(self.gram @ y - b), 0.)
+      t_new = 0.5*(1. + np.sqrt(1. + 4.*t*t))
+      y     = g_new + ((t - 1.)/t_new)*(g_new - g)
+      done  = np.max(np.abs(g_new - g)) <= tol*max(np.max(np.abs(g_new)),
+                                                   1e-30)
+      g, t  = g_new, t_new
+      if done:
+        break
+    return g*self.scale[:, None]
+
+  def Solve(self, mu_a: np.ndarray, method: str = 'active',
+            iteration: int = 200, tol: float = 1e-8) -> np.ndarray:
+    '''Return the chromophore fractions (chromophore, voxel) of `μ_a` of
+    shape (wavelength, voxel).
+
+    :param method: 'active' or 'projected'.
+    :param iteration: Maximum number of iterations of 'projected'.
+    :param tol: Relative change stopping 'projected'.
+    '''
+    if method == 'active':
+      return self.SolveActive(mu_a)
+    if method == 'projected':
+      return self.SolveProjected(mu_a, iteration, tol)
+    raise ValueError(f"Unknown method '{method}'")
+
+  def Unmix(self, mu_a, slab: int = SLAB, method: str = 'active',
+            iteration: int = 200, tol: float = 1e-8) -> dict:
+    '''Recover `s`, `f_b`, and the other volume fractions from `μ_a` maps.
+
+    :param mu_a: `μ_a` [1/mm] of shape (wavelength, z, y, x), as an array
+      or memory map, or path to a `.npy` file.
+    :param method: Method of `Solve`.
+    :return: Maps keyed by 's', 'f_b', 'f_w', 'f_f', 'f_m' (for the unmixed
+      chromophores), and 'residual', the norm of E F - μ_a.
+    '''
+    mu_a  = OpenVolume(mu_a)
+    shape = mu_a.shape[1:]
+    name  = ['s', 'f_b'] + [FRACTION_NAME[c] for c in self.chromophore
+                            if c in FRACTION_NAME] + ['residual']
+    out   = {k: np.empty(shape, dtype=np.float64) for k in name}
+    for z in Slabs(shape[0], slab):
+      m   = np.asarray(mu_a[:, z], dtype=np.float64)
+      m   = m.reshape(len(m), -1)
+      F   = self.Solve(m, method, iteration, tol)
+      fit = dict(zip(self.chromophore, F))
+      f_b = fit['hbo2'] + fit['hb']
+      with np.errstate(invalid='ignore', divide='ignore'):
+        s = np.where(f_b > 0, fit['hbo2']/f_b, np.nan)
+      value = {'s': s, 'f_b': f_b,
+               'residual': np.linalg.norm(self.E @ F - np.nan_to_num(m),
+                                          axis=0)}
+      value.update({FRACTION_NAME[c]: v for c, v in fit.items()
+                    if c in FRACTION_NAME})
+      for k in name:
+        out[k][z] = value[k].reshape((z.stop - z.start,) + shape[1:])
+    return out
+
+
+def UnmixingError(estimate: dict, truth: dict, mask: np.ndarray = None
+                  ) -> dict:
+  '''Return error maps (estimate - truth) and their root-mean-square
+  errors over a mask for the properties in both.
+
+  :param estimate: Maps from `Spectral_unmixer.Unmix`.
+  :param truth: Ground-truth functional NBP (see
+    `functional_map.GenerateFuncMap`).
+  :param mask: Voxels of the evaluation (default: finite voxels).
+  :return: Error maps keyed by property name, and 'rmse' per property.
+  '''
+  error, rmse = {}, {}
+  for k in estimate:
+    if k not in truth:
+      continue
+    e = np.asarray(estimate[k]) - np.asarray(truth[k])
+    m = np.isfinite(e) if mask is None else np.asarray(mask) & np.isfinite(e)
+    error[k] = e
+    rmse[k]  = float(np.sqrt(np.mean(e[m]**2))) if m.any() else np.nan
+  error['rmse'] = rmse
+  return error
@@ -0,0 +1,174 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Per-vessel oxygen saturation
+───────────────────────────────────────────────────────────────────────────
+This assigns one oxygen saturation `s` per vessel, i.e., per connected
+component of the artery or vein voxels of a tissue label map, drawn from
+the distribution of that tissue in `Func_prop.s`, instead of one value per
+tissue for the whole phantom.
+
+The vessel voxels are a few percent of the volume, so the components are
+found on the vessel voxels only, instead of labeling every voxel (e.g., by
+`scipy.ndimage.label`):
+
+  1. The label map is scanned in slabs along the z-axis, and the sorted
+     flat indices of the voxels of the vessel label are collected, so only
+     one slab of the label map is held in memory at a time.
+  2. For each forward neighbor offset of the connectivity, the neighbors
+     of all vessel voxels are looked up among them by binary search,
+     giving the pairs of adjacent vessel voxels.
+  3. The pairs are merged by a vectorized union-find (hooking of the
+     larger root to the smaller one and pointer jumping until no pair is
+     split), and the roots are numbered as components 1, 2, ...
+  4. One value per component is drawn at once and scattered to the vessel
+     voxels through their component.
+
+The memory and the cost beyond the scan are proportional to the number of
+vessel voxels. Artery and vein components are labeled separately, i.e., an
+artery touching a vein is a distinct vessel.
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import numpy as np
+from scipy import ndimage
+
+from .parameters import Func_prop
+from .lookup_table import Lookup_table, TissueLabel
+from .sampling import SampleSpec
+from .volume_io import OpenVolume, Slabs, SLAB
+
+VESSEL = ('artery', 'vein')
+
+
+def FindRoot(parent: np.ndarray) -> np.ndarray:
+  '''Return the root of every node of a union-find forest by pointer
+  jumping.'''
+  while True:
+    grand = parent[parent]
+    if np.array_equal(grand, parent):
+      return parent
+    parent = grand
+
+
+def UnionFind(n: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+  '''Return the root (smallest member) of each of `n` nodes after merging
+  the pairs (a, b).'''
+  parent = np.arange(n)
+  while a.size:
+    ra, rb = parent[a], parent[b]
+    split  = ra != rb
+    a, b   = a[split], b[split]
+    if not a.size:
+      break
+    lo, hi = np.minimum(ra[split], rb[split]), np.maximum(ra[split],
+                                                          rb[split])
+    np.minimum.at(parent, hi, lo)
+    parent = FindRoot(parent)
+  return parent
+
+
+def VesselVoxels(labelmap: np.ndarray, label: int, slab: int = SLAB
+                 ) -> np.ndarray:
+  '''Return the sorted flat indices of the voxels of `label`, scanning
+  the label map slab by slab.'''
+  size  = int(np.prod(labelmap.shape[1:]))
+  voxel = [np.flatnonzero(np.asarray(labelmap[z]) == label) + z.start*size
+           for z in Slabs(labelmap.shape[0], slab)]
+  return np.concatenate(voxel) if voxel else np.zeros(0, dtype=np.int64)
+
+
+def NeighborPairs(voxel: np.ndarray, shape: tuple,
+                  structure: np.ndarray) -> tuple:
+  '''Return the pairs (i, j) of positions in `voxel` (sorted flat
+  indices) of adjacent voxels, each pair once.'''
+  coord  = np.unravel_index(voxel, shape)
+  stride = np.array([int(np.prod(shape[d+1:])) for d in range(len(shape))])
+  a, b   = [], []
+  for offset in np.argwhere(structure) - 1:
+    step = int(offset @ stride)
+    # Forward offsets only, one per pair of neighbors
+    if step <= 0:
+      continue
+    valid = np.ones(voxel.size, dtype=bool)
+    for d, o in enumerate(offset):
+      valid &= (coord[d] + o >= 0) & (coord[d] + o < shape[d])
+    i = np.flatnonzero(valid)
+    q = voxel[i] + step
+    j = np.minimum(np.searchsorted(voxel, q), voxel.size - 1)
+    hit = voxel[j] == q
+    a.append(i[hit])
+    b.append(j[hit])
+  return np.concatenate(a), np.concatenate(b)
+
+
+def LabelComponents(labelmap, label: int, shape: tuple = None,
+                    slab: int = SLAB, connectivity: int = 1) -> tuple:
+  '''Label the connected components of `label`.
+
+  :param labelmap: uint8 tissue label map, or path to it (see
+    `volume_io.OpenVolume`).
+  :param slab: Number of z-slices scanned at once.
+  :param connectivity: Neighborhood of `scipy.ndimage
+    .generate_binary_structure` (1: faces, 3: faces, edges, and corners).
+  :return: Flat indices of the voxels of `label`, their components
+    (1, 2, ...), and the number of components.
+  '''
+  labelmap = OpenVolume(labelmap, shape)
+  voxel    = VesselVoxels(labelmap, label, slab)
+  if voxel.size == 0:
+    return voxel, np.zeros(0, dtype=np.int64), 0
+  a, b = NeighborPairs(voxel, labelmap.shape,
+                       ndimage.generate_binary_structure(3, connectivity))
+  root = UnionFind(voxel.size, a, b)
+  # Number the roots 1, 2, ... in the order of their first voxel
+  _, component = np.unique(root, return_inverse=True)
+  return voxel, component + 1, int(component.max()) + 1
+
+
+def AssignComponents(out: np.ndarray, voxel: np.ndarray,
+                     component: np.ndarray, value: np.ndarray
+                     ) -> np.ndarray:
+  '''Assign one value per component into `out` (any writable array) in
+  place.
+
+  :param voxel: Flat voxel indices from `LabelComponents`.
+  :param component: Components (1, 2, ...) of the voxels.
+  :param value: Value of each component, of shape (component,).
+  '''
+  value = np.asarray(value)
+  if component.size and component.max() > len(value):
+    raise ValueError(f'{len(value)} values for {component.max()} '
+                     'components')
+  np.put(out, voxel, value[component - 1])
+  return out
+
+
+def SampleVesselS(s: np.ndarray, labelmap, rng: np.random.Generator,
+                  vessel: tuple = VESSEL, shape: tuple = None,
+                  slab: int = SLAB, connectivity: int = 1) -> dict:
+  '''Draw one oxygen saturation per vessel from `Func_prop.s` and write
+  it into the `s` map in place.
+
+  :param s: Oxygen saturation map (array or memory map).
+  :param vessel: Tissues whose components are vessels.
+  :return: Values drawn per component, keyed by tissue.
+  '''
+  labelmap = OpenVolume(labelmap, shape)
+  table    = Lookup_table(Func_prop.s, 's')
+  drawn    = {}
+  for tissue in vessel:
+    voxel, component, n = LabelComponents(labelmap, TissueLabel(tissue),
+                                          slab=slab,
+                                          connectivity=connectivity)
+    spec = table.spec[table.root[tissue]]
+    drawn[tissue] = SampleSpec([spec], n, rng)[:, 0]
+    AssignComponents(s, voxel, component, drawn[tissue])
+  return drawn
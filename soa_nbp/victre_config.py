@@ -0,0 +1,115 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+VICTRE configuration files for phantom ensembles
+───────────────────────────────────────────────────────────────────────────
+This writes VICTRE breast phantom configuration files for an ensemble of
+phantoms, whose shape and size parameters are drawn at once from
+`VICTRE_param` (see `sampling.SampleVICTRE`). The sampled ratios are
+converted to the breast volume extent parameters of VICTRE,
+
+  a_{1b} = a_{1t}*(a_{1b}/a_{1t}),    a_{2r} = a_{1t}*(a_{2r}/a_{1t}),
+  a_{2l} = a_{2r}*(a_{2l}/a_{2r}),    a_3    = a_{1t}*(a_3/a_{1t}),
+
+and substituted into a template configuration file (default:
+`parameters/VICTRE.cfg`), keeping all other settings and comments.
+
+Reference:
+  [Park2023] Seonyeong Park, Umberto Villa, Fu Li, Refik Mert Cam,
+          Alexander A. Oraevsky, Mark A. Anastasio, "Stochastic three-
+          dimensional numerical phantoms to enable computational studies in
+          quantitative optoacoustic computed tomography of breast cancer,"
+          J. Biomed. Opt. 28(6) 066002 (20 June 2023)
+          https://doi.org/10.1117/1.JBO.28.6.066002
+  [VICTRE] VICTRE breast phantom,
+          https://breastphantom.readthedocs.io/en/latest/
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import os
+import re
+
+import numpy as np
+
+from . import parameters
+from .parameters import VICTRE_param
+from .sampling import SampleVICTRE
+
+TEMPLATE = os.path.join(os.path.dirname(parameters.__file__), 'VICTRE.cfg')
+
+
+def VICTREShape(sample: np.ndarray, breast_type: str,
+                breast_shape: str) -> dict:
+  '''Convert sampled shape and size parameters to VICTRE settings.
+
+  :param sample: Structured array from `sampling.SampleVICTRE`.
+  :return: Dictionary of arrays (or strings) keyed by VICTRE setting.
+  '''
+  param = VICTRE_param(breast_type, breast_shape)
+  a1t   = sample['a1t']
+  a2r   = a1t*sample['a2r_a1t']
+  return {'a1t':       a1t,
+          'a1b':       a1t*sample['a1b_a1t'],
+          'a2r':       a2r,
+          'a2l':       a2r*sample['a2l_a2r'],
+          'a3':        a1t*sample['a3_a1t'],
+          'eps1':      sample['eps1'],
+          'doPtosis':  param.doPtosis,
+          'ptosisB0':  sample['ptosisB0'],
+          'ptosisB1':  sample['ptosisB1'],
+          'doTurnTop': param.doTurnTop,
+          'turnTopH0': sample['turnTopH0'],
+          'turnTopH1': sample['turnTopH1']}
+
+
+def FormatConfig(template: str, setting: dict) -> str:
+  '''Substitute settings in the text of a configuration file.'''
+  for key, value in setting.items():
+    value = f'{value:.6g}' if isinstance(value, (float, np.floating)) \
+            else str(value)
+    template, n = re.subn(rf'^{key}=.*$', f'{key}={value}', template,
+                          count=1, flags=re.MULTILINE)
+    if n == 0:
+      raise KeyError(f"'{key}' is not in the configuration template")
+  return template
+
+
+def WriteVICTREConfig(breast_type: str, breast_shape: str, n: int,
+                      out_dir: str, seed=None, template: str = TEMPLATE,
+                      **setting) -> list:
+  '''Draw `n` sets of shape and size parameters and write one VICTRE
+  configuration file per phantom, 'phantom_<index>.cfg'.
+
+  :param seed: Seed of the parameters and the VICTRE random number seeds.
+  :param setting: Further settings applied to all phantoms, e.g.,
+    `imgRes=0.2`.
+  :return: Paths of the configuration files.
+  '''
+  rng    = np.random.default_rng(seed)
+  sample = SampleVICTRE(breast_type, breast_shape, n, rng)
+  shape  = VICTREShape(sample, breast_type, breast_shape)
+  # Random number seeds (unsigned int) of the VICTRE generator
+  victre_seed = rng.integers(0, 2**32, size=n, dtype=np.uint64)
+  with open(template) as f:
+    text = FormatConfig(f.read(), setting)
+  # The template has the seed commented out
+  text = re.sub(r'^#\s*seed=.*$', 'seed=0', text, count=1,
+                flags=re.MULTILINE)
+
+  os.makedirs(out_dir, exist_ok=True)
+  path = []
+  for i in range(n):
+    phantom = {key: value if isinstance(value, str) else value[i]
+               for key, value in shape.items()}
+    phantom['seed'] = int(victre_seed[i])
+    path.append(os.path.join(out_dir, f'phantom_{i:0{len(str(n - 1))}d}.cfg'))
+    with open(path[-1], 'w') as f:
+      f.write(FormatConfig(text, phantom))
+  return path
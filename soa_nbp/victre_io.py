@@ -0,0 +1,265 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Streaming reader of VICTRE phantom volumes
+───────────────────────────────────────────────────────────────────────────
+This includes functions to read the label volumes written by the VICTRE
+breast phantom generator [VICTRE] (see `victre_config`), a raw binary file
+compressed by gzip (`.raw.gz`) or not (`.raw`) with a MetaImage header
+(`.mhd`), into a memory-mapped label map of `Tissue_type` labels.
+
+The data file is decompressed in chunks of bounded size and each chunk is
+written straight into the output memory map, so neither the compressed
+nor the decompressed volume is ever held in memory. VICTRE labels are
+remapped to `Tissue_type` labels per chunk through a lookup array of 256
+entries. A z-range (e.g., the slab of a worker) is read by skipping the
+preceding slices of the stream (or seeking into an uncompressed file) and
+stopping after its last slice.
+
+VICTRE labels not listed in `VICTRE_LABEL` (or in a given remapping) are
+kept as they are:
+
+  ┌───────────────────────────────────┬──────────────┬─────────────────┐
+  │ VICTRE tissue                     │ VICTRE label │ Tissue_type     │
+  ├───────────────────────────────────┼──────────────┼─────────────────┤
+  │ Background                        │ 0            │ water           │
+  │ Fat                               │ 1            │ fat             │
+  │ Skin                              │ 2            │ dermis          │
+  │ Glandular                         │ 29           │ glandular       │
+  │ Nipple                            │ 33           │ nipple          │
+  │ Muscle                            │ 40           │ muscle          │
+  │ Ligament                          │ 88           │ ligament        │
+  │ TDLU                              │ 95           │ tdlu            │
+  │ Duct                              │ 125          │ duct            │
+  │ Artery                            │ 150          │ artery          │
+  │ Vein                              │ 225          │ vein            │
+  │ Cancerous mass                    │ 200          │ vtc             │
+  │ Calcification                     │ 250          │ calcification   │
+  └───────────────────────────────────┴──────────────┴─────────────────┘
+
+Reference:
+  [VICTRE] VICTRE breast phantom,
+          https://breastphantom.readthedocs.io/en/latest/
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import os
+import zlib
+
+import numpy as np
+
+from .parameters import Tissue_type
+from .lookup_table import N_LABEL
+from .volume_io import CreateVolume
+
+# Maximum size in bytes of a decompressed chunk
+CHUNK = 1 << 24
+
+# Data types of the MetaImage element types
+MET_TYPE = {
+  'MET_CHAR':   np.int8,
+  'MET_UCHAR':  np.uint8,
+  'MET_SHORT':  np.int16,
+  'MET_USHORT': np.uint16,
+  'MET_INT':    np.int32,
+  'MET_UINT':   np.uint32,
+  'MET_FLOAT':  np.float32,
+  'MET_DOUBLE': np.float64
+}
+
+# Tissue_type label of each VICTRE label
+VICTRE_LABEL = {
+  0:   Tissue_type.water,
+  1:   Tissue_type.fat,
+  2:   Tissue_type.dermis,
+  29:  Tissue_type.glandular,
+  33:  Tissue_type.nipple,
+  40:  Tissue_type.muscle,
+  88:  Tissue_type.ligament,
+  95:  Tissue_type.tdlu,
+  125: Tissue_type.duct,
+  150: Tissue_type.artery,
+  225: Tissue_type.vein,
+  200: Tissue_type.vtc,
+  250: Tissue_type.calcification
+}
+
+
+def ReadMHD(path: str) -> dict:
+  '''Read a MetaImage header.
+
+  :return: Header entries keyed by name (as strings), along with 'shape'
+    (z, y, x), 'dtype', 'spacing' (z, y, x) [mm], 'data_file' (path),
+    'compressed', and 'offset' (bytes before the data in the data file,
+    or -1 if the data is at the end of the file).
+  '''
+  header = {}
+  offset = 0
+  with open(path, 'rb') as f:
+    for line in f:
+      offset += len(line)
+      key, _, value = line.decode('ascii').partition('=')
+      header[key.strip()] = value.strip()
+      # ElementDataFile is the last entry, before any local data
+      if key.strip() == 'ElementDataFile':
+        break
+  if 'DimSize' not in header or 'ElementDataFile' not in header:
+    raise ValueError(f"'{path}' is not a MetaImage header")
+
+  dtype = np.dtype(MET_TYPE[header.get('ElementType', 'MET_UCHAR')])
+  msb   = header.get('BinaryDataByteOrderMSB',
+                     header.get('ElementByteOrderMSB', 'False'))
+  if dtype.itemsize > 1:
+    dtype = dtype.newbyteorder('>' if msb.lower() == 'true' else '<')
+  spacing = header.get('ElementSpacing', header.get('ElementSize', ''))
+
+  data_file = header['ElementDataFile']
+  if data_file == 'LOCAL':
+    data_file = path
+  else:
+    data_file = os.path.join(os.path.dirname(path), data_file)
+    offset    = int(header.get('HeaderSize', 0))
+    # VICTRE refers to the raw file that it compresses afterwards
+    if not os.path.exists(data_file) and os.path.exists(data_file + '.gz'):
+      data_file += '.gz'
+  compressed = header.get('CompressedData', 'False').lower() == 'true' \
+               or IsGzip(data_file, max(offset, 0))
+
+  header.update(
+    shape      = tuple(int(n) for n in header['DimSize'].split())[::-1],
+    dtype      = dtype,
+    spacing    = tuple(float(h) for h in spacing.split())[::-1] or None,
+    data_file  = data_file,
+    compressed = compressed,
+    offset     = offset)
+  return header
+
+
+def IsGzip(path: str, offset: int = 0) -> bool:
+  '''Return whether the data of a file, from byte `offset`, starts with
+  the gzip magic number.'''
+  with open(path, 'rb') as f:
+    f.seek(offset)
+    return f.read(2) == b'\x1f\x8b'
+
+
+def RemapLUT(remap: dict = VICTRE_LABEL) -> np.ndarray:
+  '''Return the uint8 lookup array of label remapping; labels not in
+  `remap` are kept.'''
+  lut = np.arange(N_LABEL, dtype=np.uint8)
+  for label, tissue in remap.items():
+    lut[label] = tissue
+  return lut
+
+
+def StreamBytes(path: str, compressed: bool, start: int, stop: int,
+                chunk: int = CHUNK, offset: int = 0):
+  '''Yield the bytes [start, stop) of the (decompressed) data of a file
+  in chunks of at most `chunk` bytes.
+
+  :param offset: Bytes of the file before the (compressed) data, e.g., a
+    local MetaImage header.
+  '''
+  with open(path, 'rb') as f:
+    if not compressed:
+      f.seek(offset + start)
+      pos = start
+      while pos < stop:
+        data = f.read(min(chunk, stop - pos))
+        if not data:
+          break
+        pos += len(data)
+        yield data
+      return
+
+    # gzip (possibly of several members) or zlib stream, whose positions
+    # count from the start of the decompressed data
+    f.seek(offset)
+    d   = zlib.decompressobj(zlib.MAX_WBITS | 32)
+    pos = 0
+    while pos < stop:
+      if d.eof:
+        # Next gzip member, if any
+        rest = d.unused_data or f.read(chunk)
+        if not rest:
+          break
+        d    = zlib.decompressobj(zlib.MAX_WBITS | 32)
+        data = d.decompress(rest, chunk)
+      else:
+        rest = d.unconsumed_tail or f.read(chunk)
+        if not rest:
+          break
+        data = d.decompress(rest, chunk)
+      # Part of this chunk in [start, stop)
+      lo, hi = max(start - pos, 0), min(stop - pos, len(data))
+      pos   += len(data)
+      if lo < hi:
+        yield memoryview(data)[lo:hi]
+
+
+def ReadVICTRE(path: str, out_path: str = None, remap=VICTRE_LABEL,
+               z_range: tuple = None, shape: tuple = None,
+               chunk: int = CHUNK) -> np.ndarray:
+  '''Read a VICTRE volume, or the z-slices `z_range` of it, streaming
+  into a memory-mapped label map.
+
+  :param path: Path of the `.mhd` (or `.mha`) header, or of a `.raw` or
+    `.raw.gz` data file of uint8 labels.
+  :param out_path: Path of the output, `.npy` or raw binary file; read
+    into memory if not given.
+  :param remap: Remapping of VICTRE labels to `Tissue_type` labels, as a
+    dictionary or a lookup array of shape (256,), or None to keep them.
+  :param z_range: Range [z0, z1) of the z-slices to read (default: all).
+  :param shape: Shape (z, y, x) of a data file without header.
+  :return: Label map of shape (z1 - z0, y, x).
+  '''
+  if os.fspath(path).endswith(('.mhd', '.mha')):
+    header = ReadMHD(path)
+  else:
+    if shape is None:
+      raise ValueError('Shape of a volume without header must be given')
+    header = dict(shape=tuple(shape), dtype=np.dtype(np.uint8),
+                  data_file=path, compressed=IsGzip(path), offset=0)
+  shape, dtype = header['shape'], header['dtype']
+  z0, z1 = z_range if z_range is not None else (0, shape[0])
+  if not 0 <= z0 <= z1 <= shape[0]:
+    raise ValueError(f'z-range {(z0, z1)} out of {shape[0]} slices')
+  if remap is not None:
+    if dtype != np.uint8:
+      raise ValueError(f'Labels of type {dtype} cannot be remapped')
+    remap = RemapLUT(remap) if isinstance(remap, dict) \
+            else np.asarray(remap, dtype=np.uint8)
+
+  size   = int(np.prod(shape[1:]))*dtype.itemsize
+  offset = header['offset']
+  if offset < 0:
+    if header['compressed']:
+      raise ValueError('Compressed data must have a header size')
+    offset = os.path.getsize(header['data_file']) - shape[0]*size
+
+  out_shape = (z1 - z0,) + shape[1:]
+  out  = np.empty(out_shape, dtype=dtype) if out_path is None \
+         else CreateVolume(out_path, out_shape, dtype)
+  flat = out.reshape(-1).view(np.uint8)
+  pos  = 0
+  for data in StreamBytes(header['data_file'], header['compressed'],
+                          z0*size, z1*size, chunk, offset):
+    data = np.frombuffer(data, dtype=np.uint8)
+    if remap is None:
+      flat[pos:pos + len(data)] = data
+    else:
+      np.take(remap, data, out=flat[pos:pos + len(data)])
+    pos += len(data)
+  if pos != flat.size:
+    raise ValueError(f"'{header['data_file']}' ends after {pos} of "
+                     f'{flat.size} bytes')
+  if isinstance(out, np.memmap):
+    out.flush()
+  return out
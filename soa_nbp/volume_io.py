@@ -0,0 +1,66 @@
+'''
+───────────────────────────────────────────────────────────────────────────
+Memory-mapped volume input and output
+───────────────────────────────────────────────────────────────────────────
+This includes functions to open tissue label maps and property maps as
+memory-mapped arrays and to stream over them in slabs along the z-axis
+(the first axis), so that the memory footprint is bounded by the slab
+size rather than the volume size.
+
+A volume is stored either as a `.npy` file, which carries its shape and
+data type, or as a raw binary file (e.g., `.raw` of VICTRE), whose shape
+and data type must be given.
+
+Copyright (C) 2024 Seonyeong Park and Mark Anastasio
+          Computational Imaging Science Laboratory
+          (https://anastasio.bioengineering.illinois.edu/)
+          Department of Bioengineering,
+          University of Illinois Urbana-Champaign
+          GitHub: https://github.com/comp-imaging-sci/soa-nbp
+
+License : GNU General Public License version 3, Please see 'LICENSE' for
+          details.
+'''
+import os
+
+import numpy as np
+
+# Default number of z-slices per slab
+SLAB = 16
+
+
+def OpenVolume(volume, shape: tuple = None, dtype=np.uint8,
+               offset: int = 0) -> np.ndarray:
+  '''Open a volume read-only as a memory-mapped array.
+
+  :param volume: Array, or path to a `.npy` or raw binary file.
+  :param shape: Shape (z, y, x) of a raw binary file.
+  :param offset: Header size in bytes of a raw binary file.
+  '''
+  if not isinstance(volume, (str, os.PathLike)):
+    return volume
+  if os.fspath(volume).endswith('.npy'):
+    return np.load(volume, mmap_mode='r')
+  if shape is None:
+    raise ValueError('Shape of a raw volume must be given')
+  return np.memmap(volume, dtype=dtype, mode='r', offset=offset,
+                   shape=tuple(shape))
+
+
+def CreateVolume(path, shape: tuple, dtype=np.float32) -> np.ndarray:
+  '''Create a memory-mapped output volume, as `.npy` or raw binary file
+  according to the file extension.'''
+  dirname = os.path.dirname(os.fspath(path))
+  if dirname:
+    os.makedirs(dirname, exist_ok=True)
+  if os.fspath(path).endswith('.npy'):
+    return np.lib.format.open_memmap(path, mode='w+', dtype=dtype,
+                                     shape=tuple(shape))
+  return np.memmap(path, dtype=dtype, mode='w+', shape=tuple(shape))
+
+
+def Slabs(nz: int, slab: int = SLAB, z_range: tuple = None):
+  '''Yield z-slices of slabs covering `z_range` (default: all slices).'''
+  z0, z1 = z_range if z_range is not None else (0, nz)
+  for z in range(z0, z1, slab):
+    yield slice(z, min(z + slab, z1))
@@ -0,0 +1,33 @@
+'''
+Shared fixtures of the tests.
+'''
+import numpy as np
+import pytest
+
+from soa_nbp.parameters import Tissue_type
+
+
+def BreastLabelmap(shape: tuple = (20, 22, 24), seed: int = 0
+                   ) -> np.ndarray:
+  '''Return a small label map of a breast-like ellipsoid in water, with
+  skin, fat, glandular tissue, ligaments, and straight vessels.'''
+  rng  = np.random.default_rng(seed)
+  grid = np.indices(shape) - (np.array(shape)[:, None, None, None] - 1)/2.
+  r    = np.sqrt(np.sum((grid/(np.array(shape)[:, None, None, None]/2.
+                               - 1.))**2, axis=0))
+  label = np.full(shape, Tissue_type.water, dtype=np.uint8)
+  label[r < 1.]    = Tissue_type.dermis
+  label[r < 0.9]   = Tissue_type.fat
+  gland = (r < 0.6) & (rng.random(shape) < 0.6)
+  label[gland]     = Tissue_type.glandular
+  label[(r < 0.6) & (rng.random(shape) < 0.05)] = Tissue_type.ligament
+  z, y, x = (n//2 for n in shape)
+  label[2:-2, y - 3, x - 3] = Tissue_type.artery
+  label[2:-2, y + 3, x + 3] = Tissue_type.vein
+  label[z, 3:-3, x + 5]     = Tissue_type.artery
+  return label
+
+
+@pytest.fixture
+def labelmap() -> np.ndarray:
+  return BreastLabelmap()
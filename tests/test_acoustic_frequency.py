@@ -0,0 +1,70 @@
+'''
+Tests of the frequency-resolved acoustic maps of `acoustic_frequency`.
+'''
+import numpy as np
+import pytest
+
+from soa_nbp.parameters import Acou_prop
+from soa_nbp.acoustic_map import AcouLUT
+from soa_nbp.acoustic_frequency import (AttenuationTable, SoundSpeedTable,
+                                        GenerateFreqAcouMap)
+
+F = np.array([0.5, 1., 2., 5.])
+
+
+@pytest.fixture
+def lut() -> dict:
+  return AcouLUT(seed=0)
+
+
+def test_power_law(lut):
+  alpha = AttenuationTable(lut['alpha_coeff'], 1.5, F)
+  assert alpha.shape == (F.size, lut['alpha_coeff'].size)
+  np.testing.assert_allclose(alpha, F[:, None]**1.5*lut['alpha_coeff'])
+  np.testing.assert_array_equal(alpha[1], lut['alpha_coeff'])
+
+
+@pytest.mark.parametrize('y', [1., 1.5])
+def test_sound_speed_at_reference(lut, y):
+  c = SoundSpeedTable(lut['sound_speed'], lut['alpha_coeff'], y, [2.],
+                      f_ref=2.)
+  np.testing.assert_allclose(c[0], lut['sound_speed'], rtol=1e-12)
+
+
+def test_dispersion_limit_and_sign(lut):
+  # The y = 1 case is the limit of the power law for y -> 1
+  c = {y: SoundSpeedTable(lut['sound_speed'], lut['alpha_coeff'], y, F)
+       for y in (1. - 1e-6, 1., 1. + 1e-6)}
+  finite = np.isfinite(lut['sound_speed'])
+  for y in (1. - 1e-6, 1. + 1e-6):
+    np.testing.assert_allclose(c[y][:, finite], c[1.][:, finite],
+                               rtol=1e-7)
+  # Sound speed rises with frequency where there is attenuation
+  lossy = finite & (lut['alpha_coeff'] > 0.)
+  assert lossy.any()
+  assert np.all(np.diff(c[1.][:, lossy], axis=0) > 0.)
+
+
+@pytest.mark.parametrize('slab', [1, 64])
+def test_maps_match_gather(tmp_path, labelmap, lut, slab):
+  acou = GenerateFreqAcouMap(labelmap, str(tmp_path), 'B', F, lut,
+                             f_ref=1., slab=slab)
+  y    = Acou_prop.y['B']
+  assert acou['y'] == y
+  np.testing.assert_array_equal(acou['frequency'], F)
+  table = {'alpha':       AttenuationTable(lut['alpha_coeff'], y, F),
+           'sound_speed': SoundSpeedTable(lut['sound_speed'],
+                                          lut['alpha_coeff'], y, F)}
+  for name, t in table.items():
+    ref = t.astype(np.float32)[:, labelmap]
+    np.testing.assert_array_equal(acou[name], ref)
+    np.testing.assert_array_equal(np.load(tmp_path/f'{name}.npy'), ref)
+
+
+def test_compact_maps(tmp_path, labelmap, lut):
+  acou = GenerateFreqAcouMap(labelmap, str(tmp_path), 'B', F, lut,
+                             f_ref=3., compact=True)
+  assert acou['f_ref'] == 3.
+  np.testing.assert_array_equal(acou['alpha_coeff'],
+                                lut['alpha_coeff'].astype(np.float32)
+                                [labelmap])
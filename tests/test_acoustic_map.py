@@ -0,0 +1,51 @@
+'''
+Tests of the streamed acoustic maps of `acoustic_map` against an
+in-memory gather.
+'''
+import numpy as np
+import pytest
+
+from soa_nbp.parameters import Acou_prop
+from soa_nbp.acoustic_map import ACOU_NAME, AcouLUT, GenerateAcouMap
+from soa_nbp.volume_io import OpenVolume, CreateVolume, Slabs
+
+
+def test_slabs_cover_range():
+  assert list(Slabs(10, 4)) == [slice(0, 4), slice(4, 8), slice(8, 10)]
+  assert list(Slabs(10, 4, (3, 9))) == [slice(3, 7), slice(7, 9)]
+
+
+@pytest.mark.parametrize('slab', [1, 3, 64])
+@pytest.mark.parametrize('raw', [False, True])
+def test_streamed_maps_match_gather(tmp_path, labelmap, slab, raw):
+  if raw:
+    path = str(tmp_path/'label.raw')
+    labelmap.tofile(path)
+  else:
+    path = str(tmp_path/'label.npy')
+    np.save(path, labelmap)
+  lut  = AcouLUT(seed=0)
+  acou = GenerateAcouMap(path, str(tmp_path/'acou'), 'C', lut,
+                         shape=labelmap.shape, slab=slab)
+  for name in ACOU_NAME:
+    ref = lut[name].astype(np.float32)[labelmap]
+    np.testing.assert_array_equal(acou[name], ref)
+    np.testing.assert_array_equal(np.load(tmp_path/'acou'/f'{name}.npy'),
+                                  ref)
+  assert acou['y'] == Acou_prop.y['C']
+
+
+def test_lookup_is_seeded():
+  a, b = AcouLUT(seed=1), AcouLUT(seed=1)
+  for name in ACOU_NAME:
+    np.testing.assert_array_equal(a[name], b[name])
+
+
+def test_volume_round_trip(tmp_path):
+  out = CreateVolume(str(tmp_path/'v.raw'), (2, 3, 4), np.uint8)
+  out[...] = np.arange(24).reshape(2, 3, 4)
+  out.flush()
+  np.testing.assert_array_equal(OpenVolume(str(tmp_path/'v.raw'),
+                                           (2, 3, 4)), out)
+  with pytest.raises(ValueError):
+    OpenVolume(str(tmp_path/'v.raw'))
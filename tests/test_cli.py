@@ -0,0 +1,86 @@
+'''
+Tests of the `soa-nbp` command of `cli`: metrics records, resumed
+runs, VICTRE inputs, and the version.
+'''
+import gzip
+import json
+import os
+
+import numpy as np
+import pytest
+
+from soa_nbp.parameters import __version__
+from soa_nbp.ensemble import META, PhantomDir
+from soa_nbp.victre_io import RemapLUT
+from soa_nbp.cli import ListLabelmaps, Main
+
+# Validation warns of fractions possibly adding up to more than 1
+pytestmark = pytest.mark.filterwarnings('ignore:Volume fractions')
+
+
+def Records(path) -> list:
+  with open(path) as f:
+    return [json.loads(line) for line in f]
+
+
+def test_run_and_resume(tmp_path, labelmap):
+  for i in range(2):
+    np.save(tmp_path/f'label_{i}.npy', labelmap)
+  argv = [str(tmp_path), '--out-dir', str(tmp_path/'out'),
+          '--breast-type', 'B', '--wavelength', '750', '--no-pde',
+          '--workers', '1', '--metrics', str(tmp_path/'metrics.jsonl')]
+  assert Main(argv) == 0
+  record = Records(tmp_path/'metrics.jsonl')
+  assert [r['event'] for r in record] == ['phantom', 'phantom', 'summary']
+  assert sorted(r['index'] for r in record[:2]) == [0, 1]
+  for r in record[:2]:
+    assert r['voxels'] == labelmap.size
+    assert set(r['stage']) >= {'sample', 'func', 'acou', 'mu_a', 'mu_s'}
+    assert os.path.exists(os.path.join(PhantomDir(str(tmp_path/'out'),
+                                                  r['index']), META))
+  assert (record[2]['generated'], record[2]['skipped']) == (2, 0)
+  assert record[2]['vessel'] is False
+
+  # Finished phantoms are skipped; the records are appended
+  os.remove(os.path.join(PhantomDir(str(tmp_path/'out'), 1), META))
+  assert Main(argv) == 0
+  record = Records(tmp_path/'metrics.jsonl')[3:]
+  assert [(r['event'], r.get('index')) for r in record] == \
+         [('phantom', 1), ('summary', None)]
+  assert (record[1]['generated'], record[1]['skipped']) == (1, 1)
+
+
+def test_victre_input(tmp_path, capsys):
+  volume = np.zeros((4, 5, 6), dtype=np.uint8)
+  volume[1:3, 1:4, 1:5] = 1     # VICTRE fat
+  volume[2, 2, 2:4]     = 150   # VICTRE artery
+  (tmp_path/'p.raw.gz').write_bytes(gzip.compress(volume.tobytes()))
+  assert Main([str(tmp_path/'p.raw.gz'), '--shape', '4', '5', '6',
+               '--out-dir', str(tmp_path/'out'), '--breast-type', 'A',
+               '--no-pde', '--vessel', '--workers', '1']) == 0
+  record = [json.loads(line) for line in capsys.readouterr().out
+            .splitlines()]
+  assert record[0]['labelmap'] == str(tmp_path/'p.raw.gz')
+  assert 'read' in record[0]['stage']
+  assert record[1]['vessel'] is True
+  np.testing.assert_array_equal(
+    np.load(os.path.join(PhantomDir(str(tmp_path/'out'), 0),
+                         'labelmap.npy')), RemapLUT()[volume])
+
+
+def test_list_labelmaps(tmp_path):
+  for name in ('b.npy', 'a.mhd', 'a.raw.gz', 'c.txt'):
+    (tmp_path/name).write_bytes(b'')
+  assert ListLabelmaps([str(tmp_path), 'x.raw']) == \
+         [str(tmp_path/'a.mhd'), str(tmp_path/'b.npy'), 'x.raw']
+  (tmp_path/'empty').mkdir()
+  with pytest.raises(SystemExit, match='no label maps'):
+    Main([str(tmp_path/'empty'), '--out-dir', str(tmp_path),
+          '--breast-type', 'A'])
+
+
+def test_version(capsys):
+  with pytest.raises(SystemExit) as info:
+    Main(['--version'])
+  assert info.value.code == 0
+  assert capsys.readouterr().out.strip() == f'soa-nbp {__version__}'
@@ -0,0 +1,80 @@
+'''
+Tests of the volume fractions constrained by `sampling.SampleComposition`.
+'''
+import numpy as np
+import pytest
+
+from soa_nbp.parameters import Func_prop
+from soa_nbp.lookup_table import Lookup_table, CompileProp
+from soa_nbp.sampling import FRACTION, SampleTable, SampleComposition
+
+N = 2000
+
+
+def FuncTable(**dermis) -> dict:
+  '''Return the compiled `Func_prop` tables with the volume fractions of
+  dermis replaced.'''
+  table = CompileProp(Func_prop)
+  for name, spec in dermis.items():
+    table[name] = Lookup_table({**getattr(Func_prop, name), 'dermis': spec},
+                               name)
+  return table
+
+
+@pytest.fixture
+def table() -> dict:
+  # Dermis and its aliases (with the melanin of epidermis) violate the
+  # constraint in most realizations
+  return FuncTable(f_w={'min': 0.3, 'max': 0.7})
+
+
+def FractionSum(sample: dict, table: dict) -> dict:
+  '''Return the sum of the sampled volume fractions of each tissue.'''
+  total = {}
+  for name in FRACTION:
+    for tissue, root in table[name].root.items():
+      if table[name].kind[root] in ('const', 'random'):
+        total[tissue] = total.get(tissue, 0.) + sample[name][root]
+  return total
+
+
+def test_simplex_constraint(table):
+  sample, report = SampleComposition(table, N, np.random.default_rng(0))
+  for tissue, total in FractionSum(sample, table).items():
+    assert np.all(total <= 1.), tissue
+  assert report['dermis']['adjusted'] > 0
+  for r in report.values():
+    assert r['rate'] == r['adjusted']/N
+
+
+def test_only_violating_realizations_changed(table):
+  # Same variates as `SampleTable`
+  free           = SampleTable(table, N, np.random.default_rng(1))
+  sample, report = SampleComposition(table, N, np.random.default_rng(1))
+  bad            = np.any([t > 1. for t in FractionSum(free, table)
+                           .values()], axis=0)
+  assert 0 < bad.sum() < N
+  assert max(r['adjusted'] for r in report.values()) == bad.sum()
+  for name, s in sample.items():
+    for field in s.dtype.names:
+      np.testing.assert_array_equal(s[field][~bad], free[name][field][~bad])
+      # Shrinking the quantiles only lowers the fractions
+      if name in FRACTION and field == 'dermis':
+        assert np.all(s[field][bad] <= free[name][field][bad])
+  assert all(v <= 0. for v in report['dermis']['shift'].values())
+
+
+def test_default_tables_unchanged():
+  table          = CompileProp(Func_prop)
+  free           = SampleTable(table, N, np.random.default_rng(2))
+  sample, report = SampleComposition(table, N, np.random.default_rng(2))
+  assert all(r['adjusted'] == 0 for r in report.values())
+  for name, s in sample.items():
+    assert s.tobytes() == free[name].tobytes()
+
+
+def test_infeasible_fractions():
+  table = FuncTable(f_w={'min': 0.6, 'max': 0.7}, f_f={'min': 0.5,
+                                                       'max': 0.6})
+  with pytest.raises(ValueError, match='cannot add up'):
+    SampleComposition(table, 10, np.random.default_rng(0))
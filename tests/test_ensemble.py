@@ -0,0 +1,90 @@
+'''
+Tests of the reproducible per-phantom seeding of `ensemble`.
+'''
+import json
+import os
+
+import numpy as np
+import pytest
+
+from soa_nbp.ensemble import (META, PhantomDir, PhantomSeed, GeneratePhantom,
+                              GenerateEnsemble, MetaSample)
+from soa_nbp.parameters import Tissue_type
+from soa_nbp.functional_map import FUNC_NAME, WATER, FuncLUT, GenerateFuncMap
+
+WAVELENGTH = [750., 800.]
+
+# Validation warns of fractions possibly adding up to more than 1
+pytestmark = pytest.mark.filterwarnings('ignore:Volume fractions')
+
+
+def ReadMaps(path: str) -> dict:
+  return {os.path.relpath(os.path.join(d, f), path):
+          np.load(os.path.join(d, f))
+          for d, _, files in os.walk(path) for f in files
+          if f.endswith('.npy')}
+
+
+def test_phantom_seeds_independent():
+  a = np.random.default_rng(PhantomSeed(0, 0)).random(4)
+  b = np.random.default_rng(PhantomSeed(0, 1)).random(4)
+  c = np.random.default_rng(PhantomSeed(0, 1)).random(4)
+  assert not np.array_equal(a, b)
+  np.testing.assert_array_equal(b, c)
+
+
+def test_pool_matches_serial(tmp_path, labelmap):
+  path = str(tmp_path/'label.npy')
+  np.save(path, labelmap)
+  out  = GenerateEnsemble(path, ['A', 'C', 'D'], str(tmp_path/'pool'), n=3,
+                          root_seed=5, wavelength=WAVELENGTH, workers=2,
+                          log=None)
+  assert out['generated'] == 3 and out['skipped'] == 0
+  # Phantom 1 regenerated alone from (root seed, index)
+  GeneratePhantom(1, path, 'C', str(tmp_path/'serial'), 5, WAVELENGTH)
+  pool   = ReadMaps(PhantomDir(str(tmp_path/'pool'), 1))
+  serial = ReadMaps(PhantomDir(str(tmp_path/'serial'), 1))
+  assert pool.keys() == serial.keys() and len(pool) == 11
+  for name in pool:
+    np.testing.assert_array_equal(pool[name], serial[name])
+  f0 = np.load(os.path.join(PhantomDir(str(tmp_path/'pool'), 0), 'func',
+                            'f_b.npy'))
+  assert not np.array_equal(f0, pool[os.path.join('func', 'f_b.npy')])
+
+
+def test_resume_skips_finished(tmp_path, labelmap):
+  path = str(tmp_path/'label.npy')
+  np.save(path, labelmap)
+  GenerateEnsemble(path, 'B', str(tmp_path), n=2, workers=1, pde=False,
+                   log=None)
+  os.remove(os.path.join(PhantomDir(str(tmp_path), 1), META))
+  out = GenerateEnsemble(path, 'B', str(tmp_path), n=2, workers=1,
+                         pde=False, log=None)
+  assert (out['generated'], out['skipped']) == (1, 1)
+
+
+def test_metadata_round_trip(tmp_path, labelmap):
+  meta = GeneratePhantom(0, labelmap, 'B', str(tmp_path), 3, pde=False)
+  with open(os.path.join(PhantomDir(str(tmp_path), 0), META)) as f:
+    assert json.load(f) == json.loads(json.dumps(meta))
+  lut  = FuncLUT(MetaSample(meta)['Func_prop'])
+  func = GenerateFuncMap(labelmap, lut=lut, pde=False)
+  for name in FUNC_NAME:
+    np.testing.assert_array_equal(
+      np.load(os.path.join(PhantomDir(str(tmp_path), 0), 'func',
+                           f'{name}.npy')), func[name])
+
+
+def test_func_map_streamed(tmp_path, labelmap):
+  lut    = FuncLUT(seed=2)
+  memory = GenerateFuncMap(labelmap, lut=lut, seed=2, vessel=True)
+  stream = GenerateFuncMap(labelmap, str(tmp_path), lut, seed=2,
+                           vessel=True, slab=3)
+  water  = labelmap == Tissue_type.water
+  for name in FUNC_NAME:
+    assert isinstance(stream[name], np.memmap)
+    # Up to the tolerance of the PDE solver
+    np.testing.assert_allclose(np.load(tmp_path/f'{name}.npy'),
+                               memory[name], rtol=1e-6)
+    # The coupling water is defined, so μ_a and p0 are not NaN there
+    assert (memory[name][water] == WATER[name]).all()
@@ -0,0 +1,97 @@
+'''
+Tests of the quasi-random designs of `ensemble_design` against the inverse
+CDFs of `scipy.stats` and an additive model of known Sobol indices.
+'''
+import numpy as np
+import pytest
+from scipy import stats
+
+from soa_nbp.parameters import Acou_prop, Func_prop
+from soa_nbp.ensemble_design import (Design_space, Phantom, SaltelliDesign,
+                                     SobolIndices)
+
+
+@pytest.fixture(scope='module')
+def space() -> Design_space:
+  return Design_space(breast_type='B')
+
+
+def test_dimensions(space):
+  assert space.dimension == len(set(space.name))
+  assert 'Func_prop/c_thbb' in space.name
+  assert 'Opt_prop/mu_sp/dermis' in space.name
+  # Constants take no dimension
+  assert not any(n.startswith('Acou_prop/sound_speed/water')
+                 for n in space.name)
+  assert Design_space(c_thbb=False).dimension == \
+         space.dimension - 1 - sum(n.startswith('VICTRE_param/')
+                                   for n in space.name)
+
+
+def test_inverse_cdf(space):
+  u      = space.Design(64, 'random', seed=0)
+  sample = space.Sample(u)
+  spec   = Acou_prop.sound_speed['fat']
+  ref    = stats.truncnorm.ppf(u[:, space.name.index(
+                                 'Acou_prop/sound_speed/fat')],
+                               (spec['min'] - spec['mean'])/spec['std'],
+                               (spec['max'] - spec['mean'])/spec['std'],
+                               spec['mean'], spec['std'])
+  np.testing.assert_allclose(sample['Acou_prop']['sound_speed']['fat'],
+                             ref, rtol=1e-9)
+  c = Func_prop.c_thbb
+  np.testing.assert_allclose(sample['c_thbb'], c['min'] + (c['max']
+                             - c['min'])*u[:, space.name.index(
+                               'Func_prop/c_thbb')])
+  assert sample['VICTRE_param'].shape == (64,)
+
+
+def test_fraction_constraint(space):
+  sample = space.Sample(space.Design(256, 'sobol', seed=1))['Func_prop']
+  total  = sum(sample[name]['dermis'] for name in ('f_b', 'f_w', 'f_f'))
+  assert np.all(total <= 1.)
+
+
+@pytest.mark.parametrize('method', ['sobol', 'lhs', 'random'])
+def test_designs(space, method):
+  n = 128
+  u = space.Design(n, method, seed=2)
+  assert u.shape == (n, space.dimension)
+  assert np.all((u >= 0.) & (u < 1.))
+  if method == 'lhs':
+    # One point per stratum of every dimension
+    strata = np.sort(np.floor(u*n), axis=0)
+    np.testing.assert_array_equal(strata, np.arange(n)[:, None]
+                                  *np.ones((1, space.dimension)))
+  np.testing.assert_array_equal(u, space.Design(n, method, seed=2))
+
+
+def test_saltelli_additive_model():
+  # y = sum a_i u_i: first-order and total indices a_i^2/sum a^2
+  a = np.array([1., 2., 0.5, 0.])
+  d = len(a)
+  u = SaltelliDesign(d, 2**12, seed=3)
+  assert u.shape == (2**12*(d + 2), d)
+  first, total = SobolIndices(u @ a, d)
+  ref = a**2/np.sum(a**2)
+  np.testing.assert_allclose(first, ref, atol=0.03)
+  np.testing.assert_allclose(total, ref, atol=0.03)
+
+
+def test_phantom_realization(space):
+  sample  = space.Sample(space.Design(4, 'lhs', seed=4))
+  phantom = Phantom(sample, 2)
+  assert phantom['c_thbb'] == sample['c_thbb'][2]
+  assert phantom['VICTRE_param'].tobytes() == \
+         sample['VICTRE_param'][2:3].tobytes()
+  for prop in ('Func_prop', 'Opt_prop', 'Acou_prop'):
+    for name, s in sample[prop].items():
+      assert phantom[prop][name].shape == (1,)
+      assert phantom[prop][name].tobytes() == s[2:3].tobytes()
+
+
+def test_invalid_input(space):
+  with pytest.raises(ValueError, match='Unknown method'):
+    space.Design(4, 'halton')
+  with pytest.raises(ValueError, match='dimensions'):
+    space.Sample(np.full((2, space.dimension + 1), 0.5))
@@ -0,0 +1,137 @@
+'''
+Tests of the diffusion fluence solver of `fluence` against a dense solve
+of the finite-volume equations.
+'''
+import itertools
+
+import numpy as np
+import pytest
+import scipy.sparse.linalg as spla
+
+from soa_nbp.parameters import Tissue_type
+from soa_nbp.fluence import (pyamg, N_WATER, EffectiveReflection,
+                             Diffusion_system, CalculateFluence)
+
+BACKEND = ['cg'] + (['amg'] if pyamg is not None else [])
+H       = 0.5
+
+
+def Phantom(seed: int = 0) -> tuple:
+  '''Return a label map of fat and glandular tissue in water, its
+  refractive index lookup, and random `μ_a` and `μ_s'` of two
+  wavelengths.'''
+  rng   = np.random.default_rng(seed)
+  label = np.full((6, 7, 8), Tissue_type.water, dtype=np.uint8)
+  label[1:5, 1:6, 1:7] = Tissue_type.fat
+  label[2:4, 2:5, 3:6] = Tissue_type.glandular
+  label[0, 3, 4]       = Tissue_type.fat    # on the grid edge
+  n_lut = np.full(256, np.nan)
+  n_lut[Tissue_type.fat], n_lut[Tissue_type.glandular] = 1.44, 1.40
+  mu_a  = rng.uniform(0.002, 0.02, (2,) + label.shape)
+  mu_sp = rng.uniform(0.5, 1.5, (2,) + label.shape)
+  return label, n_lut, mu_a, mu_sp
+
+
+def DenseSystem(label, n_lut, mu_a, mu_sp, incident: float) -> tuple:
+  '''Return the dense finite-volume diffusion system (A, b) of one
+  wavelength with the partial-current boundary condition, and the domain
+  voxels.'''
+  domain = np.argwhere(np.isfinite(n_lut[label]))
+  index  = {tuple(v): i for i, v in enumerate(domain)}
+  D      = 1./(3.*(mu_a + mu_sp))
+  A      = np.zeros((len(domain), len(domain)))
+  b      = np.zeros(len(domain))
+  for i, v in enumerate(domain):
+    v = tuple(v)
+    A[i, i] += mu_a[v]
+    for d, step in itertools.product(range(3), (-1, 1)):
+      nb = list(v)
+      nb[d] += step
+      nb = tuple(nb)
+      if nb in index:
+        w = 2.*D[v]*D[nb]/(D[v] + D[nb])/H**2
+        A[i, i]         += w
+        A[i, index[nb]] -= w
+      else:
+        inside  = 0 <= nb[d] < label.shape[d]
+        n_out   = n_lut[label[nb]] if inside else np.nan
+        n_out   = n_out if np.isfinite(n_out) else N_WATER
+        r       = EffectiveReflection(n_lut[label[v]]/n_out)
+        a       = (1. + r)/(1. - r)
+        beta    = 2.*D[v]/(H**2 + 4.*a*D[v]*H)
+        A[i, i] += beta
+        b[i]    += 4.*beta*incident
+  return A, b, domain
+
+
+def DenseSolve(label, n_lut, mu_a, mu_sp, incident: float) -> np.ndarray:
+  '''Solve the diffusion system of one wavelength densely.'''
+  A, b, domain = DenseSystem(label, n_lut, mu_a, mu_sp, incident)
+  phi = np.zeros(label.shape)
+  phi[tuple(domain.T)] = np.linalg.solve(A, b)
+  return phi
+
+
+@pytest.mark.parametrize('backend', BACKEND)
+def test_fluence_matches_dense_solve(backend):
+  label, n_lut, mu_a, mu_sp = Phantom()
+  phi = CalculateFluence(label, mu_a, mu_sp, n_lut, H, incident=2.,
+                         rtol=1e-12, backend=backend)
+  assert phi.shape == mu_a.shape
+  for k in range(len(mu_a)):
+    np.testing.assert_allclose(phi[k], DenseSolve(label, n_lut, mu_a[k],
+                                                  mu_sp[k], 2.),
+                               rtol=1e-8, atol=1e-12)
+  assert np.all(phi[:, label == Tissue_type.water] == 0.)
+
+
+def test_effective_reflection():
+  # Matched indices reflect almost nothing; the fit is clipped to [0, 1]
+  assert EffectiveReflection(1.) == pytest.approx(0.0016, abs=1e-12)
+  assert 0.4 < EffectiveReflection(1.44/1.) < 0.6
+  assert EffectiveReflection(0.1) == 0.
+
+
+def Iterations(system, mu_a, mu_sp, rtol: float) -> int:
+  '''Return the fewest CG iterations the Jacobi backend converges in.'''
+  for maxiter in range(1, 200):
+    try:
+      system.Solve(mu_a, mu_sp, rtol=rtol, maxiter=maxiter, backend='cg')
+      return maxiter
+    except RuntimeError:
+      continue
+  raise AssertionError('CG did not converge')
+
+
+def test_convergence_on_last_iteration():
+  label, n_lut, mu_a, mu_sp = Phantom(1)
+  system = Diffusion_system(label, n_lut, H)
+  k = Iterations(system, mu_a, mu_sp, 1e-10)
+  assert k > 1
+  ref = system.Solve(mu_a, mu_sp, rtol=1e-10, maxiter=k, backend='cg')
+  np.testing.assert_array_equal(
+    system.Solve(mu_a, mu_sp, rtol=1e-10, maxiter=k + 5, backend='cg'),
+    ref)
+  with pytest.raises(RuntimeError, match='did not converge'):
+    system.Solve(mu_a, mu_sp, rtol=1e-10, maxiter=k - 1, backend='cg')
+
+
+@pytest.mark.parametrize('rtol', [1e-6, 1e-8, 1e-10])
+def test_iterations_match_scipy_cg(rtol):
+  # Jacobi-preconditioned CG of SciPy per wavelength, counting updates
+  label, n_lut, mu_a, mu_sp = Phantom(1)
+  count = []
+  for k in range(len(mu_a)):
+    A, b, _ = DenseSystem(label, n_lut, mu_a[k], mu_sp[k], 1.)
+    n = []
+    spla.cg(A, b, rtol=rtol, atol=0., M=np.diag(1./np.diag(A)),
+            callback=n.append)
+    count.append(len(n))
+  system = Diffusion_system(label, n_lut, H)
+  assert Iterations(system, mu_a, mu_sp, rtol) == max(count)
+
+
+def test_unknown_backend():
+  label, n_lut, mu_a, mu_sp = Phantom()
+  with pytest.raises(ValueError, match='Unknown backend'):
+    CalculateFluence(label, mu_a, mu_sp, n_lut, H, backend='lu')
@@ -0,0 +1,52 @@
+'''
+Tests of the streamed p_0 maps of `initial_pressure` against
+Γ μ_a Φ computed in memory.
+'''
+import numpy as np
+import pytest
+
+from soa_nbp.parameters import Tissue_type
+from soa_nbp.optical_absorption import CalculateMuA
+from soa_nbp.functional_map import FUNC_NAME
+from soa_nbp.initial_pressure import GRUENEISEN, GrueneisenLUT, GenerateP0Map
+
+WAVELENGTH = [700., 800., 900.]
+C_THBB     = 2300.
+
+
+@pytest.fixture
+def func(labelmap) -> dict:
+  rng = np.random.default_rng(0)
+  f   = rng.dirichlet(np.ones(4), labelmap.shape)
+  return dict(zip(FUNC_NAME, (rng.random(labelmap.shape),
+                              *np.moveaxis(f, -1, 0))))
+
+
+@pytest.mark.parametrize('slab', [1, 7, 64])
+def test_p0_matches_product(tmp_path, labelmap, func, slab):
+  rng     = np.random.default_rng(1)
+  fluence = rng.random((len(WAVELENGTH),) + labelmap.shape)
+  np.save(tmp_path/'phi.npy', fluence)
+  gamma   = rng.uniform(0.5, 1., 256)
+  p0 = GenerateP0Map(labelmap, func, WAVELENGTH, C_THBB,
+                     str(tmp_path/'phi.npy'), str(tmp_path/'p0.npy'),
+                     grueneisen=gamma, slab=slab, dtype=np.float64)
+  ref = gamma[labelmap]*CalculateMuA(func, WAVELENGTH, C_THBB,
+                                     dtype=np.float64)*fluence
+  np.testing.assert_allclose(p0, ref, rtol=1e-12)
+  np.testing.assert_array_equal(np.load(tmp_path/'p0.npy'), p0)
+
+
+def test_default_grueneisen():
+  gamma = GrueneisenLUT()
+  assert gamma[Tissue_type.glandular] == GRUENEISEN['fat']
+  assert gamma[Tissue_type.air] == 0.
+  with pytest.raises(ValueError, match='constants'):
+    GrueneisenLUT({**GRUENEISEN, 'fat': {'min': 0.8, 'max': 1.}})
+
+
+def test_fluence_shape_mismatch(tmp_path, labelmap, func):
+  fluence = np.ones((len(WAVELENGTH) - 1,) + labelmap.shape)
+  with pytest.raises(ValueError, match='does not match'):
+    GenerateP0Map(labelmap, func, WAVELENGTH, C_THBB, fluence,
+                  str(tmp_path/'p0.npy'))
@@ -0,0 +1,42 @@
+'''
+Round-trip tests of the run-length encoded label maps of `label_codec`.
+'''
+import numpy as np
+import pytest
+
+from soa_nbp.label_codec import Label_rle
+
+
+@pytest.mark.parametrize('slab', [1, 4, 64])
+def test_round_trip(labelmap, slab):
+  rle = Label_rle.Encode(labelmap, slab=slab)
+  np.testing.assert_array_equal(rle.Decode(), labelmap)
+  assert rle.ratio > 1.
+
+
+def test_round_trip_random_labels():
+  labelmap = np.random.default_rng(0).integers(0, 256, (5, 6, 7),
+                                               dtype=np.uint8)
+  np.testing.assert_array_equal(Label_rle.Encode(labelmap).Decode(),
+                                labelmap)
+
+
+def test_save_load(tmp_path, labelmap):
+  np.save(tmp_path/'label.npy', labelmap)
+  Label_rle.Encode(str(tmp_path/'label.npy')).Save(str(tmp_path/'l.rle'))
+  rle = Label_rle.Load(str(tmp_path/'l.rle'))
+  assert rle.shape == labelmap.shape
+  np.testing.assert_array_equal(rle.Decode(), labelmap)
+  (tmp_path/'bad').write_bytes(b'NOTRLE\n\x00')
+  with pytest.raises(ValueError):
+    Label_rle.Load(str(tmp_path/'bad'))
+
+
+def test_region_and_lookup(labelmap):
+  rle = Label_rle.Encode(labelmap)
+  np.testing.assert_array_equal(
+    rle.Decode(z_range=(3, 9), y_range=(2, 20), x_range=(5, 6)),
+    labelmap[3:9, 2:20, 5:6])
+  lut = np.random.default_rng(1).random(256).astype(np.float32)
+  np.testing.assert_array_equal(rle.Decode(lut, z_range=(0, 4)),
+                                lut[labelmap[:4]])
@@ -0,0 +1,70 @@
+'''
+Tests of the per-label voxel index of `label_index` against full-volume
+masks.
+'''
+import numpy as np
+import pytest
+
+from soa_nbp.parameters import Tissue_type
+from soa_nbp.label_index import Label_index
+
+
+def test_voxels_match_masks(labelmap):
+  index = Label_index.Build(labelmap)
+  np.testing.assert_array_equal(index.Labels(), np.unique(labelmap))
+  for label in np.unique(labelmap):
+    np.testing.assert_array_equal(np.sort(index.Voxels(label)),
+                                  np.flatnonzero(labelmap == label))
+  np.testing.assert_array_equal(index.Mask([Tissue_type.artery,
+                                            Tissue_type.vein]),
+                                np.isin(labelmap, [Tissue_type.artery,
+                                                   Tissue_type.vein]))
+
+
+def test_save_load(tmp_path, labelmap):
+  index = Label_index.Build(labelmap)
+  index.Save(str(tmp_path/'index.npz'))
+  other = Label_index.Load(str(tmp_path/'index.npz'), labelmap.shape)
+  np.testing.assert_array_equal(other.index, index.index)
+  np.testing.assert_array_equal(other.offset, index.offset)
+  with pytest.raises(ValueError):
+    Label_index.Load(str(tmp_path/'index.npz'), (1, 2, 3))
+
+
+def test_assign_lut_matches_gather(labelmap):
+  lut = np.full(256, np.nan)
+  lut[np.unique(labelmap)] = np.arange(np.unique(labelmap).size) + 1.
+  np.testing.assert_array_equal(Label_index.Build(labelmap).AssignLUT(lut),
+                                lut[labelmap])
+
+
+@pytest.mark.parametrize('view', ['sliced', 'transposed', 'memmap'])
+def test_non_contiguous_output(tmp_path, labelmap, view):
+  index = Label_index.Build(labelmap)
+  shape = labelmap.shape
+  if view == 'sliced':
+    out = np.zeros(shape[:2] + (2*shape[2],))[..., ::2]
+  elif view == 'transposed':
+    out = np.zeros(shape[::-1]).T
+  else:
+    np.save(tmp_path/'out.npy', np.zeros(shape[:2] + (2*shape[2],)))
+    out = np.load(tmp_path/'out.npy', mmap_mode='r+')[..., 1::2]
+  assert not out.flags.c_contiguous
+  index.Assign(out, Tissue_type.fat, 2.)
+  index.Sample(out, Tissue_type.glandular, {'min': 3., 'max': 4.},
+               np.random.default_rng(0))
+  np.testing.assert_array_equal(out == 2., labelmap == Tissue_type.fat)
+  np.testing.assert_array_equal((out >= 3.) & (out <= 4.),
+                                labelmap == Tissue_type.glandular)
+
+
+def test_stats_match_masks(labelmap):
+  value = np.random.default_rng(1).random(labelmap.shape)
+  stats = Label_index.Build(labelmap).Stats(value)
+  for label in np.unique(labelmap):
+    v = value[labelmap == label]
+    assert stats['count'][label] == v.size
+    np.testing.assert_allclose([stats['mean'][label], stats['std'][label],
+                                stats['min'][label], stats['max'][label]],
+                               [v.mean(), v.std(), v.min(), v.max()])
+  assert np.isnan(stats['mean'][Tissue_type.vtc])
@@ -0,0 +1,118 @@
+'''
+Tests of the incremental lesion insertion of `lesion_insertion`: maps
+restored byte-exact, persisted lesions, and patched lookup values.
+'''
+import os
+
+import numpy as np
+import pytest
+
+from soa_nbp.parameters import Tissue_type
+from soa_nbp.ensemble import PhantomDir, GeneratePhantom, MetaSample
+from soa_nbp.acoustic_map import ACOU_NAME, AcouLUT
+from soa_nbp import lesion_insertion
+from soa_nbp.lesion_insertion import SAVED, Lesion_inserter
+
+WAVELENGTH = [750., 800.]
+
+# Validation warns of fractions possibly adding up to more than 1
+pytestmark = pytest.mark.filterwarnings('ignore:Volume fractions')
+
+
+def ReadMaps(path: str) -> dict:
+  '''Return the bytes of every `.npy` map of a phantom directory.'''
+  return {os.path.relpath(os.path.join(d, f), path):
+          open(os.path.join(d, f), 'rb').read()
+          for d, _, files in os.walk(path) for f in files
+          if f.endswith('.npy')}
+
+
+def Lesion(n: int = 5) -> np.ndarray:
+  '''Return a cubic VTC lesion with a necrotic core in water.'''
+  lesion = np.full((n, n, n), Tissue_type.water, dtype=np.uint8)
+  lesion[1:-1, 1:-1, 1:-1] = Tissue_type.vtc
+  lesion[n//2, n//2, n//2] = Tissue_type.nc
+  return lesion
+
+
+@pytest.fixture
+def phantom(tmp_path, labelmap) -> tuple:
+  meta = GeneratePhantom(0, labelmap, 'B', str(tmp_path), 0, WAVELENGTH)
+  path = PhantomDir(str(tmp_path), 0)
+  np.save(os.path.join(path, 'labelmap.npy'), labelmap)
+  return path, meta
+
+
+def test_insert_and_remove_restore_exactly(phantom, labelmap):
+  path, meta = phantom
+  healthy    = ReadMaps(path)
+  inserter   = Lesion_inserter(path, labelmap, halo=2)
+  region     = inserter.Insert(Lesion(), (7, 8, 9))
+  assert os.path.exists(os.path.join(path, SAVED))
+  label = np.load(os.path.join(path, 'labelmap.npy'))
+  assert np.count_nonzero(label == Tissue_type.vtc) >= 26
+  assert label[9, 10, 11] == Tissue_type.nc
+  # Labels and lookup values outside the region are untouched
+  outside = np.ones(label.shape, dtype=bool)
+  outside[region] = False
+  np.testing.assert_array_equal(label[outside], labelmap[outside])
+  lut = AcouLUT(MetaSample(meta)['Acou_prop'])
+  for name in ACOU_NAME:
+    np.testing.assert_array_equal(
+      np.load(os.path.join(path, 'acou', f'{name}.npy'))[region],
+      lut[name].astype(np.float32)[label[region]])
+
+  # Replacing the lesion starts from the healthy maps again
+  inserter.Insert(Lesion(3), (2, 3, 4))
+  assert np.load(os.path.join(path, 'labelmap.npy'))[9, 10, 11] \
+         == labelmap[9, 10, 11]
+  assert inserter.Remove() is not None
+  assert inserter.Remove() is None
+  assert not os.path.exists(os.path.join(path, SAVED))
+  assert ReadMaps(path) == healthy
+
+
+def test_lesion_persists_across_inserters(phantom, labelmap):
+  path, _ = phantom
+  healthy = ReadMaps(path)
+  Lesion_inserter(path, labelmap).Insert(Lesion(), (6, 6, 6))
+  # A later inserter (e.g., of another process) removes the lesion
+  inserter = Lesion_inserter(path, labelmap)
+  assert inserter.saved is not None
+  inserter.Remove()
+  assert ReadMaps(path) == healthy
+
+
+def test_unsolved_voxels_keep_values(phantom, labelmap, monkeypatch):
+  path, _ = phantom
+  func    = {name: np.load(os.path.join(path, 'func', f'{name}.npy'))
+             for name in ('f_b', 's')}
+  monkeypatch.setattr(lesion_insertion, 'SolvePDE',
+                      lambda label, *args, **kwargs:
+                      np.full(label.shape, np.nan))
+  region  = Lesion_inserter(path, labelmap).Insert(Lesion(), (6, 6, 6))
+  label   = np.load(os.path.join(path, 'labelmap.npy'))
+  same    = label[region] == labelmap[region]
+  for name, healthy in func.items():
+    patched = np.load(os.path.join(path, 'func', f'{name}.npy'))[region]
+    np.testing.assert_array_equal(patched[same], healthy[region][same])
+
+
+def test_refuses_unknown_lesion(phantom, labelmap):
+  path, _ = phantom
+  Lesion_inserter(path, labelmap).Insert(Lesion(), (6, 6, 6))
+  os.remove(os.path.join(path, SAVED))
+  with pytest.raises(ValueError, match='differs from the healthy'):
+    Lesion_inserter(path, labelmap)
+
+
+def test_invalid_lesion(phantom, labelmap):
+  path, _ = phantom
+  with pytest.raises(ValueError, match='Halo'):
+    Lesion_inserter(path, labelmap, halo=0)
+  inserter = Lesion_inserter(path, labelmap)
+  with pytest.raises(ValueError, match='no voxels'):
+    inserter.Insert(np.full((2, 2, 2), Tissue_type.water), (0, 0, 0))
+  with pytest.raises(ValueError, match='out of the map'):
+    inserter.Insert(Lesion(), (18, 0, 0))
+  assert inserter.saved is None
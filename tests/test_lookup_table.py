@@ -0,0 +1,82 @@
+'''
+Tests of `lookup_table` against per-tissue masked assignment.
+'''
+import numpy as np
+import pytest
+
+from soa_nbp.parameters import Tissue_type, Acou_prop
+from soa_nbp.lookup_table import (N_LABEL, Lookup_table, CompileProp,
+                                  CompileAll, AssignPropLUT, ResolveAlias,
+                                  TissueLabel)
+
+TABLE = {'water': 1.5, 'fat': {'dist': 'U', 'min': 0., 'max': 1.},
+         'glandular': 2.5, 'tdlu': 'glandular', 'duct': 'tdlu',
+         'artery': None, 'vein': 'artery'}
+
+
+def RandomLabelmap(rng, shape=(6, 7, 8)):
+  label = [Tissue_type.water, Tissue_type.fat, Tissue_type.glandular,
+           Tissue_type.tdlu, Tissue_type.duct, Tissue_type.artery,
+           Tissue_type.vein, Tissue_type.nc]
+  return rng.choice(np.array(label, dtype=np.uint8), shape)
+
+
+def test_resolve_alias():
+  root = ResolveAlias(TABLE)
+  assert root['duct'] == 'glandular'
+  assert root['tdlu'] == 'glandular'
+  assert root['vein'] == 'artery'
+  assert root['fat'] == 'fat'
+
+
+@pytest.mark.parametrize('table', [{'fat': 'dermis', 'dermis': 'fat'},
+                                   {'fat': 'glandular'}])
+def test_invalid_alias(table):
+  with pytest.raises(ValueError):
+    ResolveAlias(table)
+
+
+def test_unknown_tissue():
+  with pytest.raises(ValueError):
+    TissueLabel('bone')
+
+
+def test_compile_matches_masked_assignment():
+  table = Lookup_table(TABLE, 'x')
+  lut   = table.Compile({'fat': 0.25, 'artery': 7.})
+  rng   = np.random.default_rng(0)
+  label = RandomLabelmap(rng)
+
+  value = {'water': 1.5, 'fat': 0.25, 'glandular': 2.5, 'tdlu': 2.5,
+           'duct': 2.5, 'artery': 7., 'vein': 7.}
+  ref   = np.full(label.shape, np.nan)
+  for tissue, v in value.items():
+    ref[label == TissueLabel(tissue)] = v
+  np.testing.assert_array_equal(AssignPropLUT(label, lut), ref)
+  assert np.isnan(lut[[l for l in range(N_LABEL)
+                       if table.slot[l] < 0]]).all()
+
+
+def test_compile_batch_matches_compile():
+  table  = Lookup_table(TABLE, 'x')
+  sample = np.zeros(3, dtype=[(t, np.float64) for t in table.tissue])
+  sample['fat'] = [0.1, 0.2, 0.3]
+  sample['artery'] = np.nan
+  for t in table.Roots('const'):
+    sample[t] = table.spec[t]
+  batch = table.CompileBatch(sample)
+  for i in range(3):
+    ref = table.Compile({'fat': sample['fat'][i]})
+    np.testing.assert_array_equal(batch[i], ref)
+
+
+def test_acou_prop_constants():
+  table = CompileProp(Acou_prop)['sound_speed']
+  lut   = table.Compile()
+  assert lut[Tissue_type.water] == Acou_prop.sound_speed['water']
+  assert set(CompileAll()) == {'Func_prop', 'Opt_prop', 'Acou_prop'}
+
+
+def test_assign_rejects_non_uint8():
+  with pytest.raises(TypeError):
+    AssignPropLUT(np.zeros(3, dtype=np.int32), np.zeros(N_LABEL))
@@ -0,0 +1,78 @@
+'''
+Tests of the content-addressed LRU cache of `map_cache`.
+'''
+import os
+
+import numpy as np
+
+from soa_nbp import map_cache
+from soa_nbp.map_cache import STAMP, Map_cache, LabelmapDigest
+
+
+def test_key_follows_content(tmp_path, labelmap):
+  cache = Map_cache(str(tmp_path/'cache'), 1 << 20)
+  np.save(tmp_path/'label.npy', labelmap)
+  key   = cache.Key(labelmap, {'s': 0.5}, wavelength=[700.])
+  assert cache.Key(str(tmp_path/'label.npy'), {'s': 0.5},
+                   wavelength=[700.]) == key
+  assert cache.Key(LabelmapDigest(labelmap), {'s': 0.5},
+                   wavelength=[700.]) == key
+  other = labelmap.copy()
+  other[0, 0, 0] += 1
+  assert cache.Key(other, {'s': 0.5}, wavelength=[700.]) != key
+  assert cache.Key(labelmap, {'s': 0.6}, wavelength=[700.]) != key
+  assert cache.Key(labelmap, {'s': 0.5}, wavelength=[750.]) != key
+
+
+def test_put_get_round_trip(tmp_path):
+  cache = Map_cache(str(tmp_path), 1 << 20)
+  maps  = {'a': np.arange(12.).reshape(3, 4), 'b': np.ones(5, np.uint8)}
+  assert cache.Get('k') is None
+  got   = cache.Put('k', maps)
+  for name in maps:
+    np.testing.assert_array_equal(got[name], maps[name])
+    assert got[name].dtype == maps[name].dtype
+
+
+def test_concurrent_eviction_is_a_miss(tmp_path, monkeypatch):
+  cache = Map_cache(str(tmp_path), 1 << 20)
+  cache.Put('k', {'m': np.zeros(3)})
+  load  = np.load
+
+  def Evicted(path, **kwargs):
+    # Another process evicts the entry between the stamp and the maps
+    os.rename(cache.Path('k'), tmp_path/'.del-k')
+    return load(path, **kwargs)
+
+  monkeypatch.setattr(map_cache.np, 'load', Evicted)
+  assert cache.Get('k') is None
+
+
+def test_create_once(tmp_path):
+  cache = Map_cache(str(tmp_path), 1 << 20)
+  calls = []
+
+  def Create():
+    calls.append(1)
+    return {'m': np.zeros(3)}
+
+  cache.GetOrCreate('k', Create)
+  cache.GetOrCreate('k', Create)
+  assert len(calls) == 1
+
+
+def test_least_recently_used_evicted(tmp_path):
+  value = {'m': np.zeros(1000)}
+  cache = Map_cache(str(tmp_path), 1 << 30)
+  for i, key in enumerate('abc'):
+    cache.Put(key, value)
+    os.utime(os.path.join(cache.Path(key), STAMP), (i, i))
+  # Access 'a', so that 'b' is the least recently used
+  cache.Get('a')
+  size = sum(s for _, s, _ in cache.Entries())
+  cache.max_bytes = size*2//3 + 1
+  assert cache.Evict() == ['b']
+  assert cache.Get('b') is None and cache.Get('a') is not None
+  cache.max_bytes = 0
+  assert cache.Evict(keep='c') == ['a']
+  assert [k for _, _, k in cache.Entries()] == ['c']
@@ -0,0 +1,76 @@
+'''
+Tests of the multi-wavelength `μ_a` of `optical_absorption` against
+Eq. (1) evaluated per voxel.
+'''
+import math
+
+import numpy as np
+import pytest
+
+from soa_nbp.optical_absorption import (LoadSpectra, SpectralRange,
+                                        ChromophoreSpectra, CalculateMuA,
+                                        GenerateMuAMap)
+
+WAVELENGTH = [700., 757.5, 800., 1064.]
+C_THBB     = 2300.
+
+
+def RandomFunc(shape=(4, 5, 6), seed=0) -> dict:
+  rng = np.random.default_rng(seed)
+  f   = rng.dirichlet(np.ones(4), shape)
+  return {'s': rng.random(shape), 'f_b': f[..., 0], 'f_w': f[..., 1],
+          'f_f': f[..., 2], 'f_m': f[..., 3]}
+
+
+def Eq1(func: dict, wavelength: float) -> np.ndarray:
+  '''Evaluate Eq. (1) directly.'''
+  sp = LoadSpectra()
+  e  = {k: np.interp(wavelength, sp['wavelength'], sp[k])
+        for k in ('hbo2', 'hb', 'water', 'fat', 'melanin')}
+  return (math.log(10.)*C_THBB*1e-6*func['f_b']
+          *(func['s']*e['hbo2'] + (1. - func['s'])*e['hb'])
+          + func['f_w']*e['water'] + func['f_f']*e['fat']
+          + func['f_m']*e['melanin'])
+
+
+def test_mu_a_matches_eq1():
+  func = RandomFunc()
+  mu_a = CalculateMuA(func, WAVELENGTH, C_THBB, dtype=np.float64)
+  assert mu_a.shape == (len(WAVELENGTH), 4, 5, 6)
+  for i, wl in enumerate(WAVELENGTH):
+    np.testing.assert_allclose(mu_a[i], Eq1(func, wl), rtol=1e-12)
+
+
+def test_scalar_properties_broadcast():
+  func = {'s': 0.7, 'f_b': 0.02, 'f_w': 0.3, 'f_f': 0.68, 'f_m': 0.}
+  mu_a = CalculateMuA(func, WAVELENGTH, C_THBB, dtype=np.float64)
+  np.testing.assert_allclose(mu_a, [Eq1(func, wl) for wl in WAVELENGTH],
+                             rtol=1e-12)
+
+
+def test_streamed_map_matches(tmp_path):
+  func = RandomFunc((7, 3, 4))
+  mu_a = GenerateMuAMap(func, WAVELENGTH, C_THBB,
+                        str(tmp_path/'mu_a.npy'), slab=2)
+  np.testing.assert_allclose(mu_a, CalculateMuA(func, WAVELENGTH, C_THBB),
+                             rtol=1e-6)
+
+
+def test_spectral_range():
+  assert SpectralRange('hbo2') == (430., 1300.)
+  assert SpectralRange('fat')[1] < 1100.
+  assert SpectralRange('melanin')[1] < 1300.
+
+
+@pytest.mark.parametrize('wavelength', [[420.], [700., 1150.], [1250.],
+                                        [1301.]])
+def test_wavelength_outside_spectra(wavelength):
+  with pytest.raises(ValueError):
+    ChromophoreSpectra(wavelength, C_THBB)
+
+
+def test_subset_of_chromophores():
+  E = ChromophoreSpectra([800., 1250.], C_THBB, ('hbo2', 'hb', 'water'))
+  assert E.shape == (2, 3) and np.isfinite(E).all()
+  np.testing.assert_array_equal(E[:1], ChromophoreSpectra(
+    [800.], C_THBB)[:, :3])
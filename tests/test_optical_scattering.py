@@ -0,0 +1,55 @@
+'''
+Tests of the `μ_s` and `μ_s'` maps of `optical_scattering` against Eq. (2)
+evaluated per tissue.
+'''
+import numpy as np
+
+from soa_nbp.parameters import Tissue_type, Opt_prop
+from soa_nbp.optical_scattering import OptLUT, ScatteringTable, CalculateMuS, \
+                               GenerateMuSMap
+
+WAVELENGTH = [500., 700., 950.]
+
+
+def test_eq2_per_tissue():
+  lut         = OptLUT(seed=0)
+  mu_s, mu_sp = ScatteringTable(WAVELENGTH, lut)
+  ref_wl      = Opt_prop.mu_sp['wavelength_ref']
+  for tissue in ('fat', 'dermis', 'glandular', 'artery', 'vtc'):
+    l = getattr(Tissue_type, tissue)
+    for i, wl in enumerate(WAVELENGTH):
+      sp = lut['mu_sp.ref'][l]*(wl/ref_wl)**(-lut['mu_sp.b'][l])
+      assert np.isclose(mu_sp[i, l], sp, rtol=1e-12)
+      assert np.isclose(mu_s[i, l], sp/(1. - lut['g'][l]), rtol=1e-12)
+  # At the reference wavelength, μ_s' is the reference value
+  tissue = np.isfinite(lut['mu_sp.ref'])
+  np.testing.assert_allclose(mu_sp[0, tissue], lut['mu_sp.ref'][tissue])
+
+
+def test_constant_entries():
+  mu_s, mu_sp = ScatteringTable(WAVELENGTH, OptLUT(seed=1))
+  assert (mu_s[:, Tissue_type.air] == 0.).all()
+  assert (mu_sp[:, Tissue_type.air] == 0.).all()
+
+
+def test_ranges_sampled_jointly():
+  # 'upper'/'lower' ranges of μ_s'(λ_ref) and b share one variate
+  lut  = OptLUT(seed=2)
+  ref  = Opt_prop.mu_sp['ref']['dermis']
+  b    = Opt_prop.mu_sp['b']['dermis']
+  l    = Tissue_type.dermis
+  u_ref = (lut['mu_sp.ref'][l] - ref['upper'])/(ref['lower'] - ref['upper'])
+  u_b   = (lut['mu_sp.b'][l] - b['upper'])/(b['lower'] - b['upper'])
+  assert np.isclose(u_ref, u_b)
+  assert lut['mu_sp.ref'][Tissue_type.epidermis] == lut['mu_sp.ref'][l]
+
+
+def test_streamed_maps_match(tmp_path, labelmap):
+  lut         = OptLUT(seed=3)
+  mu_s, mu_sp = CalculateMuS(labelmap, WAVELENGTH, lut)
+  scat        = GenerateMuSMap(labelmap, WAVELENGTH, str(tmp_path), lut,
+                               slab=3)
+  table, _    = ScatteringTable(WAVELENGTH, lut)
+  np.testing.assert_array_equal(mu_s, table.astype(np.float32)[:, labelmap])
+  np.testing.assert_array_equal(scat['mu_s'], mu_s)
+  np.testing.assert_array_equal(scat['mu_sp'], mu_sp)
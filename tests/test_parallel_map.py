@@ -0,0 +1,72 @@
+'''
+Tests of the parallel mapping of `parallel_map` against a direct lookup,
+and of the removal of its shared memory segments.
+'''
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from soa_nbp.lookup_table import N_LABEL
+from soa_nbp.parallel_map import Shared_array, Shared_labelmap
+
+SHM = '/dev/shm'
+
+
+def Segments() -> set:
+  '''Return the names of the shared memory segments of the system.'''
+  return set(os.listdir(SHM)) if os.path.isdir(SHM) else set()
+
+
+def Unlinked(name: str) -> bool:
+  '''Return whether a shared memory segment no longer exists.'''
+  try:
+    shared_memory.SharedMemory(name=name).close()
+  except FileNotFoundError:
+    return True
+  return False
+
+
+@pytest.fixture
+def lut() -> dict:
+  rng = np.random.default_rng(0)
+  return {'a': rng.random(N_LABEL), 'b': rng.random((3, N_LABEL))}
+
+
+@pytest.mark.parametrize('to_file', [False, True])
+def test_map_matches_lookup(tmp_path, labelmap, lut, to_file):
+  before = Segments()
+  with Shared_labelmap(labelmap, slab=4) as shared:
+    name = shared.label.name
+    np.testing.assert_array_equal(shared.label.array, labelmap)
+    out  = shared.Map(lut, str(tmp_path) if to_file else None, workers=2)
+  assert Unlinked(name)
+  assert Segments() <= before
+  # Outputs stay valid after the segments are removed
+  for k, t in lut.items():
+    ref = t.astype(np.float32)[..., labelmap]
+    assert out[k].shape == ref.shape
+    np.testing.assert_array_equal(out[k], ref)
+    if to_file:
+      np.testing.assert_array_equal(np.load(tmp_path/f'{k}.npy'), ref)
+
+
+def test_failed_map_unlinks(labelmap):
+  before = Segments()
+  shared = Shared_labelmap(labelmap)
+  with pytest.raises(ValueError, match=f'{N_LABEL} entries'):
+    shared.Map({'a': np.ones(N_LABEL - 1)}, workers=1)
+  shared.Close()
+  shared.Close()
+  assert Segments() <= before
+
+
+def test_shared_array_attach():
+  a = Shared_array.FromArray(np.arange(12, dtype=np.int16).reshape(3, 4))
+  b = Shared_array.Attach(a.spec)
+  b.array[1, 2] = -1
+  assert a.array[1, 2] == -1
+  b.Close()
+  a.Close(unlink=True)
+  assert Unlinked(a.spec[0])
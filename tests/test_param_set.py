@@ -0,0 +1,85 @@
+'''
+Tests of the frozen parameter set of `param_set` against the compiled
+tables and `sampling`.
+'''
+import numpy as np
+import pytest
+
+from soa_nbp.parameters import Tissue_type, Func_prop, Opt_prop, Acou_prop
+from soa_nbp.lookup_table import CompileProp, Lookup_table
+from soa_nbp.sampling import SampleTable, SampleComposition, SampleVICTRE
+from soa_nbp.functional_map import FuncLUT, WaterLUT
+from soa_nbp.param_set import Param_set, Validate
+
+# Validation warns of fractions possibly adding up to more than 1
+pytestmark = pytest.mark.filterwarnings('ignore:Volume fractions')
+
+
+@pytest.fixture(scope='module')
+def param_set():
+  return Param_set.Compile()
+
+
+def test_default_tables_valid():
+  assert Validate() == []
+
+
+def test_invalid_tables_reported():
+  table = CompileProp(Func_prop)
+  table['s'] = Lookup_table({**Func_prop.s, 'fat': 1.5}, 's')
+  error = Validate({'Func_prop': table})
+  assert any('s[fat]' in e for e in error)
+
+
+def test_save_load(tmp_path, param_set):
+  param_set.Save(str(tmp_path/'param.bin'))
+  other = Param_set.Load(str(tmp_path/'param.bin'))
+  assert other.header == param_set.header
+  for name, a in param_set.array.items():
+    assert other.array[name].dtype == a.dtype
+    assert np.ascontiguousarray(other.array[name]).tobytes() == a.tobytes()
+
+
+@pytest.mark.parametrize('prop', [Opt_prop, Acou_prop, Func_prop])
+def test_sample_matches_sampling(param_set, prop):
+  # Same uniform variates as `SampleTable`, and the same constrained volume
+  # fractions as `SampleComposition`
+  table = CompileProp(prop)
+  rng   = np.random.default_rng(0)
+  ref   = SampleComposition(table, 64, rng)[0] if prop is Func_prop \
+          else SampleTable(table, 64, rng)
+  out   = param_set.SampleRoot(prop.__name__, 64, np.random.default_rng(0))
+  lut   = param_set.Lookup(prop.__name__, out)
+  for name, l in table.items():
+    assert out[name].dtype == ref[name].dtype
+    np.testing.assert_array_equal(out[name].tolist(), ref[name].tolist())
+    if prop is Func_prop and name == 'f_f':
+      continue    # 'remainder' resolved by `Lookup`
+    np.testing.assert_array_equal(lut[name], l.CompileBatch(ref[name]))
+
+
+def test_lookup_matches_func_lut(param_set):
+  sample = param_set.SampleRoot('Func_prop', 3, np.random.default_rng(4))
+  lut    = param_set.Lookup('Func_prop', sample)
+  for i in range(3):
+    row = WaterLUT({name: l[i] for name, l in lut.items()})
+    for name, value in FuncLUT(sample, i).items():
+      np.testing.assert_array_equal(row[name], value)
+
+
+def test_remainder_fills_up_to_one(param_set):
+  lut = param_set.Sample('Func_prop', 16, np.random.default_rng(1))
+  for tissue in Lookup_table(Func_prop.f_f).Roots('remainder'):
+    label = getattr(Tissue_type, tissue)
+    np.testing.assert_allclose(lut['f_b'][:, label] + lut['f_w'][:, label]
+                               + lut['f_f'][:, label] + lut['f_m'][:, label],
+                               1.)
+  # Constrained compositions leave no negative remainder
+  assert np.nanmin(lut['f_f']) >= 0.
+
+
+def test_sample_victre(param_set):
+  ref = SampleVICTRE('B', 'natural', 5, np.random.default_rng(2))
+  out = param_set.SampleVICTRE('B', 'natural', 5, np.random.default_rng(2))
+  for name in ref.dtype.names:
+    np.testing.assert_allclose(out[name], ref[name], rtol=1e-12)
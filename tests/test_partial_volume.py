@@ -0,0 +1,70 @@
+'''
+Tests of the sub-voxel skin model of `partial_volume`.
+'''
+import numpy as np
+import pytest
+
+from soa_nbp.parameters import Tissue_type
+from soa_nbp.functional_map import FUNC_NAME, FuncLUT, GenerateFuncMap
+from soa_nbp.optical_absorption import CalculateMuA
+from soa_nbp.partial_volume import (WATER, SignedDistance, SkinFractionSDF,
+                                    SkinFractionSupersampled, MixSkin)
+
+
+def test_sdf_fractions():
+  frac = SkinFractionSDF(np.array([-2., 0., 0.5, 1., 3.]), 1., 0.1, 1.5)
+  np.testing.assert_allclose(frac.sum(axis=0), 1.)
+  np.testing.assert_allclose(frac[:, 2], [0., 0.1, 0.9, 0.])
+  np.testing.assert_allclose(frac[:, 1], [0.5, 0.1, 0.4, 0.])
+  np.testing.assert_allclose(frac[:, 0], [1., 0., 0., 0.])
+  np.testing.assert_allclose(frac[:, 4], [0., 0., 0., 1.])
+
+
+def test_signed_distance_of_half_space():
+  mask = np.zeros((1, 1, 10), dtype=bool)
+  mask[..., 5:] = True
+  np.testing.assert_allclose(SignedDistance(mask, 0.5).ravel(),
+                             0.5*(np.arange(10) - 4.5))
+
+
+def test_supersampled_fractions():
+  fine = np.full((4, 4, 4), Tissue_type.fat, dtype=np.uint8)
+  fine[:, :, 0] = Tissue_type.water
+  fine[:, :, 1] = Tissue_type.epidermis
+  fine[:2, :, 2] = Tissue_type.dermis
+  frac = SkinFractionSupersampled(fine, 4)
+  np.testing.assert_allclose(frac[:, 0, 0, 0], [0.25, 0.25, 0.125, 0.375])
+
+
+def test_mix_is_linear_in_mu_a(labelmap):
+  lut  = FuncLUT(seed=0)
+  func = GenerateFuncMap(labelmap, lut=lut, dtype=np.float64)
+  rng  = np.random.default_rng(1)
+  frac = np.zeros((4,) + labelmap.shape)
+  skin = labelmap == Tissue_type.dermis
+  frac[:, skin] = rng.dirichlet(np.ones(4), skin.sum()).T
+  frac[3, ~skin] = 1.
+  mixed = MixSkin(func, labelmap, frac, lut)
+
+  wl     = [700., 800.]
+  # Inner tissue of skin voxels: subcutaneous fat, PDE values averaged
+  fat    = labelmap == Tissue_type.fat
+  layer  = [WATER,
+            {n: lut[n][Tissue_type.epidermis] for n in FUNC_NAME},
+            {n: lut[n][Tissue_type.dermis] for n in FUNC_NAME},
+            {n: func[n][fat].mean() if np.isnan(lut[n][Tissue_type.fat])
+             else lut[n][Tissue_type.fat] for n in FUNC_NAME}]
+  ref = sum(frac[k][skin]*CalculateMuA(layer[k], wl, 2300.,
+                                       np.float64)[:, None]
+            for k in range(4))
+  mu_a = CalculateMuA(mixed, wl, 2300., np.float64)
+  assert np.isfinite(mu_a[:, skin]).all()
+  np.testing.assert_allclose(mu_a[:, skin], ref, rtol=1e-10)
+  for name in FUNC_NAME:
+    np.testing.assert_array_equal(mixed[name][~skin], func[name][~skin])
+
+
+def test_mix_requires_lookup(labelmap):
+  func = GenerateFuncMap(labelmap, seed=0, pde=False)
+  with pytest.raises(TypeError):
+    MixSkin(func, labelmap, np.zeros((4,) + labelmap.shape))
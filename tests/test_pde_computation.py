@@ -0,0 +1,91 @@
+'''
+Tests of the sparse Laplace solver of `pde_computation` against a dense
+solve of the discrete Laplace equation.
+'''
+import itertools
+
+import numpy as np
+import pytest
+
+from soa_nbp.parameters import Tissue_type, Func_prop
+from soa_nbp.pde_computation import (pyamg, PDELabels, DirichletLabels,
+                                     Laplace_system, SolvePDE)
+
+ACTIVE = Tissue_type.fat
+BACKEND = ['cg'] + (['amg'] if pyamg is not None else [])
+
+
+def DenseSolve(labelmap: np.ndarray, value: np.ndarray) -> np.ndarray:
+  '''Solve the 7-point Laplace equation on the active voxels densely.'''
+  active = np.argwhere((labelmap == ACTIVE) & np.isnan(value))
+  index  = {tuple(v): i for i, v in enumerate(active)}
+  A      = np.zeros((len(active), len(active)))
+  b      = np.zeros(len(active))
+  for i, v in enumerate(active):
+    for d, step in itertools.product(range(3), (-1, 1)):
+      nb = v.copy()
+      nb[d] += step
+      if not 0 <= nb[d] < labelmap.shape[d]:
+        continue
+      nb = tuple(nb)
+      if nb in index:
+        A[i, i] += 1.
+        A[i, index[nb]] -= 1.
+      elif np.isfinite(value[nb]):
+        A[i, i] += 1.
+        b[i]    += value[nb]
+  u = np.where(np.isfinite(value), value, np.nan)
+  u[tuple(active.T)] = np.linalg.solve(A, b)
+  return u
+
+
+def Problem(seed: int = 0) -> tuple:
+  rng   = np.random.default_rng(seed)
+  label = np.full((6, 7, 8), ACTIVE, dtype=np.uint8)
+  value = np.full(label.shape, np.nan)
+  hot   = rng.random(label.shape) < 0.08
+  label[hot] = Tissue_type.artery
+  value[hot] = rng.random(hot.sum())
+  return label, value
+
+
+@pytest.mark.parametrize('backend', BACKEND)
+def test_matches_dense_solve(backend):
+  label, value = Problem()
+  u = SolvePDE(label, [ACTIVE], value, rtol=1e-12, backend=backend)
+  np.testing.assert_allclose(u, DenseSolve(label, value), atol=1e-8)
+
+
+def test_linear_between_two_values():
+  label = np.full((1, 1, 11), ACTIVE, dtype=np.uint8)
+  label[..., 0] = label[..., -1] = Tissue_type.artery
+  value = np.full(label.shape, np.nan)
+  value[..., 0], value[..., -1] = 0., 1.
+  u = SolvePDE(label, [ACTIVE], value, rtol=1e-12, backend='cg')
+  np.testing.assert_allclose(u.ravel(), np.linspace(0., 1., 11), atol=1e-10)
+
+
+def test_unanchored_region_is_filled():
+  label = np.full((1, 1, 9), ACTIVE, dtype=np.uint8)
+  label[..., 4] = Tissue_type.water
+  label[..., 0] = Tissue_type.artery
+  u = SolvePDE(label, [ACTIVE], {Tissue_type.artery: 0.7}, fill=-1.,
+               backend='cg')
+  np.testing.assert_allclose(u.ravel()[:4], 0.7)
+  assert (u.ravel()[4:] == -1.).all()
+  system = Laplace_system(label, [ACTIVE], label == Tissue_type.artery)
+  assert system.index.size == 3
+
+
+def test_warm_start_gives_same_solution():
+  label, value = Problem(1)
+  u  = SolvePDE(label, [ACTIVE], value, rtol=1e-10, backend='cg')
+  u0 = SolvePDE(label, [ACTIVE], value, x0=u, rtol=1e-10, backend='cg')
+  np.testing.assert_allclose(u0, u, atol=1e-8)
+
+
+def test_labels_of_func_prop():
+  for name in ('s', 'f_b'):
+    table = getattr(Func_prop, name)
+    assert set(PDELabels(table)).isdisjoint(DirichletLabels(table))
+  assert Tissue_type.artery in DirichletLabels(Func_prop.s)
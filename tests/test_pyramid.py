@@ -0,0 +1,105 @@
+'''
+Tests of the per-label count pyramid of `pyramid` against brute-force
+block statistics.
+'''
+import itertools
+
+import numpy as np
+import pytest
+
+from soa_nbp.parameters import Tissue_type
+from soa_nbp.pyramid import CoarseShape, Label_pyramid, BlockMean
+
+FACTOR = (2, 4, 8)
+
+
+def Blocks(shape: tuple, factor: int):
+  '''Yield the coarse index and the slices of each block.'''
+  for idx in itertools.product(*(range(n) for n in CoarseShape(shape,
+                                                               factor))):
+    yield idx, tuple(slice(i*factor, (i + 1)*factor) for i in idx)
+
+
+def test_counts_match_blocks(labelmap):
+  pyramid = Label_pyramid.Build(labelmap, FACTOR)
+  for level, f in enumerate(FACTOR):
+    count = pyramid.count[level]
+    assert count.shape[:3] == CoarseShape(labelmap.shape, f)
+    for idx, block in Blocks(labelmap.shape, f):
+      ref = [(labelmap[block] == l).sum() for l in pyramid.label]
+      np.testing.assert_array_equal(count[idx], ref)
+
+
+class Read_counter(np.ndarray):
+  '''Label map counting the reads of its slabs.'''
+  reads = 0
+
+  def __getitem__(self, index):
+    Read_counter.reads += 1
+    return super().__getitem__(index)
+
+
+def test_labels_found_in_one_pass(labelmap):
+  # Labels first appearing in later slabs and out of order
+  labelmap = labelmap.copy()
+  labelmap[-1, 0, 0] = Tissue_type.nipple
+  labelmap[-2, 0, 0] = Tissue_type.epidermis
+  view    = labelmap.view(Read_counter)
+  Read_counter.reads = 0
+  pyramid = Label_pyramid.Build(view, FACTOR)
+  assert Read_counter.reads == len(range(0, labelmap.shape[0], FACTOR[-1]))
+  np.testing.assert_array_equal(pyramid.label, np.unique(labelmap))
+  ref = Label_pyramid.Build(labelmap, FACTOR, label=np.unique(labelmap))
+  for c, r in zip(pyramid.count, ref.count):
+    np.testing.assert_array_equal(c, r)
+
+
+def test_identity_level_not_stored(labelmap):
+  lut     = np.random.default_rng(2).random(256)
+  pyramid = Label_pyramid.Build(labelmap, (1, 4))
+  assert pyramid.count[0] is None
+  np.testing.assert_array_equal(pyramid.Average(1, lut), lut[labelmap])
+  np.testing.assert_allclose(pyramid.Average(4, lut),
+                             BlockMean(lut[labelmap], 4, dtype=np.float64),
+                             rtol=1e-12)
+
+
+def test_factors_must_nest(labelmap):
+  with pytest.raises(ValueError):
+    Label_pyramid.Build(labelmap, (2, 3))
+
+
+def test_average_matches_block_mean(labelmap):
+  rng     = np.random.default_rng(0)
+  lut     = rng.random(256) + 0.5
+  pyramid = Label_pyramid.Build(labelmap, FACTOR)
+  value   = lut[labelmap]
+  for f in FACTOR:
+    arith = pyramid.Average(f, lut)
+    harm  = pyramid.Average(f, lut, 'harmonic')
+    for idx, block in Blocks(labelmap.shape, f):
+      v = value[block]
+      assert np.isclose(arith[idx], v.mean())
+      assert np.isclose(harm[idx], 1./np.mean(1./v))
+    np.testing.assert_allclose(BlockMean(value, f, dtype=np.float64),
+                               arith, rtol=1e-12)
+
+
+def test_wood_sound_speed(labelmap):
+  rng     = np.random.default_rng(1)
+  c, rho  = rng.random(256) + 1., rng.random(256) + 0.5
+  pyramid = Label_pyramid.Build(labelmap, FACTOR)
+  speed   = pyramid.SoundSpeed(4, c, rho)
+  for idx, block in Blocks(labelmap.shape, 4):
+    l = labelmap[block]
+    assert np.isclose(speed[idx], 1./np.sqrt(np.mean(rho[l])
+                                             *np.mean(1./(rho[l]*c[l]**2))))
+
+
+def test_undefined_label_gives_nan(labelmap):
+  lut = np.ones(256)
+  lut[Tissue_type.artery] = np.nan
+  avg = Label_pyramid.Build(labelmap, FACTOR).Average(8, lut)
+  for idx, block in Blocks(labelmap.shape, 8):
+    assert np.isnan(avg[idx]) == (labelmap[block]
+                                  == Tissue_type.artery).any()
@@ -0,0 +1,77 @@
+'''
+Tests of the batch sampler of `sampling` against `scipy.stats`.
+'''
+import numpy as np
+import pytest
+from scipy import stats
+
+from soa_nbp.sampling import (SpecKind, TruncNormPPF, TransformUniform,
+                              SampleSpec, SampleParam)
+
+TN = {'mean': 1.44, 'std': 0.021, 'min': 1.41, 'max': 1.49}
+
+
+def TruncNorm(spec: dict):
+  '''Return the `scipy.stats.truncnorm` distribution of a TN spec.'''
+  return stats.truncnorm((spec['min'] - spec['mean'])/spec['std'],
+                         (spec['max'] - spec['mean'])/spec['std'],
+                         spec['mean'], spec['std'])
+
+
+@pytest.mark.parametrize('mean, std, lo, hi', [(1.44, 0.021, 1.41, 1.49),
+                                               (0., 1., 3., 6.),
+                                               (0., 1., -8., -5.)])
+def test_truncnorm_ppf(mean, std, lo, hi):
+  u   = np.linspace(0.001, 0.999, 101)
+  ref = stats.truncnorm.ppf(u, (lo - mean)/std, (hi - mean)/std, mean, std)
+  np.testing.assert_allclose(TruncNormPPF(u, mean, std, lo, hi), ref,
+                             rtol=1e-9, atol=1e-12)
+
+
+def test_spec_kind():
+  assert SpecKind(0.5) == 'const'
+  assert SpecKind(TN) == 'TN'
+  assert SpecKind({'mean': 0., 'std': 1.}) == 'N'
+  assert SpecKind({'min': 0., 'max': 1.}) == 'U'
+  assert SpecKind({'upper': 1., 'lower': 2.}) == 'range'
+  with pytest.raises(ValueError):
+    SpecKind({'mean': 0.})
+
+
+def test_transform_matches_scipy():
+  u    = np.random.default_rng(0).random((50, 1))
+  spec = [TN, {'mean': 0.038, 'std': 0.004}, {'min': 2., 'max': 5.}, 0.3]
+  x    = TransformUniform(spec, np.repeat(u, 4, axis=1))
+  np.testing.assert_allclose(x[:, 0], TruncNorm(TN).ppf(u[:, 0]),
+                             rtol=1e-9)
+  np.testing.assert_allclose(x[:, 1], stats.norm.ppf(u[:, 0], 0.038, 0.004),
+                             rtol=1e-9)
+  np.testing.assert_allclose(x[:, 2], 2. + 3.*u[:, 0])
+  assert (x[:, 3] == 0.3).all()
+
+
+def test_samples_follow_distribution():
+  x = SampleSpec([TN], 20000, np.random.default_rng(1))[:, 0]
+  assert x.min() >= TN['min'] and x.max() <= TN['max']
+  assert stats.kstest(x, TruncNorm(TN).cdf).pvalue > 1e-3
+
+
+def test_extreme_variates_stay_finite():
+  x = TransformUniform([{'mean': 0., 'std': 1.}], np.array([[0.], [1.]]))
+  assert np.isfinite(x).all()
+
+
+def test_joint_groups_share_variates():
+  u = SampleSpec([{'min': 0., 'max': 1.}]*3, 10, np.random.default_rng(2),
+                 ['a', 'b', 'a'])
+  np.testing.assert_array_equal(u[:, 0], u[:, 2])
+  assert not np.array_equal(u[:, 0], u[:, 1])
+
+
+def test_sample_param_fields_and_seed():
+  param = {'x': TN, 'y': 2.}
+  a = SampleParam(param, 5, np.random.default_rng(3))
+  b = SampleParam(param, 5, np.random.default_rng(3))
+  assert a.dtype.names == ('x', 'y')
+  np.testing.assert_array_equal(a, b)
+  assert (a['y'] == 2.).all()
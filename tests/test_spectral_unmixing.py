@@ -0,0 +1,70 @@
+'''
+Tests of the batched unmixing of `spectral_unmixing` against
+`scipy.optimize.nnls` per voxel.
+'''
+import numpy as np
+import pytest
+from scipy.optimize import nnls
+
+from soa_nbp.optical_absorption import CalculateMuA
+from soa_nbp.spectral_unmixing import Spectral_unmixer, UnmixingError
+
+WAVELENGTH = np.arange(700., 1001., 50.)
+C_THBB     = 2300.
+
+
+@pytest.fixture
+def unmixer() -> Spectral_unmixer:
+  return Spectral_unmixer(WAVELENGTH, C_THBB)
+
+
+def NoisyMuA(unmixer, n: int = 300, seed: int = 0) -> np.ndarray:
+  '''Return `μ_a` of random fractions with noise, so that some voxels
+  have active non-negativity constraints.'''
+  rng = np.random.default_rng(seed)
+  F   = rng.random((len(unmixer.chromophore), n))
+  F[rng.random(F.shape) < 0.3] = 0.
+  mu_a = unmixer.E @ F
+  return mu_a + 0.1*rng.standard_normal(mu_a.shape)*mu_a.std(axis=0)
+
+
+def test_active_matches_nnls(unmixer):
+  mu_a = NoisyMuA(unmixer)
+  F    = unmixer.Solve(mu_a, 'active')
+  ref  = np.stack([nnls(unmixer.E, m)[0] for m in mu_a.T], axis=1)
+  assert np.any(ref == 0.)
+  np.testing.assert_allclose(F, ref, rtol=1e-6, atol=1e-9*ref.max())
+
+
+def test_projected_reaches_nnls_residual(unmixer):
+  mu_a = NoisyMuA(unmixer, seed=1)
+  F    = unmixer.Solve(mu_a, 'projected', iteration=20000, tol=1e-14)
+  ref  = np.array([nnls(unmixer.E, m)[1] for m in mu_a.T])
+  assert np.all(F >= 0.)
+  np.testing.assert_allclose(np.linalg.norm(unmixer.E @ F - mu_a, axis=0),
+                             ref, rtol=1e-4)
+
+
+@pytest.mark.parametrize('slab', [1, 64])
+def test_unmix_recovers_func(unmixer, slab):
+  rng  = np.random.default_rng(2)
+  f    = rng.dirichlet(np.ones(4), (3, 4, 5))
+  func = {'s': rng.uniform(0.5, 1., (3, 4, 5)), 'f_b': f[..., 0],
+          'f_w': f[..., 1], 'f_f': f[..., 2], 'f_m': f[..., 3]}
+  mu_a = CalculateMuA(func, WAVELENGTH, C_THBB, dtype=np.float64)
+  est  = unmixer.Unmix(mu_a, slab=slab)
+  for k in func:
+    np.testing.assert_allclose(est[k], func[k], rtol=1e-6, atol=1e-9)
+  assert est['residual'].max() < 1e-9*mu_a.max()
+  error = UnmixingError(est, func)
+  assert set(error['rmse']) == set(func)
+  assert max(error['rmse'].values()) < 1e-6
+
+
+def test_invalid_setup(unmixer):
+  with pytest.raises(ValueError, match="'hbo2' and 'hb'"):
+    Spectral_unmixer(WAVELENGTH, C_THBB, ('hbo2', 'water'))
+  with pytest.raises(ValueError, match='wavelengths'):
+    Spectral_unmixer(WAVELENGTH[:3], C_THBB)
+  with pytest.raises(ValueError, match='Unknown method'):
+    unmixer.Solve(np.ones((len(WAVELENGTH), 1)), 'lsq')
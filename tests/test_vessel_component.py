@@ -0,0 +1,73 @@
+'''
+Tests of the vessel components of `vessel_component` against
+`scipy.ndimage.label`.
+'''
+import numpy as np
+import pytest
+from scipy import ndimage
+
+from soa_nbp.parameters import Func_prop, Tissue_type
+from soa_nbp.vessel_component import (LabelComponents, AssignComponents,
+                                      SampleVesselS)
+
+
+def RandomVessels(shape: tuple = (9, 10, 11), seed: int = 0) -> np.ndarray:
+  '''Return a label map with many small artery components.'''
+  rng   = np.random.default_rng(seed)
+  label = np.full(shape, Tissue_type.fat, dtype=np.uint8)
+  label[rng.random(shape) < 0.25] = Tissue_type.artery
+  return label
+
+
+@pytest.mark.parametrize('connectivity', [1, 2, 3])
+@pytest.mark.parametrize('slab', [1, 4, 64])
+def test_components_match_ndimage(connectivity, slab):
+  label = RandomVessels()
+  voxel, component, n = LabelComponents(label, Tissue_type.artery,
+                                        slab=slab,
+                                        connectivity=connectivity)
+  ref, n_ref = ndimage.label(label == Tissue_type.artery,
+                             ndimage.generate_binary_structure(
+                               3, connectivity))
+  assert n == n_ref > 1
+  np.testing.assert_array_equal(voxel,
+                                np.flatnonzero(label == Tissue_type.artery))
+  # Same partition: components map one-to-one onto the reference labels
+  pair = np.unique(np.stack([component, ref.ravel()[voxel]]), axis=1)
+  assert pair.shape[1] == n
+  assert component.min() == 1 and component.max() == n
+
+
+def test_no_vessel():
+  voxel, component, n = LabelComponents(np.zeros((3, 4, 5), np.uint8),
+                                        Tissue_type.vein)
+  assert voxel.size == component.size == n == 0
+
+
+def test_assign_into_transposed_output():
+  label = RandomVessels()
+  voxel, component, n = LabelComponents(label, Tissue_type.artery)
+  value = np.arange(1., n + 1.)
+  out   = np.zeros(label.shape[::-1]).T
+  assert not out.flags.contiguous
+  AssignComponents(out, voxel, component, value)
+  np.testing.assert_array_equal(out.ravel()[voxel], value[component - 1])
+  with pytest.raises(ValueError, match='components'):
+    AssignComponents(out, voxel, component, value[:-1])
+
+
+def test_sample_vessel_s(labelmap):
+  s     = np.full(labelmap.shape, np.nan)
+  drawn = SampleVesselS(s, labelmap, np.random.default_rng(0))
+  for tissue in ('artery', 'vein'):
+    t     = getattr(Tissue_type, tissue)
+    ref, n = ndimage.label(labelmap == t)
+    assert len(drawn[tissue]) == n
+    spec  = Func_prop.s[tissue]
+    assert np.all((drawn[tissue] >= spec['min'])
+                  & (drawn[tissue] <= spec['max']))
+    # One value per component
+    for k in range(1, n + 1):
+      assert np.unique(s[ref == k]).size == 1
+  assert np.isnan(s[~np.isin(labelmap, [Tissue_type.artery,
+                                        Tissue_type.vein])]).all()
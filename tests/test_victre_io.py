@@ -0,0 +1,127 @@
+'''
+Tests of the streaming reader of `victre_io` on gzip, multi-member gzip,
+zlib, uncompressed, and truncated VICTRE volumes.
+'''
+import gzip
+import zlib
+
+import numpy as np
+import pytest
+
+from soa_nbp.parameters import Tissue_type
+from soa_nbp.victre_io import VICTRE_LABEL, ReadMHD, RemapLUT, ReadVICTRE
+
+SHAPE = (6, 5, 7)
+
+
+@pytest.fixture
+def volume() -> np.ndarray:
+  rng = np.random.default_rng(0)
+  return rng.choice(list(VICTRE_LABEL) + [17], SHAPE).astype(np.uint8)
+
+
+def WriteMHD(path, data_file: str, shape: tuple = SHAPE, **entry) -> str:
+  '''Write a MetaImage header of a uint8 volume.'''
+  entry = {'ObjectType': 'Image', 'NDims': 3,
+           'DimSize': ' '.join(str(n) for n in shape[::-1]),
+           'ElementSpacing': '0.1 0.2 0.3', 'ElementType': 'MET_UCHAR',
+           **entry, 'ElementDataFile': data_file}
+  with open(path, 'w') as f:
+    f.writelines(f'{k} = {v}\n' for k, v in entry.items())
+  return str(path)
+
+
+def test_remap_lut():
+  lut = RemapLUT()
+  assert lut[200] == Tissue_type.vtc
+  assert lut[17] == 17
+  assert lut.dtype == np.uint8
+
+
+@pytest.mark.parametrize('chunk', [7, 1 << 20])
+def test_gzip_through_header(tmp_path, volume, chunk):
+  # The header names the raw file that VICTRE compresses afterwards
+  with gzip.open(tmp_path/'p.raw.gz', 'wb') as f:
+    f.write(volume.tobytes())
+  path   = WriteMHD(tmp_path/'p.mhd', 'p.raw')
+  header = ReadMHD(path)
+  assert header['shape'] == SHAPE
+  assert header['spacing'] == (0.3, 0.2, 0.1)
+  assert header['compressed']
+  out = ReadVICTRE(path, str(tmp_path/'label.npy'), chunk=chunk)
+  np.testing.assert_array_equal(out, RemapLUT()[volume])
+  np.testing.assert_array_equal(np.load(tmp_path/'label.npy'), out)
+
+
+def test_multi_member_gzip(tmp_path, volume):
+  data = volume.tobytes()
+  with open(tmp_path/'p.raw.gz', 'wb') as f:
+    for part in (data[:50], data[50:51], data[51:]):
+      f.write(gzip.compress(part))
+  out = ReadVICTRE(str(tmp_path/'p.raw.gz'), remap=None, shape=SHAPE,
+                   chunk=16)
+  np.testing.assert_array_equal(out, volume)
+
+
+def test_zlib_stream(tmp_path, volume):
+  (tmp_path/'p.zraw').write_bytes(zlib.compress(volume.tobytes()))
+  path = WriteMHD(tmp_path/'p.mhd', 'p.zraw', CompressedData='True')
+  np.testing.assert_array_equal(ReadVICTRE(path, remap=None, chunk=9),
+                                volume)
+
+
+@pytest.mark.parametrize('compressed', [False, True])
+@pytest.mark.parametrize('z_range', [(0, 6), (2, 5), (5, 6), (3, 3)])
+def test_z_range(tmp_path, volume, compressed, z_range):
+  if compressed:
+    (tmp_path/'p.raw.gz').write_bytes(gzip.compress(volume.tobytes()))
+    path = str(tmp_path/'p.raw.gz')
+  else:
+    volume.tofile(tmp_path/'p.raw')
+    path = str(tmp_path/'p.raw')
+  out = ReadVICTRE(path, remap=None, z_range=z_range, shape=SHAPE,
+                   chunk=11)
+  np.testing.assert_array_equal(out, volume[z_range[0]:z_range[1]])
+
+
+def test_local_data_and_byte_order(tmp_path):
+  volume = np.arange(np.prod(SHAPE), dtype='>u2').reshape(SHAPE)
+  path   = WriteMHD(tmp_path/'p.mha', 'LOCAL', ElementType='MET_USHORT',
+                    BinaryDataByteOrderMSB='True')
+  with open(path, 'ab') as f:
+    f.write(volume.tobytes())
+  out = ReadVICTRE(path, remap=None, z_range=(1, 4))
+  np.testing.assert_array_equal(out, volume[1:4])
+  with pytest.raises(ValueError, match='cannot be remapped'):
+    ReadVICTRE(path)
+
+
+@pytest.mark.parametrize('compress', [zlib.compress, gzip.compress])
+@pytest.mark.parametrize('z_range', [None, (2, 5)])
+def test_local_compressed_data(tmp_path, volume, compress, z_range):
+  path = WriteMHD(tmp_path/'p.mha', 'LOCAL', CompressedData='True')
+  with open(path, 'ab') as f:
+    f.write(compress(volume.tobytes()))
+  assert ReadMHD(path)['compressed']
+  out = ReadVICTRE(path, remap=None, z_range=z_range, chunk=5)
+  np.testing.assert_array_equal(out, volume[slice(*(z_range or (None,)))])
+
+
+@pytest.mark.parametrize('compressed', [False, True])
+def test_truncated(tmp_path, volume, compressed):
+  data = volume.tobytes()[:-3]
+  (tmp_path/'p.raw').write_bytes(gzip.compress(data) if compressed
+                                 else data)
+  with pytest.raises(ValueError, match='ends after'):
+    ReadVICTRE(str(tmp_path/'p.raw'), shape=SHAPE, chunk=8)
+
+
+def test_invalid_input(tmp_path, volume):
+  volume.tofile(tmp_path/'p.raw')
+  with pytest.raises(ValueError, match='Shape'):
+    ReadVICTRE(str(tmp_path/'p.raw'))
+  with pytest.raises(ValueError, match='out of'):
+    ReadVICTRE(str(tmp_path/'p.raw'), shape=SHAPE, z_range=(4, 7))
+  (tmp_path/'bad.mhd').write_text('NDims = 3\n')
+  with pytest.raises(ValueError, match='not a MetaImage header'):
+    ReadMHD(str(tmp_path/'bad.mhd'))
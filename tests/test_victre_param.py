@@ -0,0 +1,77 @@
+'''
+Tests of the immutable `VICTRE_param`, the batch shape-parameter sampler,
+and the VICTRE configuration files of `victre_config`.
+'''
+import copy
+import pickle
+import re
+
+import numpy as np
+import pytest
+
+from soa_nbp.parameters import VICTRE_param
+from soa_nbp.sampling import SampleVICTRE
+from soa_nbp.victre_config import WriteVICTREConfig
+
+
+def test_instances_memoized():
+  assert VICTRE_param('A', 'natural') is VICTRE_param('A', 'natural')
+  assert VICTRE_param('B', 'natural') is not VICTRE_param('A', 'natural')
+  assert VICTRE_param('A', 'natural').a1t['mean'] \
+         != VICTRE_param('D', 'natural').a1t['mean']
+
+
+def test_instances_immutable():
+  param = VICTRE_param('C', 'natural')
+  with pytest.raises(AttributeError):
+    param.a1t = 1.
+  with pytest.raises(AttributeError):
+    del param.eps1
+  with pytest.raises(TypeError):
+    param.a1t['mean'] = 1.
+
+
+def test_pickle_and_copy():
+  param = VICTRE_param('D', 'hemisphere')
+  assert pickle.loads(pickle.dumps(param)) is param
+  assert copy.deepcopy(param) is param
+  assert copy.copy(param) is param
+
+
+@pytest.mark.parametrize('breast_type, breast_shape', [('E', 'natural'),
+                                                       ('A', 'flat')])
+def test_unknown_type_or_shape(breast_type, breast_shape):
+  with pytest.raises(ValueError):
+    VICTRE_param(breast_type, breast_shape)
+
+
+def test_batch_sampling_within_bounds():
+  param  = VICTRE_param('B', 'natural')
+  sample = SampleVICTRE('B', 'natural', 1000, seed=0)
+  assert sample.dtype.names == VICTRE_param.SHAPE_PARAM
+  for name, spec in param.Spec().items():
+    if 'min' in spec:
+      assert sample[name].min() >= spec['min']
+      assert sample[name].max() <= spec['max']
+  np.testing.assert_array_equal(sample, SampleVICTRE('B', 'natural', 1000,
+                                                     seed=0))
+
+
+def test_hemisphere_constants():
+  sample = SampleVICTRE('A', 'hemisphere', 4, seed=1)
+  assert (sample['a1b_a1t'] == 1.).all() and (sample['ptosisB0'] == 0.).all()
+
+
+def test_config_files(tmp_path):
+  path = WriteVICTREConfig('C', 'natural', 3, str(tmp_path), seed=2,
+                           imgRes=0.2)
+  assert len(path) == 3
+  sample = SampleVICTRE('C', 'natural', 3, np.random.default_rng(2))
+  seed   = set()
+  for i, p in enumerate(path):
+    text = open(p).read()
+    assert re.search(r'^imgRes=0.2$', text, re.MULTILINE)
+    a1t  = float(re.search(r'^a1t=(.*)$', text, re.MULTILINE).group(1))
+    assert np.isclose(a1t, sample['a1t'][i], rtol=1e-5)
+    seed.add(re.search(r'^seed=(\d+)$', text, re.MULTILINE).group(1))
+  assert len(seed) == 3